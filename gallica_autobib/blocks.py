@@ -0,0 +1,279 @@
+"""Bookkeeping for pdfs downloaded from Gallica in blocks of views."""
+import json
+from collections import deque
+from hashlib import sha256
+from logging import getLogger
+from pathlib import Path
+from typing import IO, Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from PyPDF4 import PageRange, PdfFileMerger
+
+logger = getLogger(__name__)
+
+
+def file_digest(fn: Path) -> str:
+    """sha256 of a file's contents."""
+    digest = sha256()
+    with fn.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlockManifest:
+    """Record of the blocks of a download which have been completed.
+
+    The manifest lives next to the output file, so that a download which dies
+    half way through can be resumed, fetching only missing or corrupt blocks.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path, ark: str) -> None:
+        self.path = path
+        self.ark = ark
+        self.blocks: Dict[int, Dict[str, Any]] = {}
+
+    @staticmethod
+    def path_for(outf: Path) -> Path:
+        """Path of the manifest for a given output file."""
+        return outf.with_name(f"{outf.name}.manifest.json")
+
+    @classmethod
+    def load(cls, outf: Path, ark: str) -> "BlockManifest":
+        """Load the manifest for outf, or start a new one.
+
+        A manifest for a different ark (or in an unknown format) is discarded.
+        """
+        manifest = cls(cls.path_for(outf), ark)
+        try:
+            data = json.loads(manifest.path.read_text())
+        except (OSError, ValueError):
+            return manifest
+        if data.get("version") != cls.VERSION or data.get("ark") != ark:
+            logger.debug(f"Discarding stale manifest {manifest.path}")
+            return manifest
+        manifest.blocks = {int(k): v for k, v in data["blocks"].items()}
+        return manifest
+
+    def save(self) -> None:
+        data = dict(version=self.VERSION, ark=self.ark, blocks=self.blocks)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        tmp.replace(self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def add(self, startview: int, nviews: int, fn: Path) -> None:
+        """Record fn as the completed block starting at startview."""
+        self.blocks[startview] = dict(
+            ark=self.ark,
+            startview=startview,
+            nviews=nviews,
+            file=fn.name,
+            size=fn.stat().st_size,
+            sha256=file_digest(fn),
+        )
+        self.save()
+
+    def valid(self, startview: int, nviews: int, fn: Path) -> bool:
+        """Whether fn holds a complete, uncorrupted copy of the block."""
+        entry = self.blocks.get(startview)
+        if not entry or entry["nviews"] != nviews or entry["file"] != fn.name:
+            return False
+        try:
+            if fn.stat().st_size != entry["size"]:
+                return False
+        except FileNotFoundError:
+            return False
+        if file_digest(fn) != entry["sha256"]:
+            logger.info(f"Partial {fn} is corrupt; refetching.")
+            return False
+        return True
+
+
+class Block(NamedTuple):
+    """A block of views to download."""
+
+    start: int
+    nviews: int
+    attempt: int = 0
+
+    @property
+    def end(self) -> int:
+        return self.start + self.nviews - 1
+
+
+class BlockPlanner:
+    """Plan the blocks of views in which a range of pages is downloaded.
+
+    With a fixed strategy the range is cut into blocks of `size` views and a
+    failed block is retried as it is.  With the adaptive strategy the size of
+    the next block follows the measured throughput: it grows while bytes per
+    second improve, falls back to the best size seen when they don't, and a
+    failed block is split in two (down to `min_size`) rather than retried
+    whole.  Every attempt is recorded in `log` for later tuning.
+    """
+
+    def __init__(
+        self,
+        ranges: Iterable[Tuple[int, int]],
+        size: int,
+        adaptive: bool = False,
+        min_size: int = 1,
+        max_size: int = 200,
+        retries: int = 2,
+    ) -> None:
+        """Set up planner.
+
+        Args:
+          ranges: Inclusive (start, end) ranges of views to download.
+          size: Initial (or fixed) number of views per block.
+          adaptive: Whether to adapt the block size.
+          min_size: Smallest block the adaptive strategy will split down to.
+          max_size: Largest block the adaptive strategy will grow to.
+          retries: How many times a block (of min_size, if adaptive) is retried.
+        """
+        # (start, end, attempt, exact): exact ranges are handed out whole
+        self.pending: Deque[Tuple[int, int, int, bool]] = deque(
+            (start, end, 0, False) for start, end in ranges
+        )
+        self.size = size
+        self.adaptive = adaptive
+        self.min_size = min_size
+        self.max_size = max_size
+        self.retries = retries
+        self.log: List[Dict[str, Any]] = []
+        self._best: Tuple[float, int] = (0.0, size)
+
+    @staticmethod
+    def gaps(
+        start: int, end: int, done: Iterable[Tuple[int, int]]
+    ) -> List[Tuple[int, int]]:
+        """Ranges between start and end not covered by done (start, end) blocks."""
+        gaps = []
+        for block_start, block_end in sorted(done):
+            if block_start > start:
+                gaps.append((start, min(block_start - 1, end)))
+            start = max(start, block_end + 1)
+        if start <= end:
+            gaps.append((start, end))
+        return gaps
+
+    def next(self) -> Optional[Block]:
+        """Next block to download, or None if nothing is left to hand out."""
+        if not self.pending:
+            return None
+        start, end, attempt, exact = self.pending.popleft()
+        nviews = end - start + 1
+        if not exact and nviews > self.size:
+            nviews = self.size
+            self.pending.appendleft((start + nviews, end, 0, False))
+        return Block(start, nviews, attempt)
+
+    def _record(self, block: Block, nbytes: int, seconds: float, ok: bool) -> None:
+        self.log.append(
+            dict(
+                start=block.start,
+                nviews=block.nviews,
+                bytes=nbytes,
+                seconds=round(seconds, 3),
+                ok=ok,
+            )
+        )
+
+    def succeeded(self, block: Block, nbytes: int, seconds: float) -> None:
+        """Record a completed block."""
+        self._record(block, nbytes, seconds, True)
+        if not self.adaptive:
+            return
+        rate = nbytes / seconds if seconds else 0
+        best_rate, best_size = self._best
+        if rate >= best_rate:
+            self._best = (rate, block.nviews)
+            grown = max(block.nviews + 1, int(block.nviews * 1.5))
+            self.size = min(self.max_size, max(self.size, grown))
+        else:
+            self.size = best_size
+
+    def failed(self, block: Block, seconds: float) -> bool:
+        """Record a failed block, and queue it again.
+
+        Returns:
+          False if the block has run out of retries.
+        """
+        self._record(block, 0, seconds, False)
+        if self.adaptive and block.nviews > self.min_size:
+            half = block.nviews // 2
+            self.size = max(self.min_size, half)
+            self._best = (0.0, self.size)
+            self.pending.appendleft(
+                (block.start + half, block.end, block.attempt, True)
+            )
+            self.pending.appendleft(
+                (block.start, block.start + half - 1, block.attempt, True)
+            )
+            return True
+        if block.attempt >= self.retries:
+            return False
+        self.pending.appendleft((block.start, block.end, block.attempt + 1, True))
+        return True
+
+
+class PdfAssembler:
+    """Assemble a pdf from blocks as they arrive.
+
+    Blocks may arrive in any order; each is appended to the output as soon as
+    every block before it has been appended.  Gallica prepends its (two
+    page) cover to every block, which is dropped from all but the first (and
+    from that too if suppress_cover_page is set).
+
+    PyPDF4 reads page content lazily, so the streams handed over must stay
+    open until `write()`, which closes them (as does `close()`, if we give up).
+    """
+
+    def __init__(self, start: int, suppress_cover_page: bool = False) -> None:
+        self.merger = PdfFileMerger()
+        self.next = start
+        self.suppress_cover_page = suppress_cover_page
+        self.waiting: Dict[int, Tuple[int, IO[bytes]]] = {}
+        self.streams: List[IO[bytes]] = []
+
+    def add(self, start: int, nviews: int, stream: IO[bytes]) -> None:
+        """Add the block of nviews views starting at start."""
+        self.waiting[start] = (nviews, stream)
+        while self.next in self.waiting:
+            nviews, stream = self.waiting.pop(self.next)
+            if self.streams or self.suppress_cover_page:
+                self.merger.append(stream, pages=PageRange("2:"))
+            else:
+                self.merger.append(stream)
+            self.streams.append(stream)
+            self.next += nviews
+
+    def write(self, path: Path) -> None:
+        """Write the assembled pdf to path.
+
+        The pdf is written next to path and moved into place, so that path is
+        never left half written.
+        """
+        if self.waiting:
+            raise ValueError(f"Missing views before {min(self.waiting)}.")
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        try:
+            with tmp.open("wb") as f:
+                self.merger.write(f)
+            tmp.replace(path)
+        finally:
+            tmp.unlink(missing_ok=True)
+            self.close()
+
+    def close(self) -> None:
+        """Close every stream handed over."""
+        self.merger.close()
+        for stream in self.streams:
+            stream.close()
+        for _, stream in self.waiting.values():
+            stream.close()
+        self.streams, self.waiting = [], {}
@@ -1,19 +1,49 @@
 """Handle our internal cache, which we use to avoid hammering Gallica's
 servers, and to make our life easier when re-running."""
+import asyncio
+import json
+import os
+import pickle  # nosec
+import shutil
 import sqlite3
-from collections import UserDict
-from functools import wraps
+import threading
+from collections import OrderedDict, UserDict
+from concurrent.futures import Future
+from functools import partial, wraps
+from hashlib import blake2b, sha256
+from inspect import iscoroutinefunction
 from logging import getLogger
-from multiprocessing import Lock
-from os import getenv
+from multiprocessing.util import Finalize
+from os import getenv, getpid
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import TYPE_CHECKING, Any, Callable, Optional
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from time import monotonic, perf_counter, sleep, time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+from weakref import WeakValueDictionary
 
 import jsonpickle
 from requests_downloader import downloader
 from xdg import xdg_cache_home
 
+try:
+    import zstandard
+except ImportError:  # pragma: nocover
+    zstandard = None
+
 if TYPE_CHECKING:  # pragma: nocover
     from .gallipy import Ark  # pragma: nocover
 
@@ -28,63 +58,1336 @@ else:
     cachedir = xdg_cache_home() / "gallica_autobib"  # TODO what happens if not on unix?
 
 
+class Codec(Protocol):
+    """How the values of a table are serialised."""
+
+    name: str
+    # whether data from elsewhere can be loaded without running arbitrary code
+    safe: bool
+
+    @staticmethod
+    def dumps(val: Any) -> Union[str, bytes]:
+        ...
+
+    @staticmethod
+    def loads(data: Union[str, bytes]) -> Any:
+        ...
+
+
+class JsonPickleCodec:
+    """The original codec: values as jsonpickle text."""
+
+    name = "jsonpickle"
+    safe = False
+
+    @staticmethod
+    def dumps(val: Any) -> Union[str, bytes]:
+        return jsonpickle.dumps(val)
+
+    @staticmethod
+    def loads(data: Union[str, bytes]) -> Any:
+        return jsonpickle.loads(data)
+
+
+class PickleCodec:
+    """Values as pickle (protocol 5) blobs, which store bytes without encoding."""
+
+    name = "pickle"
+    safe = False
+
+    @staticmethod
+    def dumps(val: Any) -> Union[str, bytes]:
+        return pickle.dumps(val, protocol=5)
+
+    @staticmethod
+    def loads(data: Union[str, bytes]) -> Any:
+        if not isinstance(data, bytes):
+            raise TypeError(f"Pickled values are bytes, not {type(data)}")
+        return pickle.loads(data)  # nosec: we only load what we stored
+
+
+class RawCodec:
+    """Bytes values stored as blobs, untouched."""
+
+    name = "raw"
+    safe = True
+
+    @staticmethod
+    def dumps(val: Any) -> Union[str, bytes]:
+        if not isinstance(val, bytes):
+            raise TypeError(f"Raw codec can only store bytes, not {type(val)}")
+        return val
+
+    @staticmethod
+    def loads(data: Union[str, bytes]) -> Any:
+        return data
+
+
+class DigestCodec:
+    """Digests of blobs in a `BlobStore`, as text."""
+
+    name = "digest"
+    safe = True
+
+    @staticmethod
+    def dumps(val: Any) -> Union[str, bytes]:
+        return val
+
+    @staticmethod
+    def loads(data: Union[str, bytes]) -> Any:
+        return data
+
+
+CODECS: Dict[str, Type[Codec]] = {
+    codec.name: codec for codec in (JsonPickleCodec, PickleCodec, RawCodec, DigestCodec)
+}
+
+
+# identifies this run (shared by forked workers) in the stats
+RUN_ID = f"{getpid()}-{time():.0f}"
+RUN_STARTED = time()
+
+
+class TableStats:
+    """Counters of lookups in (and writes to) a table."""
+
+    FIELDS = (
+        "hits",
+        "misses",
+        "memory_hits",
+        "bytes_read",
+        "bytes_written",
+        "lookup_seconds",
+    )
+
+    def __init__(self, **counters: float) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.lookup_seconds = 0.0
+        for field, val in counters.items():
+            setattr(self, field, val)
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        return self.hits / self.lookups if self.lookups else None
+
+    @property
+    def mean_lookup(self) -> Optional[float]:
+        """Mean lookup latency in seconds."""
+        return self.lookup_seconds / self.lookups if self.lookups else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __add__(self, other: "TableStats") -> "TableStats":
+        return TableStats(
+            **{f: getattr(self, f) + getattr(other, f) for f in self.FIELDS}
+        )
+
+    def __sub__(self, other: "TableStats") -> "TableStats":
+        return TableStats(
+            **{f: getattr(self, f) - getattr(other, f) for f in self.FIELDS}
+        )
+
+    def __bool__(self) -> bool:
+        return any(getattr(self, f) for f in self.FIELDS)
+
+    def __repr__(self) -> str:
+        return f"TableStats({self.as_dict()})"
+
+
+class MemoryCache:
+    """In-process LRU cache bounded by number of entries and total size.
+
+    Values are stored as they are, not copied, so callers must not mutate
+    what they get back.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, Tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getitem__(self, key: Any) -> Any:
+        with self._lock:
+            try:
+                val, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self._data.move_to_end(key)
+            self.hits += 1
+            return val
+
+    def put(self, key: Any, val: Any, size: int) -> None:
+        """Store val, whose serialised size is size, evicting as needed."""
+        with self._lock:
+            self._discard(key)
+            # a single huge value would flush everything else
+            if size > self.max_bytes // 4 or not self.max_entries:
+                return
+            self._data[key] = (val, size)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+
+    def _discard(self, key: Any) -> None:
+        if key in self._data:
+            _, size = self._data.pop(key)
+            self.bytes -= size
+
+    def discard(self, key: Any) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def reset_lock(self) -> None:
+        """Replace the lock, which may be held by a thread of our parent."""
+        self._lock = threading.Lock()
+
+
+_open_caches: "WeakValueDictionary[int, Cached]" = WeakValueDictionary()
+
+
+def _flush_open_caches() -> None:
+    for cache in list(_open_caches.values()):
+        try:
+            cache.flush()
+        except Exception as e:  # pragma: nocover
+            logger.warning(f"Failed to flush cache {cache.tablename}: {e}")
+
+
+def _reset_open_caches() -> None:
+    for cache in list(_open_caches.values()):
+        cache._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_open_caches)
+
+_finalizer_pid: Optional[int] = None
+
+
+def _register_flush_at_exit() -> None:
+    """Flush open caches when this process exits.
+
+    multiprocessing drops finalizers in forked children, so every process
+    registers its own.
+    """
+    global _finalizer_pid
+    if _finalizer_pid != getpid():
+        Finalize(None, _flush_open_caches, exitpriority=10)
+        _finalizer_pid = getpid()
+
+
+class Policy(NamedTuple):
+    """Eviction policy of a cache table.  None means unbounded."""
+
+    max_bytes: Optional[int] = None
+    max_entries: Optional[int] = None
+    ttl: Optional[float] = None  # seconds since the entry was written
+
+
+DAY = 24 * 60 * 60
+GiB = 1024**3
+# for permanent failures, which may be fixed upstream eventually
+NEGATIVE_TTL = 7 * DAY
+
+# every table should have an entry here, or it grows without bound
+POLICIES: Dict[str, Policy] = {
+    "responses": Policy(max_bytes=GiB, ttl=30 * DAY),
+    "data_blobs": Policy(max_bytes=20 * GiB),
+    "img_data_blobs": Policy(max_bytes=2 * GiB),
+    "ocr_bounds": Policy(max_entries=100_000),
+    "responses_negative": Policy(max_entries=100_000, ttl=NEGATIVE_TTL),
+    "parsed": Policy(max_bytes=GiB, ttl=30 * DAY),
+    "parsed_negative": Policy(max_entries=100_000, ttl=NEGATIVE_TTL),
+    # paginations belong to the issue index, and are kept as long
+    "issue_index": Policy(max_bytes=GiB),
+    "pagination_index": Policy(max_bytes=GiB),
+    "ark": Policy(max_entries=100_000, ttl=180 * DAY),
+    "source_match": Policy(max_entries=100_000, ttl=180 * DAY),
+    # tables from versions which stored data in the database itself
+    "data": Policy(max_entries=0),
+    "img_data": Policy(max_entries=0),
+}
+
+
 class Cached(UserDict):
-    """Cached resource."""
+    """Cached resource.
+
+    Reads and writes go through an in-process `MemoryCache` in front of the
+    database, so repeated lookups of the same key skip sqlite and
+    deserialisation.
+
+    Values are serialised with a codec (see `CODECS`) which is recorded per
+    table in the `_codecs` table.  Tables created before codecs existed have
+    no record, and keep using jsonpickle.
+
+    Every table has a `Policy` (see `POLICIES`), enforced every `PRUNE_EVERY`
+    writes: expired entries are dropped, then the least recently accessed
+    until the table is within its budget.  Access times are only updated when
+    a value is read from the database, not from the memory tier.
+
+    The database is in WAL mode, so readers never block on writers.  The
+    connection is opened lazily, and again in every process which forks after
+    the table is created.  Writes (and access times) are buffered and
+    committed together every `COMMIT_EVERY` writes or `COMMIT_INTERVAL`
+    seconds, whichever comes first, and when the process exits; until then
+    they are only visible to this process.
+    """
 
     CACHEFN = "cache.db"
     cachedir = cachedir
-    write_lock = Lock()
+    MEMORY_ENTRIES = 512
+    MEMORY_BYTES = 32 * 1024 * 1024
+    PRUNE_EVERY = 100
+    COMMIT_EVERY = 50
+    COMMIT_INTERVAL = 1.0
+    BUSY_TIMEOUT = 30
+    JOURNAL_MODE = "WAL"
+    # seconds for which a result handed off to other processes is kept
+    HANDOFF_TTL = 10
+    # if set, keys read or written are recorded under this tag (see export)
+    touch_tag: Optional[str] = None
+    # open tables, by database and name, so prune() can use their settings
+    tables: "WeakValueDictionary[Tuple[str, str], Cached]" = WeakValueDictionary()
+
+    def __init__(
+        self,
+        cachename: str,
+        *args: Any,
+        memory_entries: Optional[int] = None,
+        memory_bytes: Optional[int] = None,
+        codec: str = "pickle",
+        policy: Optional[Policy] = None,
+        **kwargs: Any,
+    ) -> None:
+        """A resource in the cache, stored in a separate table.
 
-    def __init__(self, cachename: str, *args: Any, **kwargs: Any) -> None:
-        """A resource in the cache, stored in a separate table."""
+        Args:
+          cachename: Name of the table.
+          memory_entries: Entry budget of the memory tier (0 disables it).
+          memory_bytes: Byte budget of the memory tier.
+          codec: Codec for values if the table is new.  Existing tables keep
+            the codec they were created with.
+          policy: Eviction policy.  Defaults to the table's entry in `POLICIES`.
+        """
         self.tablename = cachename
-        self.cachedir.mkdir(exist_ok=True, parents=True)
-        cache = self.cachedir / self.CACHEFN
-        logger.debug(f"Cache: {cache}")
-        self.con = sqlite3.connect(cache)
-        MAKE_TABLE = f'CREATE TABLE IF NOT EXISTS "{cachename}" (key TEXT PRIMARY KEY, value BLOB)'
-        self.con.execute(MAKE_TABLE)
-        self.con.commit()
+        self.policy: Policy = policy or POLICIES.get(cachename, Policy())
+        self.path = self.cachedir / self.CACHEFN
+        self._requested_codec = codec
+        self._codec: Optional[Type[Codec]] = None
+        self._con: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.write_lock = threading.RLock()
+        self._writes = 0
+        # key: (val, data, size, created)
+        self._pending: Dict[str, Tuple[Any, Union[str, bytes], int, float]] = {}
+        self._accessed: Dict[str, float] = {}
+        self._touched: Set[Tuple[str, str]] = set()
+        self.stats = TableStats()
+        self._stats_flushed = TableStats()
+        self._last_flush = monotonic()
+        self.memory = MemoryCache(
+            self.MEMORY_ENTRIES if memory_entries is None else memory_entries,
+            self.MEMORY_BYTES if memory_bytes is None else memory_bytes,
+        )
+        self.tables[(str(self.path), cachename)] = self
+        _open_caches[id(self)] = self
         super().__init__(*args, **kwargs)
 
     def __del__(self) -> None:
-        self.con.close()
+        if not hasattr(self, "_pending"):
+            return
+        try:
+            self.flush()
+        finally:
+            if self._con and self._pid == getpid():
+                self._con.close()
 
-    def __getitem__(self, key: str) -> Optional[Any]:
-        GET_ITEM = (
-            f'SELECT value FROM "{self.tablename}" WHERE key = (?)'  # skipcq: BAN-B608
+    @property
+    def con(self) -> sqlite3.Connection:
+        """Connection to the database, opened lazily in each process."""
+        if self._con is None or self._pid != getpid():
+            self._connect()
+        assert self._con
+        return self._con
+
+    def _after_fork(self) -> None:
+        """Reset what a forked child inherits from its parent.
+
+        The parent's locks may have been held by another thread when it
+        forked, and its unflushed writes and stats are its own to flush.
+        """
+        self.write_lock = threading.RLock()
+        self.memory.reset_lock()
+        self._pending.clear()
+        self._accessed.clear()
+        self._touched.clear()
+        self._writes = 0
+        self._stats_flushed = self.stats + TableStats()
+
+    def _connect(self) -> None:
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        logger.debug(f"Cache: {self.path}")
+        self._con = con = sqlite3.connect(
+            self.path, timeout=self.BUSY_TIMEOUT, check_same_thread=False
+        )
+        self._pid = getpid()
+        _register_flush_at_exit()
+        con.execute(f"PRAGMA journal_mode={self.JOURNAL_MODE}")
+        con.execute("PRAGMA synchronous=NORMAL")
+        self._codec = CODECS[self._table_codec(self._requested_codec)]
+        MAKE_TABLE = (
+            f'CREATE TABLE IF NOT EXISTS "{self.tablename}" '
+            "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL)"
+        )
+        con.execute(MAKE_TABLE)
+        self._migrate()
+        con.execute(
+            f'CREATE INDEX IF NOT EXISTS "{self.tablename}_accessed" '
+            f'ON "{self.tablename}" (accessed)'
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS _inflight "
+            "(tablename TEXT, key TEXT, pid INTEGER, expires REAL, "
+            "PRIMARY KEY (tablename, key))"
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS _handoff "
+            "(tablename TEXT, key TEXT, value BLOB, expires REAL, "
+            "PRIMARY KEY (tablename, key))"
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS _stats "
+            "(run TEXT, started REAL, tablename TEXT, "
+            + ", ".join(f"{f} REAL DEFAULT 0" for f in TableStats.FIELDS)
+            + ", PRIMARY KEY (run, tablename))"
+        )
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS _touched "
+            "(tag TEXT, tablename TEXT, key TEXT, PRIMARY KEY (tag, tablename, key))"
+        )
+        con.commit()
+
+    @property
+    def codec(self) -> Type[Codec]:
+        if self._codec is None or self._pid != getpid():
+            self.con  # skipcq: PYL-W0104
+        assert self._codec
+        return self._codec
+
+    def _table_codec(self, codec: str) -> str:
+        """Get (or record) the codec of our table."""
+        con = self._con
+        assert con
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS _codecs (tablename TEXT PRIMARY KEY, codec TEXT)"
+        )
+        row = con.execute(
+            "SELECT codec FROM _codecs WHERE tablename = ?", (self.tablename,)
+        ).fetchone()
+        if row:
+            return row[0]
+        exists = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (self.tablename,),
+        ).fetchone()
+        if exists:
+            codec = JsonPickleCodec.name
+        # another process may have got there first, in which case it wins
+        con.execute(
+            "INSERT OR IGNORE INTO _codecs (tablename, codec) VALUES (?,?)",
+            (self.tablename, codec),
+        )
+        return con.execute(
+            "SELECT codec FROM _codecs WHERE tablename = ?", (self.tablename,)
+        ).fetchone()[0]
+
+    def _migrate(self) -> None:
+        """Add the bookkeeping columns to tables which predate them."""
+        con = self._con
+        assert con
+        columns = {
+            row[1] for row in con.execute(f'PRAGMA table_info("{self.tablename}")')
+        }
+        missing = [c for c in ("size", "created", "accessed") if c not in columns]
+        if not missing:
+            return
+        for column in missing:
+            kind = "INTEGER" if column == "size" else "REAL"
+            con.execute(f'ALTER TABLE "{self.tablename}" ADD COLUMN {column} {kind}')
+        con.execute(
+            f'UPDATE "{self.tablename}" SET size = length(value), '  # skipcq: BAN-B608
+            "created = ?, accessed = ?",
+            (time(), time()),
         )
-        item = self.con.execute(GET_ITEM, (key,)).fetchone()
+
+    def _expired(self, created: Optional[float], now: float) -> bool:
+        return bool(self.policy.ttl and created and created + self.policy.ttl < now)
+
+    def __getitem__(self, key: str) -> Optional[Any]:
+        start = perf_counter()
+        try:
+            return self._lookup(key, self.stats)
+        finally:
+            self.stats.lookup_seconds += perf_counter() - start
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Value for key, or None, without counting the lookup in the stats.
+
+        For lookups which aren't the caller's own, say polling for a result
+        another process is computing.
+        """
+        try:
+            return self._lookup(key, TableStats())
+        except KeyError:
+            return None
+
+    def _lookup(self, key: str, stats: TableStats) -> Optional[Any]:
+        try:
+            val = self.memory[key]
+            self._touch(key)
+            stats.hits += 1
+            stats.memory_hits += 1
+            return val
+        except KeyError:
+            pass
+        GET_ITEM = f'SELECT value, created FROM "{self.tablename}" WHERE key = (?)'  # skipcq: BAN-B608
+        now = time()
+        with self.write_lock:
+            if key in self._pending:
+                val, data, _, _ = self._pending[key]
+                self.memory.put(key, val, len(data))
+                self._touch(key)
+                stats.hits += 1
+                return val
+            item = self.con.execute(GET_ITEM, (key,)).fetchone()
+            if item and self._expired(item[1], now):
+                self._evict([key])
+                self.con.commit()
+                item = None
+            elif item:
+                self._accessed[key] = now
         if item:
-            return jsonpickle.loads(item[0])
+            val = self.codec.loads(item[0])
+            self.memory.put(key, val, len(item[0]))
+            self._touch(key)
+            stats.hits += 1
+            stats.bytes_read += len(item[0])
+            self._maybe_flush()
+            return val
+        stats.misses += 1
         raise KeyError(key)
 
+    def _touch(self, key: str) -> None:
+        if self.touch_tag:
+            self._touched.add((self.touch_tag, key))
+
     def __setitem__(self, key: str, val: Any) -> None:
-        self.write_lock.acquire()
-        try:
-            SET = f'REPLACE INTO "{self.tablename}" (key, value) VALUES (?,?)'
-            self.con.execute(SET, (key, jsonpickle.dumps(val)))
+        data = self.codec.dumps(val)
+        self._set(key, val, data, len(data))
+
+    def _set(self, key: str, val: Any, data: Union[str, bytes], size: int) -> None:
+        """Store data (val serialised), which accounts for size bytes."""
+        with self.write_lock:
+            self._pending[key] = (val, data, size, time())
+            self._accessed.pop(key, None)
+            self._touch(key)
+        self.memory.put(key, val, len(data))
+        self.stats.bytes_written += size
+        self._writes += 1
+        self._maybe_flush()
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def _maybe_flush(self) -> None:
+        if (
+            len(self._pending) >= self.COMMIT_EVERY
+            or monotonic() - self._last_flush > self.COMMIT_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Commit buffered writes and access times to the database.
+
+        If the database stays locked for longer than `BUSY_TIMEOUT` the writes
+        stay buffered, to be retried at the next flush.
+        """
+        with self.write_lock:
+            self._last_flush = monotonic()
+            stats = self.stats - self._stats_flushed
+            if not (self._pending or self._accessed or self._touched or stats):
+                return
+            con = self.con
+            SET = (
+                f'REPLACE INTO "{self.tablename}" '
+                "(key, value, size, created, accessed) VALUES (?,?,?,?,?)"
+            )
+            try:
+                with con:
+                    con.executemany(
+                        SET,
+                        (
+                            (key, data, size, created, created)
+                            for key, (_, data, size, created) in self._pending.items()
+                        ),
+                    )
+                    con.executemany(
+                        f'UPDATE "{self.tablename}" SET accessed = ? WHERE key = ?',
+                        ((t, key) for key, t in self._accessed.items()),
+                    )
+                    con.executemany(
+                        "INSERT OR IGNORE INTO _touched VALUES (?,?,?)",
+                        ((tag, self.tablename, k) for tag, k in self._touched),
+                    )
+                    if stats:
+                        self._write_stats(con, stats)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not write to cache {self.tablename}: {e}")
+                return
+            self._pending.clear()
+            self._accessed.clear()
+            self._touched.clear()
+            self._stats_flushed = self._stats_flushed + stats
+
+    def _write_stats(self, con: sqlite3.Connection, stats: TableStats) -> None:
+        """Add stats to this run's row in the _stats table."""
+        fields = TableStats.FIELDS
+        con.execute(
+            "INSERT OR IGNORE INTO _stats (run, started, tablename) VALUES (?,?,?)",
+            (RUN_ID, RUN_STARTED, self.tablename),
+        )
+        con.execute(
+            "UPDATE _stats SET "
+            + ", ".join(f"{f} = {f} + ?" for f in fields)
+            + " WHERE run = ? AND tablename = ?",
+            (*(getattr(stats, f) for f in fields), RUN_ID, self.tablename),
+        )
+
+    def discard(self, key: str) -> None:
+        """Delete key, if we have it."""
+        with self.write_lock:
+            self._evict([key])
             self.con.commit()
+
+    def _evict(self, keys: List[str]) -> None:
+        """Delete keys.  Must be called with the write lock held."""
+        self.flush()
+        self.con.executemany(
+            f'DELETE FROM "{self.tablename}" WHERE key = ?', ((k,) for k in keys)
+        )
+        for key in keys:
+            self.memory.discard(key)
+
+    def claim(self, key: str, timeout: float) -> bool:
+        """Claim key for this process, to compute its value.
+
+        Claims are kept in the `_inflight` table, so they are seen by every
+        process using the database.  A claim lapses after timeout seconds, or
+        when the process holding it dies.
+
+        Returns:
+          Whether we got the claim.
+        """
+        now = time()
+        with self.write_lock:
+            con = self.con
+            try:
+                with con:
+                    row = con.execute(
+                        "SELECT pid, expires FROM _inflight "
+                        "WHERE tablename = ? AND key = ?",
+                        (self.tablename, key),
+                    ).fetchone()
+                    if row and (row[1] < now or not _alive(row[0])):
+                        con.execute(
+                            "DELETE FROM _inflight WHERE tablename = ? AND key = ?",
+                            (self.tablename, key),
+                        )
+                    cursor = con.execute(
+                        "INSERT OR IGNORE INTO _inflight VALUES (?,?,?,?)",
+                        (self.tablename, key, getpid(), now + timeout),
+                    )
+            except sqlite3.OperationalError as e:
+                # better to fetch twice than not at all
+                logger.debug(f"Could not claim {key}: {e}")
+                return True
+            return cursor.rowcount == 1
+
+    def release(self, key: str) -> None:
+        """Release our claim on key, making its value visible to everyone."""
+        self.flush()
+        with self.write_lock:
+            con = self.con
+            try:
+                with con:
+                    con.execute(
+                        "DELETE FROM _inflight "
+                        "WHERE tablename = ? AND key = ? AND pid = ?",
+                        (self.tablename, key, getpid()),
+                    )
+            except sqlite3.OperationalError as e:
+                logger.debug(f"Could not release {key}: {e}")
+
+    def hand_off(self, key: str, val: Any) -> None:
+        """Leave val for the processes waiting on our claim on key.
+
+        This is for results which are not cached, say because caching is
+        disabled.  They are kept for `HANDOFF_TTL` seconds.  Results which
+        can't be pickled are not handed off: waiters then compute them
+        themselves.
+        """
+        try:
+            data = pickle.dumps(val, protocol=5)
+        except Exception as e:
+            logger.debug(f"Could not hand off {key}: {e}")
+            return
+        now = time()
+        with self.write_lock:
+            con = self.con
+            try:
+                with con:
+                    con.execute("DELETE FROM _handoff WHERE expires < ?", (now,))
+                    con.execute(
+                        "REPLACE INTO _handoff VALUES (?,?,?,?)",
+                        (self.tablename, key, data, now + self.HANDOFF_TTL),
+                    )
+            except sqlite3.OperationalError as e:
+                logger.debug(f"Could not hand off {key}: {e}")
+
+    def handed_off(self, key: str) -> Optional[Any]:
+        """Result handed off for key by another process, if any (see `hand_off`)."""
+        row = self.con.execute(
+            "SELECT value FROM _handoff WHERE tablename = ? AND key = ? "
+            "AND expires >= ?",
+            (self.tablename, key, time()),
+        ).fetchone()
+        if not row:
+            return None
+        try:
+            return pickle.loads(row[0])  # nosec: we only load what we stored
+        except Exception as e:
+            logger.debug(f"Could not load result handed off for {key}: {e}")
+            return None
+
+    def prune(self) -> int:
+        """Enforce our policy.
+
+        Returns:
+          The number of entries evicted.
+        """
+        max_bytes, max_entries, ttl = self.policy
+        table = self.tablename
+        evicted = 0
+        self.flush()
+        with self.write_lock:
+            con = self.con
+            if ttl:
+                keys = [
+                    k
+                    for k, in con.execute(
+                        f'SELECT key FROM "{table}" WHERE created < ?',
+                        (time() - ttl,),
+                    )
+                ]
+                self._evict(keys)
+                evicted += len(keys)
+            if max_entries is not None:
+                (count,) = con.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()
+                if count > max_entries:
+                    keys = [
+                        k
+                        for k, in con.execute(
+                            f'SELECT key FROM "{table}" ORDER BY accessed LIMIT ?',
+                            (count - max_entries,),
+                        )
+                    ]
+                    self._evict(keys)
+                    evicted += len(keys)
+            if max_bytes is not None:
+                (total,) = con.execute(
+                    f'SELECT COALESCE(SUM(size), 0) FROM "{table}"'
+                ).fetchone()
+                keys = []
+                rows = con.execute(f'SELECT key, size FROM "{table}" ORDER BY accessed')
+                for key, size in rows:
+                    if total <= max_bytes:
+                        break
+                    keys.append(key)
+                    total -= size or 0
+                self._evict(keys)
+                evicted += len(keys)
+            # forget touches of keys which are gone, however they went
+            con.execute(
+                "DELETE FROM _touched WHERE tablename = ? "
+                f'AND key NOT IN (SELECT key FROM "{table}")',
+                (table,),
+            )
+            con.commit()
+        if evicted:
+            logger.debug(f"Evicted {evicted} entries from {table}.")
+        return evicted
+
+
+class BlobStore:
+    """Content-addressed store for large payloads (pdfs, images) on disk.
+
+    Blobs live under `root` as `ab/cd/abcd...`, named by the sha256 of their
+    content, so the same data is only stored once.  They are written to a
+    temporary file and renamed into place, so a blob is either complete or
+    absent.  If `compress` is set (and zstandard is installed) blobs are stored
+    zstd-compressed with a `.zst` suffix; such blobs can't be linked and are
+    decompressed instead.
+    """
+
+    # seconds during which a new blob is kept even if nothing refers to it,
+    # as the row referring to it may not be committed yet
+    GRACE = 10 * 60
+
+    def __init__(self, root: Path, compress: bool = False) -> None:
+        self.root = root
+        self.compress = compress and zstandard is not None
+
+    @property
+    def tmpdir(self) -> Path:
+        """Scratch space on the same filesystem as the blobs."""
+        tmp = self.root / "tmp"
+        tmp.mkdir(exist_ok=True, parents=True)
+        return tmp
+
+    def path_for(self, digest: str) -> Path:
+        """Path of the (uncompressed) blob with the given digest."""
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def _find(self, digest: str) -> Optional[Path]:
+        path = self.path_for(digest)
+        for candidate in (path, path.with_suffix(".zst")):
+            if candidate.exists():
+                return candidate
+        return None
+
+    def __contains__(self, digest: str) -> bool:
+        return self._find(digest) is not None
+
+    def _store(self, fn: Path, digest: str) -> str:
+        """Move fn (in tmpdir) into the store as digest."""
+        existing = self._find(digest)
+        if existing:
+            fn.unlink()
+            # the new reference is not committed yet, so don't let gc see it
+            # as an old orphan
+            os.utime(existing)
+            return digest
+        path = self.path_for(digest)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        if self.compress:
+            compressed = fn.with_suffix(".zst")
+            with fn.open("rb") as inf, compressed.open("wb") as outf:
+                zstandard.ZstdCompressor().copy_stream(inf, outf)
+            fn.unlink()
+            fn, path = compressed, path.with_suffix(".zst")
+        # blobs may be hard linked elsewhere, so must never be written in place
+        fn.chmod(0o444)
+        fn.replace(path)
+        return digest
+
+    def put(self, data: bytes) -> str:
+        """Store data, returning its digest."""
+        with NamedTemporaryFile(dir=self.tmpdir, delete=False) as f:
+            f.write(data)
+        return self._store(Path(f.name), sha256(data).hexdigest())
+
+    def put_file(self, fn: Path) -> str:
+        """Move fn into the store, returning its digest.
+
+        fn should be on the same filesystem as the store (see `tmpdir`).
+        """
+        digest = sha256()
+        with fn.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return self._store(fn, digest.hexdigest())
+
+    def get(self, digest: str) -> bytes:
+        """Get the blob with the given digest.
+
+        Raises:
+          FileNotFoundError: If we don't have it.
+        """
+        path = self._find(digest)
+        if not path:
+            raise FileNotFoundError(digest)
+        data = path.read_bytes()
+        if path.suffix == ".zst":
+            return zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def size(self, digest: str) -> int:
+        """Size of the blob with the given digest as stored."""
+        path = self._find(digest)
+        if not path:
+            raise FileNotFoundError(digest)
+        return path.stat().st_size
+
+    def remove(self, digest: str) -> None:
+        """Remove the blob with the given digest, if we have it."""
+        path = self.path_for(digest)
+        for candidate in (path, path.with_suffix(".zst")):
+            candidate.unlink(missing_ok=True)
+
+    def gc(self, live: Set[str]) -> int:
+        """Remove every blob whose digest is not in live.
+
+        Blobs stored in the last `GRACE` seconds are kept, since the rows
+        referring to them may still be waiting to be committed.
+
+        Returns:
+          The number of blobs removed.
+        """
+        removed = 0
+        cutoff = time() - self.GRACE
+        for path in self.root.glob("??/??/*"):
+            if path.name.split(".")[0] in live:
+                continue
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+        return removed
+
+    def link(self, digest: str, dest: Path) -> None:
+        """Make dest a copy of the blob, hard linking it if possible.
+
+        Raises:
+          FileNotFoundError: If we don't have it.
+        """
+        path = self._find(digest)
+        if not path:
+            raise FileNotFoundError(digest)
+        dest.unlink(missing_ok=True)
+        if path.suffix == ".zst":
+            with path.open("rb") as inf, dest.open("wb") as outf:
+                zstandard.ZstdDecompressor().copy_stream(inf, outf)
+            return
+        try:
+            os.link(path, dest)
+        except OSError:
+            # different filesystem, or one without hard links
+            shutil.copyfile(path, dest)
+
+
+blobs = BlobStore(cachedir / "blobs", compress=bool(getenv("BLOB_COMPRESS", False)))
+
+
+class BlobCached(Cached):
+    """Cached resource whose (bytes) values are kept in a `BlobStore`.
+
+    Only the key to digest index lives in sqlite.
+    """
+
+    def __init__(
+        self,
+        cachename: str,
+        *args: Any,
+        store: Optional[BlobStore] = None,
+        **kwargs: Any,
+    ) -> None:
+        self.store = store or blobs
+        kwargs.setdefault("codec", DigestCodec.name)
+        super().__init__(cachename, *args, **kwargs)
+
+    def digest(self, key: str, count: bool = True) -> Optional[str]:
+        """Digest of the blob stored under key, if we have it.
+
+        The lookup is only counted in the stats if count is set.
+        """
+        if count:
+            try:
+                digest = super().__getitem__(key)
+            except KeyError:
+                return None
+        else:
+            digest = super().peek(key)
+        if digest is None:
+            return None
+        if digest not in self.store:
+            logger.debug(f"Blob for {key} has gone missing.")
+            self.memory.discard(key)
+            return None
+        return digest
+
+    def __getitem__(self, key: str) -> bytes:
+        digest = self.digest(key)
+        if not digest:
+            raise KeyError(key)
+        return self.store.get(digest)
+
+    def peek(self, key: str) -> Optional[bytes]:
+        digest = self.digest(key, count=False)
+        return self.store.get(digest) if digest else None
+
+    def __setitem__(self, key: str, val: bytes) -> None:
+        self._set_digest(key, self.store.put(val))
+
+    def put_file(self, key: str, fn: Path) -> None:
+        """Move fn into the store as the value for key."""
+        self._set_digest(key, self.store.put_file(fn))
+
+    def _set_digest(self, key: str, digest: str) -> None:
+        # the row accounts for the blob, not the digest
+        self._set(key, digest, self.codec.dumps(digest), self.store.size(digest))
+
+    def digests(self) -> Set[str]:
+        """Digests of every blob we refer to."""
+        self.flush()
+        with self.write_lock:
+            rows = self.con.execute(f'SELECT value FROM "{self.tablename}"').fetchall()
+        return {self.codec.loads(value) for value, in rows}
+
+    def _evict(self, keys: List[str]) -> None:
+        placeholders = ",".join("?" * len(keys))
+        rows = self.con.execute(
+            f'SELECT DISTINCT value FROM "{self.tablename}" '  # skipcq: BAN-B608
+            f"WHERE key IN ({placeholders})",
+            keys,
+        ).fetchall()
+        super()._evict(keys)
+        for (value,) in rows:
+            # blobs are shared between keys with the same content
+            if not self.con.execute(
+                f'SELECT 1 FROM "{self.tablename}" WHERE value = ?', (value,)
+            ).fetchone():
+                self.store.remove(self.codec.loads(value))
+
+    def link(self, key: str, dest: Path) -> bool:
+        """Link (or copy) the blob for key to dest.
+
+        Returns:
+          Whether we had the blob.
+        """
+        digest = self.digest(key)
+        if not digest:
+            return False
+        self.store.link(digest, dest)
+        return True
+
+
+def _alive(pid: int) -> bool:
+    """Whether a process with the given pid is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one.
+
+    Within a process, callers asking for a key which is already being computed
+    wait for that computation and share its result (or exception).  If
+    `across_processes` is set the first caller also claims the key in the cache
+    database (see `Cached.claim`); callers in other processes poll the cache
+    until the result appears (or is handed off, if it isn't cached: see
+    `Cached.hand_off`) or the claim goes away, in which case they claim it
+    themselves.  Claiming costs a few transactions per miss, so is only worth
+    it for calls which are slow or which we don't want to repeat.
+    """
+
+    POLL = 0.1
+    LOCK_TIMEOUT = 120
+
+    def __init__(self, table: Cached, across_processes: bool = True) -> None:
+        self.table = table
+        self.across_processes = across_processes
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._async_calls: Dict[Tuple[int, str], "asyncio.Future"] = {}
+
+    def do(self, key: str, call: Callable[[], Any], lookup: Callable[[], Any]) -> Any:
+        """Get the result of call for key, unless someone else is.
+
+        Args:
+          key: Key of the call.
+          call: Function computing (and caching) the result.
+          lookup: Function looking the result up in the cache, returning None
+            if it isn't there.  It is called repeatedly while polling.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+        assert future
+        if not owner:
+            return future.result()
+        try:
+            if self.across_processes:
+                result = self._across_processes(key, call, lookup)
+            else:
+                # whoever was computing it may have finished just before
+                result = lookup()
+                if result is None:
+                    result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def _across_processes(
+        self, key: str, call: Callable[[], Any], lookup: Callable[[], Any]
+    ) -> Any:
+        waited = False
+        while not self.table.claim(key, self.LOCK_TIMEOUT):
+            waited = True
+            sleep(self.POLL)
+            result = self._poll(key, lookup)
+            if result is not None:
+                return result
+        try:
+            # whoever held the claim may have finished just before we got it
+            result = self._poll(key, lookup) if waited else lookup()
+            if result is None:
+                result = call()
+                self._hand_off(key, result, lookup)
+            return result
         finally:
-            self.write_lock.release()
+            self.table.release(key)
+
+    def _poll(self, key: str, lookup: Callable[[], Any]) -> Any:
+        # only waiters look at handed off results, which aren't a cache
+        result = lookup()
+        return self.table.handed_off(key) if result is None else result
+
+    def _hand_off(self, key: str, result: Any, lookup: Callable[[], Any]) -> None:
+        # waiters find cached results on their own
+        if result is not None and lookup() is None:
+            self.table.hand_off(key, result)
+
+    async def do_async(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        lookup: Callable[[], Any],
+    ) -> Any:
+        """Get the result of call for key, unless someone else is (Async version)."""
+        loop = asyncio.get_running_loop()
+        flight = (id(loop), key)
+        future = self._async_calls.get(flight)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = self._async_calls[flight] = loop.create_future()
+        # the database may be locked by other processes, so is only touched
+        # from threads
+        waited = False
+        try:
+            while self.across_processes and not await asyncio.to_thread(
+                self.table.claim, key, self.LOCK_TIMEOUT
+            ):
+                waited = True
+                await asyncio.sleep(self.POLL)
+                result = await asyncio.to_thread(self._poll, key, lookup)
+                if result is not None:
+                    break
+            else:
+                try:
+                    if waited:
+                        result = await asyncio.to_thread(self._poll, key, lookup)
+                    else:
+                        result = await asyncio.to_thread(lookup)
+                    if result is None:
+                        result = await call()
+                        if self.across_processes:
+                            await asyncio.to_thread(self._hand_off, key, result, lookup)
+                finally:
+                    if self.across_processes:
+                        await asyncio.to_thread(self.table.release, key)
+        except BaseException as e:
+            future.set_exception(e)
+            # nobody may be waiting, which asyncio would complain about
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[flight]
+        future.set_result(result)
+        return result
+
+
+def default_key(*args: Any, **kwargs: Any) -> Any:
+    """Fingerprint of a call: all its arguments.
+
+    This is slow and brittle for arguments which are objects, so functions
+    taking them should be decorated with a key function of their own.
+    """
+    return jsonpickle.dumps((*args, sorted(kwargs.items())), unpicklable=False)
 
 
-def cache_factory(cachename: str, enabled: bool) -> Callable:
-    _cache = Cached(cachename)
+def make_key(fn: Callable, fingerprint: Any) -> str:
+    """Fixed-size cache key for a call of fn with the given fingerprint."""
+    canonical = json.dumps((fn.__qualname__, fingerprint), sort_keys=True, default=repr)
+    return blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def cache_factory(
+    cachename: str,
+    enabled: bool,
+    cache_class: Type[Cached] = Cached,
+    negative: bool = False,
+    across_processes: Optional[bool] = None,
+) -> Callable:
+    """Make a decorator caching the results of functions in a table.
+
+    The decorator can be used bare, or with a `key` function, which is called
+    with the same arguments as the decorated function and should return a
+    small fingerprint of the call (say, a url) from which the cache key is
+    hashed.  Without one every argument is serialised (see `default_key`).
+
+    Failed calls are only cached if the decorator is given a `failure`
+    function, which is called with the result and returns None if the call
+    succeeded, True if it failed permanently (say, a 404) and False if it
+    failed but might succeed next time.  Permanent failures are then kept in
+    a separate table with a shorter ttl (see `NEGATIVE_TTL`) and transient
+    ones are never cached.
+
+    Results can be stored in a more compact form than the one returned by
+    giving the decorator a `pack` function, and an `unpack` function which
+    undoes it on the way out.
+
+    Concurrent identical calls in this process are coalesced into one, as are
+    those in other processes if `across_processes` is set (see `SingleFlight`),
+    whether or not results are cached.  The decorator can also be given
+    `across_processes`, overriding the factory's for that function.
+
+    Args:
+      cachename: Name of the table.
+      enabled: Whether to cache results.
+      cache_class: Class of the table.
+      negative: Whether to cache permanent failures, even if not enabled.
+      across_processes: Whether to coalesce calls across processes.  Defaults
+        to doing so for blob tables, whose calls are expensive.
+    """
+    _cache = cache_class(cachename)
+    negative_name = f"{cachename}_negative"
+    # only made once a function with a failure classifier is decorated
+    negatives: List[Cached] = []
+    negative = negative or enabled
+
+    def negative_table() -> Cached:
+        if not negatives:
+            policy = POLICIES.get(negative_name, Policy(ttl=NEGATIVE_TTL))
+            negatives.append(Cached(negative_name, policy=policy))
+        return negatives[0]
+
+    if across_processes is None:
+        across_processes = issubclass(cache_class, BlobCached)
+    default_across_processes = across_processes
+
+    def decorator(
+        fn: Optional[Callable] = None,
+        *,
+        key: Callable = default_key,
+        failure: Optional[Callable[[Any], Optional[bool]]] = None,
+        pack: Optional[Callable[[Any], Any]] = None,
+        unpack: Optional[Callable[[Any], Any]] = None,
+        across_processes: Optional[bool] = None,
+    ) -> Callable:
+        if fn is None:
+            return partial(
+                decorator,
+                key=key,
+                failure=failure,
+                pack=pack,
+                unpack=unpack,
+                across_processes=across_processes,
+            )
+
+        use_negative = negative and failure is not None
+        _negative = negative_table() if use_negative else None
+        # concurrent identical calls wait for one another, even uncached
+        if across_processes is None:
+            across_processes = default_across_processes
+        flight = SingleFlight(_cache, across_processes)
+
+        def lookup(k: str, poll: bool = False) -> Any:
+            # polling for another caller's result isn't a lookup of our own
+            if enabled:
+                resp = _cache.peek(k) if poll else _cache.get(k)
+                if resp:
+                    return unpack(resp) if unpack else resp
+            if _negative is not None:
+                return _negative.peek(k) if poll else _negative.get(k)
+            return None
+
+        def store(k: str, resp: Any) -> None:
+            outcome = failure(resp) if failure else None
+            if outcome is None:
+                if enabled and resp:
+                    _cache[k] = pack(resp) if pack else resp
+            elif outcome and _negative is not None:
+                _negative[k] = resp
+
+        if iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                k = make_key(fn, key(*args, **kwargs))
+                # the database may be locked by other processes
+                resp = await asyncio.to_thread(lookup, k)
+                if resp is not None:
+                    return resp
+
+                async def call() -> Any:
+                    resp = await fn(*args, **kwargs)
+                    store(k, resp)
+                    return resp
+
+                return await flight.do_async(k, call, partial(lookup, k, True))
+
+            return async_wrapper
 
-    def decorator(fn: Callable) -> Callable:
         @wraps(fn)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            if enabled:
-                key = jsonpickle.dumps(
-                    (*args, sorted(kwargs.items())), unpicklable=False
-                )
-                resp = _cache.get(key)
-                if not resp:
-                    resp = fn(*args, **kwargs)
-                    _cache[key] = resp
+            k = make_key(fn, key(*args, **kwargs))
+            resp = lookup(k)
+            if resp is not None:
+                return resp
+
+            def call() -> Any:
+                resp = fn(*args, **kwargs)
+                store(k, resp)
                 return resp
-            return fn(*args, **kwargs)
+
+            return flight.do(k, call, partial(lookup, k, True))
 
         return wrapper
 
@@ -92,27 +1395,342 @@ def cache_factory(cachename: str, enabled: bool) -> Callable:
 
 
 response_cache_enabled = bool(getenv("RESPONSE_CACHE", False))
-response_cache = cache_factory("responses", response_cache_enabled)
+negative_cache_enabled = bool(getenv("NEGATIVE_CACHE", False))
+response_cache = cache_factory(
+    "responses", response_cache_enabled, negative=negative_cache_enabled
+)
+
+parsed_cache_enabled = bool(getenv("PARSED_CACHE", False))
+parsed_cache = cache_factory("parsed", parsed_cache_enabled)
 
 data_cache_enabled = bool(getenv("DATA_CACHE", False))
-_data_cache = Cached("data")
-img_data_cache = cache_factory("img_data", data_cache_enabled)
+_data_cache = BlobCached("data_blobs")
+img_data_cache = cache_factory("img_data_blobs", data_cache_enabled, BlobCached)
+
+
+def _connect_cache() -> sqlite3.Connection:
+    cache = Cached.cachedir / Cached.CACHEFN
+    cache.parent.mkdir(exist_ok=True, parents=True)
+    return sqlite3.connect(cache, timeout=Cached.BUSY_TIMEOUT)
+
+
+def _table_names(con: sqlite3.Connection) -> List[str]:
+    """Names of the cache tables in a database, leaving out internal ones."""
+    return [
+        name
+        for name, in con.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'"
+        )
+    ]
+
+
+def _open_table(name: str, codec: Optional[str] = None) -> Cached:
+    """The table called name, as open in this process if it is.
 
+    Otherwise the table is opened as a plain `Cached` (or a `BlobCached` if
+    it holds digests) with its default policy.
+    """
+    table = Cached.tables.get((str(Cached.cachedir / Cached.CACHEFN), name))
+    if table is not None:
+        return table
+    table = Cached(name, codec=codec or PickleCodec.name)
+    if table.codec is DigestCodec:
+        table = BlobCached(name)
+    return table
 
-def download(url: str, **kwargs: Any) -> Optional[str]:
+
+def prune(vacuum: bool = False) -> Dict[str, int]:
+    """Enforce the policy of every table in the cache.
+
+    Tables which are not open in this process are pruned as plain `Cached`
+    tables with their default policy.  Blobs no longer referred to by any
+    table are removed.
+
+    Args:
+      vacuum: Whether to vacuum the database afterwards to reclaim space.
+
+    Returns:
+      The number of entries evicted from each table.
+    """
+    con = _connect_cache()
+    evicted = {}
+    live: Set[str] = set()
+    stores = set()
+    for name in _table_names(con):
+        table = _open_table(name)
+        evicted[name] = table.prune()
+        if isinstance(table, BlobCached):
+            live |= table.digests()
+            stores.add(table.store)
+    for store in stores:
+        removed = store.gc(live)
+        if removed:
+            logger.debug(f"Removed {removed} unreferenced blobs from {store.root}.")
+    if vacuum:
+        con.execute("VACUUM")
+    con.close()
+    return evicted
+
+
+def stats(largest: int = 3) -> Dict[str, Dict[str, Any]]:
+    """Statistics for every table in the cache.
+
+    Args:
+      largest: How many of the largest keys to report per table.
+
+    Returns:
+      For each table its `entries`, total `bytes`, `largest` keys as (key,
+      size) pairs, and `last_run`: the `TableStats` of the most recent run
+      which used the table, if any.
+    """
+    _flush_open_caches()
+    con = _connect_cache()
+    report = {}
+    try:
+        last_run = dict(
+            con.execute(
+                "SELECT tablename, run FROM _stats s WHERE started = "
+                "(SELECT max(started) FROM _stats WHERE tablename = s.tablename)"
+            )
+        )
+    except sqlite3.OperationalError:  # no stats yet
+        last_run = {}
+    for name in _table_names(con):
+        entries, size = con.execute(
+            f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM "{name}"'
+        ).fetchone()
+        run = None
+        if name in last_run:
+            row = con.execute(
+                f"SELECT {', '.join(TableStats.FIELDS)} FROM _stats "
+                "WHERE run = ? AND tablename = ?",
+                (last_run[name], name),
+            ).fetchone()
+            run = TableStats(**dict(zip(TableStats.FIELDS, row)))
+        report[name] = dict(
+            entries=entries,
+            bytes=size,
+            largest=con.execute(
+                f'SELECT key, size FROM "{name}" ORDER BY size DESC LIMIT ?',
+                (largest,),
+            ).fetchall(),
+            last_run=run,
+        )
+    con.close()
+    return report
+
+
+BUNDLE_VERSION = 1
+
+
+def export_bundle(
+    path: Path,
+    tables: Optional[List[str]] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    tag: Optional[str] = None,
+) -> Dict[str, int]:
+    """Export (part of) the cache to a bundle, to be imported elsewhere.
+
+    A bundle is an sqlite database holding the selected rows of each table,
+    the tables' codecs and, for tables of blobs, the blobs themselves.  It is
+    versioned with `BUNDLE_VERSION` in its user_version.
+
+    Args:
+      path: Bundle to write.  Any existing file is replaced.
+      tables: Tables to export.  Defaults to all of them.
+      since: Only export entries written at or after this timestamp.
+      until: Only export entries written at or before this timestamp.
+      tag: Only export entries touched under this tag (see
+        `Cached.touch_tag`).
+
+    Returns:
+      The number of entries exported from each table.
+
+    Raises:
+      ValueError: If any of tables is neither in the cache nor open.
+    """
+    _flush_open_caches()
+    con = _connect_cache()
+    path_key = str(Cached.cachedir / Cached.CACHEFN)
+    known = set(_table_names(con))
+    known |= {name for p, name in list(Cached.tables) if p == path_key}
+    unknown = set(tables or ()) - known
+    if unknown:
+        con.close()
+        raise ValueError(f"No such table in the cache: {', '.join(sorted(unknown))}.")
+    path.unlink(missing_ok=True)
+    con.execute("ATTACH DATABASE ? AS bundle", (str(path),))
+    con.execute(f"PRAGMA bundle.user_version = {BUNDLE_VERSION}")
+    con.execute("CREATE TABLE bundle._codecs (tablename TEXT PRIMARY KEY, codec TEXT)")
+    con.execute("CREATE TABLE bundle._blobs (digest TEXT PRIMARY KEY, data BLOB)")
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("created >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("created <= ?")
+        params.append(until)
+    exported = {}
+    for name in tables or _table_names(con):
+        table = _open_table(name)
+        codec = table.codec.name  # creating the table if need be
+        where: List[str] = list(conditions)
+        args: List[Any] = list(params)
+        if tag is not None:
+            where.append(
+                "key IN (SELECT key FROM _touched WHERE tag = ? AND tablename = ?)"
+            )
+            args += [tag, name]
+        query = f'SELECT key, value, size, created, accessed FROM main."{name}"'
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        con.execute(
+            f'CREATE TABLE bundle."{name}" '
+            "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL)"
+        )
+        cursor = con.execute(f'INSERT INTO bundle."{name}" {query}', args)
+        exported[name] = cursor.rowcount
+        con.execute("INSERT INTO bundle._codecs VALUES (?,?)", (name, codec))
+        if isinstance(table, BlobCached):
+            for (digest,) in con.execute(f'SELECT value FROM bundle."{name}"'):
+                try:
+                    data = table.store.get(digest)
+                except FileNotFoundError:
+                    continue
+                con.execute(
+                    "INSERT OR IGNORE INTO bundle._blobs VALUES (?,?)", (digest, data)
+                )
+    con.commit()
+    con.execute("DETACH DATABASE bundle")
+    con.close()
+    bundle = sqlite3.connect(path)
+    bundle.execute("VACUUM")
+    bundle.close()
+    return exported
+
+
+def import_bundle(path: Path, trusted: bool = False) -> Dict[str, int]:
+    """Merge a bundle made by `export_bundle` into the cache.
+
+    Entries we already have are only replaced by newer ones from the bundle.
+    Values are re-encoded if the bundle's codec for a table differs from ours.
+
+    Most tables are pickled, and unpickling runs whatever code the pickle asks
+    for: a bundle holding such tables is only imported if it is trusted, i.e.
+    made by `export_bundle` on a machine you control.
+
+    Args:
+      path: Bundle to import.
+      trusted: Whether to import tables whose codec is not `Codec.safe`.
+
+    Returns:
+      The number of entries added or updated in each table.
+
+    Raises:
+      ValueError: If the bundle is not one we can read, or is not trusted and
+        holds pickled tables.
+    """
+    bundle = sqlite3.connect(path)
+    try:
+        (version,) = bundle.execute("PRAGMA user_version").fetchone()
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version {version} in {path}.")
+        codecs = dict(bundle.execute("SELECT tablename, codec FROM _codecs"))
+        unknown = set(codecs.values()) - set(CODECS)
+        if unknown:
+            raise ValueError(f"Unknown codecs {', '.join(sorted(unknown))} in {path}.")
+        unsafe = sorted(
+            name for name, codec in codecs.items() if not CODECS[codec].safe
+        )
+        if unsafe and not trusted:
+            raise ValueError(
+                f"{path} holds pickled tables ({', '.join(unsafe)}), "
+                "which are only imported from a trusted bundle."
+            )
+        imported = {}
+        for name, codec in codecs.items():
+            table = _open_table(name, codec)
+            rows = bundle.execute(
+                f'SELECT key, value, size, created, accessed FROM "{name}"'
+            ).fetchall()
+            if table.codec.name != codec:
+                theirs: Type[Codec] = CODECS[codec]
+                rows = [
+                    (key, table.codec.dumps(theirs.loads(value)), *rest)
+                    for key, value, *rest in rows
+                ]
+            if isinstance(table, BlobCached):
+                for (digest,) in {(row[1],) for row in rows}:
+                    if digest not in table.store:
+                        blob = bundle.execute(
+                            "SELECT data FROM _blobs WHERE digest = ?", (digest,)
+                        ).fetchone()
+                        if blob:
+                            table.store.put(blob[0])
+            table.flush()
+            with table.write_lock:
+                con = table.con
+                before = con.total_changes
+                with con:
+                    con.executemany(
+                        f'INSERT INTO "{name}" '
+                        "(key, value, size, created, accessed) VALUES (?,?,?,?,?) "
+                        "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                        "size = excluded.size, created = excluded.created, "
+                        "accessed = max(accessed, excluded.accessed) "
+                        "WHERE excluded.created > created",
+                        rows,
+                    )
+                imported[name] = con.total_changes - before
+            table.memory.clear()
+        return imported
+    finally:
+        bundle.close()
+
+
+def download(
+    url: str, valid: Optional[Callable[[Path], bool]] = None, **kwargs: Any
+) -> Optional[str]:
+    """Download url, through the data cache if it is enabled.
+
+    Args:
+      url: Url to download.
+      valid: Function telling whether a downloaded file is what we asked for
+        (and not, say, an error page).  Files which aren't are never cached
+        nor served from the cache.
+      **kwargs: Passed on to `requests_downloader.downloader.download`.
+    """
     outdir = Path(kwargs.get("download_dir", "."))
     if data_cache_enabled:
-        data = _data_cache.get(url)
-        if not data:
-            with TemporaryDirectory() as tmpdir:
-                kwargs["download_dir"] = tmpdir
-                fn = downloader.download(url, **kwargs)
-                assert fn
-                with (Path(tmpdir) / fn).open("rb") as f:
-                    data = f.read()
-                _data_cache[url] = data
         outf = outdir / kwargs["download_file"]
-        with outf.open("wb") as f:
-            f.write(data)
+        if _data_cache.link(url, outf):
+            if not valid or valid(outf):
+                return str(outf)
+            logger.debug(f"Dropping invalid download of {url} from cache.")
+            _data_cache.discard(url)
+        with TemporaryDirectory(dir=_data_cache.store.tmpdir) as tmpdir:
+            kwargs["download_dir"] = tmpdir
+            kwargs["download_file"] = "download"
+            fn = downloader.download(url, **kwargs)
+            assert fn
+            path = Path(tmpdir) / fn
+            if valid and not valid(path):
+                # outf may be a link to a blob, which must not be written to
+                outf.unlink(missing_ok=True)
+                shutil.copyfile(path, outf)
+                return str(outf)
+            # put_file moves path away: keep it until the blob is linked
+            keep = path.with_name("keep")
+            try:
+                os.link(path, keep)
+            except OSError:
+                shutil.copyfile(path, keep)
+            _data_cache.put_file(url, path)
+            if not _data_cache.link(url, outf):
+                # the blob has already gone, say evicted by another process
+                outf.unlink(missing_ok=True)
+                shutil.copyfile(keep, outf)
         return str(outf)
     return downloader.download(url, **kwargs)
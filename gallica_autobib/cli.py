@@ -1,10 +1,11 @@
 import logging
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 import typer
 
-from . import __version__
+from . import __version__, cache
 from .pipeline import BibtexParser, RisParser
 from .process import process_pdf
 from .query import DownloadableResource
@@ -18,6 +19,13 @@ class AutoBibError(Exception):
 
 log_level = [logging.NOTSET, logging.ERROR, logging.DEBUG]
 app = typer.Typer()
+cache_app = typer.Typer(help="Manage the cache.")
+app.add_typer(cache_app, name="cache")
+
+
+def bibliography_tag(bibfile: Path) -> str:
+    """Tag under which cache entries used for bibfile are recorded."""
+    return str(bibfile.resolve())
 
 
 def version_callback(value: bool) -> None:
@@ -54,13 +62,30 @@ def process_bibliograpy(
     suppress_cover_page: bool = typer.Option(
         False, help="Suppress Gallica's cover page."
     ),
+    block_concurrency: int = typer.Option(
+        1, help="Number of pdf blocks to download at once for each document."
+    ),
+    adaptive_blocks: bool = typer.Option(
+        False, help="Adapt the size of pdf blocks to the measured throughput."
+    ),
+    stream_blocks: bool = typer.Option(
+        False,
+        help="Assemble pdf blocks in memory as they arrive. Such downloads cannot be resumed.",
+    ),
+    batch: bool = typer.Option(
+        False, help="Match articles from the same journal together."
+    ),
 ) -> None:
     """
     Process a bibliography file.
 
     """
     process_args = {"preserve_text": preserve_text}
-    download_args: Dict[str, bool] = {}
+    download_args: Dict[str, int] = {
+        "concurrency": block_concurrency,
+        "adaptive": adaptive_blocks,
+        "stream": stream_blocks,
+    }
     logging.basicConfig(level=log_level[verbosity])
 
     args = dict(
@@ -83,6 +108,9 @@ def process_bibliograpy(
 
     parser.processes = processes
     parser.suppress_cover_page = suppress_cover_page
+    parser.batch = batch
+    # so that `cache export --bibliography` can find what we used
+    cache.Cached.touch_tag = bibliography_tag(bibfile)
     with bibfile.open() as f:
         parser.read(f)
     report = parser.run()
@@ -104,11 +132,20 @@ def fetch(
     suppress_cover_page: bool = typer.Option(
         False, help="Suppress Gallica's cover page."
     ),
+    block_concurrency: int = typer.Option(
+        1, help="Number of pdf blocks to download at once."
+    ),
+    adaptive_blocks: bool = typer.Option(
+        False, help="Adapt the size of pdf blocks to the measured throughput."
+    ),
+    stream_blocks: bool = typer.Option(
+        False,
+        help="Assemble pdf blocks in memory as they arrive. Such downloads cannot be resumed.",
+    ),
 ) -> None:
     """Fetch a single resource to a pdf."""
 
     process_args = {"preserve_text": preserve_text}
-    download_args: Dict[str, bool] = {}
 
     logging.basicConfig(level=log_level[verbosity])
     logger = logging.getLogger("CLI")
@@ -116,7 +153,12 @@ def fetch(
     resource = DownloadableResource()
     resource.ark = ark
     resource.set_max_pages()
-    resource.download_pdf(outf)
+    resource.download_pdf(
+        outf,
+        concurrency=block_concurrency,
+        adaptive=adaptive_blocks,
+        stream=stream_blocks,
+    )
     if post_process:
         logger.debug("Processing...")
         processed = process_pdf(
@@ -133,5 +175,83 @@ def fetch(
         print(f"Original file at {outf}")
 
 
+@cache_app.command("prune")
+def prune_cache(
+    vacuum: bool = typer.Option(False, help="Reclaim free space afterwards."),
+) -> None:
+    """Evict expired and least recently used entries from the cache."""
+    evicted = cache.prune(vacuum=vacuum)
+    for table, n in evicted.items():
+        print(f"{table}: evicted {n} entries")
+    print(f"Evicted {sum(evicted.values())} entries in total.")
+
+
+@cache_app.command("stats")
+def cache_stats(
+    largest: int = typer.Option(3, help="Number of largest keys to show per table."),
+) -> None:
+    """Show how big the cache is and how well it did in the last run."""
+    for table, info in cache.stats(largest=largest).items():
+        print(f"{table}: {info['entries']} entries, {info['bytes'] / 2**20:.1f} MiB")
+        run = info["last_run"]
+        if run and run.lookups:
+            print(
+                f"  last run: {run.hits:.0f} hits ({run.memory_hits:.0f} from memory), "
+                f"{run.misses:.0f} misses, hit ratio {run.hit_ratio:.0%}, "
+                f"mean lookup {run.mean_lookup * 1000:.2f} ms, "
+                f"{run.bytes_read / 2**20:.1f} MiB read, "
+                f"{run.bytes_written / 2**20:.1f} MiB written"
+            )
+        for key, size in info["largest"]:
+            print(f"  {size / 2**10:.1f} KiB {key}")
+
+
+@cache_app.command("export")
+def export_cache(
+    bundle: Path = typer.Argument(..., help="Bundle to write."),
+    table: Optional[List[str]] = typer.Option(
+        None, help="Table to export (may be repeated).  Default is all of them."
+    ),
+    since: Optional[datetime] = typer.Option(
+        None, help="Only export entries written since."
+    ),
+    until: Optional[datetime] = typer.Option(
+        None, help="Only export entries written until."
+    ),
+    bibliography: Optional[Path] = typer.Option(
+        None, help="Only export entries used while processing this bibliography."
+    ),
+) -> None:
+    """Export the cache to a bundle, to be imported on another machine."""
+    try:
+        exported = cache.export_bundle(
+            bundle,
+            tables=table or None,
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None,
+            tag=bibliography_tag(bibliography) if bibliography else None,
+        )
+    except ValueError as e:
+        raise AutoBibError(str(e))
+    for name, n in exported.items():
+        print(f"{name}: exported {n} entries")
+
+
+@cache_app.command("import")
+def import_cache(
+    bundle: Path = typer.Argument(..., help="Bundle to import."),
+    trust: bool = typer.Option(
+        False, help="Import pickled tables, which can run arbitrary code."
+    ),
+) -> None:
+    """Merge a bundle made by `cache export` into the cache."""
+    try:
+        imported = cache.import_bundle(bundle, trusted=trust)
+    except ValueError as e:
+        raise AutoBibError(str(e))
+    for name, n in imported.items():
+        print(f"{name}: imported {n} entries")
+
+
 if __name__ == "__main__":
     app()
@@ -17,23 +17,215 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 https://github.com/GeoHistoricalData/gallipy
 """
+import asyncio
 import json
+import logging
+import os
 import urllib.parse
-from time import sleep
+import weakref
+from xml.parsers.expat import ExpatError, ParserCreate
 
 import httpx
 from bs4 import BeautifulSoup
+from xmltodict import parse as parsexmltodict
 
+from ..ratelimit import limiter
 from .monadic import Either, Left
 
 _BASE_PARTS = {"scheme": "https", "netloc": "gallica.bnf.fr"}
 USER_AGENT = "gallica-autobib/0.1"
+MAX_RETRIES = 5
+# statuses after which there's no point asking again
+PERMANENT_STATUSES = (404, 410)
+
+logger = logging.getLogger(__name__)
+
+_client_config = {
+    "max_connections": 10,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+}
+_client = None
+_client_pid = None
+_async_clients = weakref.WeakKeyDictionary()
+_async_client = None
+
+
+def configure_client(
+    max_connections=None,
+    max_keepalive_connections=None,
+    keepalive_expiry=None,
+    http2=None,
+):
+    """Configures the shared HTTP client.
+
+    The current client (if any) is closed, and a new one will be built with
+    the new settings on the next request.
+
+    Args:
+        max_connections (:obj:int, optional): Maximum number of concurrent connections.
+        max_keepalive_connections (:obj:int, optional): Maximum number of idle
+            connections kept alive in the pool.
+        keepalive_expiry (:obj:float, optional): Seconds after which an idle
+            connection is closed.
+        http2 (:obj:bool, optional): Whether to negotiate HTTP/2. Requires the
+            optional `h2` package.
+    """
+    options = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "http2": http2,
+    }
+    _client_config.update({k: v for k, v in options.items() if v is not None})
+    set_client(None)
+    _async_clients.clear()
+
+
+def _build_client(cls=httpx.Client):
+    """Builds a pooled, keep-alive client from the current configuration."""
+    limits = httpx.Limits(
+        max_connections=_client_config["max_connections"],
+        max_keepalive_connections=_client_config["max_keepalive_connections"],
+        keepalive_expiry=_client_config["keepalive_expiry"],
+    )
+    headers = {"user-agent": USER_AGENT}
+    try:
+        return cls(limits=limits, headers=headers, http2=_client_config["http2"])
+    except ImportError:
+        logger.warning("HTTP/2 requested but h2 is not installed; using HTTP/1.1.")
+        return cls(limits=limits, headers=headers)
+
+
+def get_client():
+    """Returns the shared HTTP client for this process.
+
+    Connections cannot be shared between processes, so a new client is built
+    lazily in every process (e.g. after a fork).
+
+    Returns:
+        httpx.Client: The client.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = _build_client()
+        _client_pid = os.getpid()
+    return _client
+
+
+def set_client(client):
+    """Replaces the shared HTTP client, e.g. to inject a mock in tests.
+
+    Args:
+        client (httpx.Client): The client to use, or None to close the current
+            client and build a new one on the next request.
+    """
+    global _client, _client_pid
+    if _client is not None and _client is not client and _client_pid == os.getpid():
+        _client.close()
+    _client = client
+    _client_pid = os.getpid() if client is not None else None
+
+
+def get_async_client():
+    """Returns the shared asynchronous HTTP client for the running event loop.
+
+    An AsyncClient is bound to the loop it was first used in, so one client
+    is kept per loop.
+
+    Returns:
+        httpx.AsyncClient: The client.
+    """
+    if _async_client is not None:
+        return _async_client
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = _build_client(httpx.AsyncClient)
+    return client
+
+
+def set_async_client(client):
+    """Replaces the shared asynchronous HTTP client, e.g. to inject a mock in tests.
+
+    Args:
+        client (httpx.AsyncClient): The client to use in every event loop, or
+            None to go back to one pooled client per loop.
+    """
+    global _async_client
+    _async_client = client
+
+
+async def close_async_client():
+    """Closes the asynchronous HTTP client of the running event loop, if any."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class EmptyResponseError(Exception):
+    """The server answered, but with nothing."""
+
+
+def _unwrap_response(res, url):
+    """Raises on HTTP errors and empty responses, or returns the content."""
+    res.raise_for_status()
+    if res.text:
+        return Either.pure(res.text)
+    else:
+        raise EmptyResponseError("Empty response from {}".format(url))
+
+
+def _fetch_error(url, ex):
+    """Wraps ex in a Left(URLError).
+
+    The error has a `status` attribute (the HTTP status, or None if we got no
+    response) and a `permanent` attribute, which is True if asking again will
+    not help (a 404 or 410, or an empty response).
+    """
+    pattern = "Error while fetching URL {}\n{}"
+    err = urllib.error.URLError(pattern.format(url, str(ex)))
+    err.status = (
+        ex.response.status_code if isinstance(ex, httpx.HTTPStatusError) else None
+    )
+    err.permanent = err.status in PERMANENT_STATUSES or isinstance(
+        ex, EmptyResponseError
+    )
+    return Left(err)
+
+
+def is_permanent_failure(either):
+    """Whether either is a failure which asking again will not fix.
+
+    Args:
+        either (Either): The result of a fetch.
+
+    Returns:
+        bool: True for permanent failures, False for transient ones, None if
+            either is not a failure at all.
+    """
+    if not either.is_left:
+        return None
+    return getattr(either.value, "permanent", False)
+
+
+def retry_after(res):
+    """Seconds the server asked us to wait before retrying, if any."""
+    for header in ("retry-after", "wait-until"):
+        try:
+            return float(res.headers[header])
+        except (KeyError, ValueError):
+            continue
+    return None
 
 
 def fetch(url, timeout=30):
     """Fetches data from an URL
 
     Fetch data from URL and wraps the unicode encoded response in an Either object.
+    Requests are subject to the shared rate limiter, and ratelimited requests
+    are retried up to MAX_RETRIES times.
 
     Args:
         url (str): An URL to fetch.
@@ -44,22 +236,73 @@ def fetch(url, timeout=30):
             and Exception otherwise.
     """
     try:
-        res = httpx.get(url, headers={"user-agent": USER_AGENT}, timeout=timeout)
-        if res.status_code == 429:
-            print("Got 429, sleeping...")
-            print(res.headers)
-            print(res.text)
-            sleep(res.headers.get("wait-until", 150))
-            return fetch(url, timeout)
-        res.raise_for_status()
-        if res.text:
-            return Either.pure(res.text)
-        else:
-            raise Exception("Empty response from {}".format(url))
+        for _ in range(MAX_RETRIES):
+            limiter.acquire(url)
+            res = get_client().get(
+                url, headers={"user-agent": USER_AGENT}, timeout=timeout
+            )
+            if res.status_code != 429:
+                return _unwrap_response(res, url)
+            limiter.penalise(url, retry_after(res))
+        raise Exception("Still ratelimited after {} attempts".format(MAX_RETRIES))
     except Exception as ex:
-        pattern = "Error while fetching URL {}\n{}"
-        err = urllib.error.URLError(pattern.format(url, str(ex)))
-        return Left(err)
+        return _fetch_error(url, ex)
+
+
+async def fetch_async(url, timeout=30):
+    """Fetches data from an URL (Async version).
+
+    See fetch.
+
+    Args:
+        url (str): An URL to fetch.
+        timeout (:obj:int, optional): Sets a timeout delay (Optional).
+
+    Returns:
+        Either[Exception Unicode]: The response content if everything went fine
+            and Exception otherwise.
+    """
+    try:
+        for _ in range(MAX_RETRIES):
+            await limiter.acquire_async(url)
+            res = await get_async_client().get(
+                url, headers={"user-agent": USER_AGENT}, timeout=timeout
+            )
+            if res.status_code != 429:
+                return _unwrap_response(res, url)
+            await limiter.penalise_async(url, retry_after(res))
+        raise Exception("Still ratelimited after {} attempts".format(MAX_RETRIES))
+    except Exception as ex:
+        return _fetch_error(url, ex)
+
+
+def _well_formed(text):
+    """Whether text is well-formed xml, checked with expat."""
+    try:
+        ParserCreate().Parse(text, True)
+    except ExpatError:
+        return False
+    return True
+
+
+def _normalise_markup(res, parser):
+    """Returns xml as it is if well-formed, otherwise through BeautifulSoup.
+
+    Well-formed xml (nearly everything Gallica sends) is only checked, which is
+    far cheaper than building and serialising a soup.  Html, and xml which
+    expat rejects, is repaired by BeautifulSoup as before.
+    """
+    if parser == "xml" and _well_formed(res):
+        return res
+    return str(BeautifulSoup(res, parser))
+
+
+def _parse_xml_dict(res):
+    """Parses xml with xmltodict, repairing it with BeautifulSoup if malformed."""
+    try:
+        return parsexmltodict(res)
+    except ExpatError:
+        return parsexmltodict(str(BeautifulSoup(res, "xml")))
 
 
 def fetch_xml_html(url, parser="xml", timeout=30):
@@ -78,13 +321,54 @@ def fetch_xml_html(url, parser="xml", timeout=30):
         otherwise.
     """
     try:
-        return fetch(url, timeout).map(lambda res: str(BeautifulSoup(res, parser)))
+        return fetch(url, timeout).map(lambda res: _normalise_markup(res, parser))
     except urllib.error.URLError as ex:
         pattern = "Error while fetching XML from {}\n{}"
         err = urllib.error.URLError(pattern.format(url, str(ex)))
         return Left(err)
 
 
+async def fetch_xml_html_async(url, parser="xml", timeout=30):
+    """Fetches xml or html from an URL (Async version).
+
+    See fetch_xml_html.
+    """
+    either = await fetch_async(url, timeout)
+    return either.map(lambda res: _normalise_markup(res, parser))
+
+
+def fetch_xml_dict(url, timeout=30):
+    """Fetches xml from an URL and parses it.
+
+    Gallica's Document API answers in xml, which callers only ever want as a
+    dict.  Fetching and parsing in one go lets the parsed result be cached
+    (see gallica_autobib.cache.parsed_cache), so that a hit skips parsing.
+
+    Args:
+      url (str): An URL to fetch.
+      timeout (:obj:int, optional): Sets a timeout delay (Optional).
+
+    Returns:
+        Either[Exception OrderedDict]: OrderedDict if everything went fine,
+        Exception otherwise.
+    """
+    try:
+        return fetch(url, timeout).map(_parse_xml_dict)
+    except urllib.error.URLError as ex:
+        pattern = "Error while fetching XML from {}\n{}"
+        err = urllib.error.URLError(pattern.format(url, str(ex)))
+        return Left(err)
+
+
+async def fetch_xml_dict_async(url, timeout=30):
+    """Fetches xml from an URL and parses it (Async version).
+
+    See fetch_xml_dict.
+    """
+    either = await fetch_async(url, timeout)
+    return either.map(_parse_xml_dict)
+
+
 def fetch_json(url, timeout=30):
     """Fetches json from an URL
 
@@ -106,6 +390,15 @@ def fetch_json(url, timeout=30):
         return Left(err)
 
 
+async def fetch_json_async(url, timeout=30):
+    """Fetches json from an URL (Async version).
+
+    See fetch_json.
+    """
+    either = await fetch_async(url, timeout)
+    return either.map(json.loads)
+
+
 def build_service_url(parts=None, service_name=""):
     """Creates an URL to access Gallica services
 
@@ -1,10 +1,36 @@
 from typing import Any, Optional
 
+import httpx
+
 from .monadic import Either as Either, Left as Left
 
+PERMANENT_STATUSES: tuple[int, ...]
+
+class EmptyResponseError(Exception): ...
+
+def is_permanent_failure(either: Either) -> Optional[bool]: ...
+def configure_client(
+    max_connections: Optional[int] = ...,
+    max_keepalive_connections: Optional[int] = ...,
+    keepalive_expiry: Optional[float] = ...,
+    http2: Optional[bool] = ...,
+) -> None: ...
+def retry_after(res: httpx.Response) -> Optional[float]: ...
+def get_client() -> httpx.Client: ...
+def set_client(client: Optional[httpx.Client]) -> None: ...
+def get_async_client() -> httpx.AsyncClient: ...
+def set_async_client(client: Optional[httpx.AsyncClient]) -> None: ...
+async def close_async_client() -> None: ...
 def fetch(url: Any, timeout: int = ...) -> Any: ...
+async def fetch_async(url: Any, timeout: int = ...) -> Any: ...
 def fetch_xml_html(url: Any, parser: str = ..., timeout: int = ...) -> Any: ...
+async def fetch_xml_html_async(
+    url: Any, parser: str = ..., timeout: int = ...
+) -> Any: ...
+def fetch_xml_dict(url: Any, timeout: int = ...) -> Any: ...
+async def fetch_xml_dict_async(url: Any, timeout: int = ...) -> Any: ...
 def fetch_json(url: Any, timeout: int = ...) -> Any: ...
+async def fetch_json_async(url: Any, timeout: int = ...) -> Any: ...
 def build_service_url(parts: Optional[Any] = ..., service_name: str = ...) -> Any: ...
 def build_base_url(parts: Optional[Any] = ..., ark: Optional[Any] = ...) -> Any: ...
 def build_url(parts: Any, quote_via: Any = ...) -> Any: ...
@@ -1,8 +1,6 @@
-from xmltodict import parse as parsexmltodict
-
 from . import helpers as h
 from .ark import Ark
-from .monadic import Future, Left
+from .monadic import Left
 
 
 class Resource:
@@ -20,8 +18,9 @@ class Resource:
     2. Resource corresponds to a Document in Gallicas's terms.
     3. ARK qualifiers are **always ignored** by the methods. Arguments are
         here to parameterize any API call. See the API docs for more details.
-    4. Synchronous methods (*_sync) return Either objets, whereas synchronous ones
-        return Future[Either].
+    4. Synchronous methods (*_sync) return Either objets, whereas asynchronous ones
+        are coroutines returning Either, which share a pooled httpx.AsyncClient
+        per event loop.
 
     Args:
         ark (str or Ark): The ARK of  this resource.
@@ -54,15 +53,92 @@ class Resource:
     def arkid(self):
         return self.ark.arkid
 
+    # ---
+    # URLS
+    # ---
+
+    def _oairecord_url(self):
+        url_parts = {"query": {"ark": self.ark.name}}
+        return h.build_service_url(url_parts, service_name="OAIRecord")
+
+    def _issues_url(self, year=""):
+        parts = self.ark.arkid.parts
+        parts["qualifier"] = "date"  # Qualifier must be 'date'
+        url_parts = {"query": {"ark": Ark(**parts), "date": year}}
+        return h.build_service_url(url_parts, service_name="Issues")
+
+    def _pagination_url(self):
+        url_parts = {"query": {"ark": self.ark.name}}
+        return h.build_service_url(url_parts, service_name="Pagination")
+
+    def _image_preview_url(self, resolution="thumbnail", view=1):
+        return h.build_base_url(
+            {"path": "{}/f{}.{}".format(self.ark.root, view, resolution)}
+        )
+
+    def _fulltext_search_url(self, query, view=1, results_per_set=10):
+        urlparts = {
+            "query": {
+                "ark": self.ark.name,
+                "query": query,
+                "startResult": results_per_set,
+                "page": view,
+            }
+        }
+        return h.build_service_url(urlparts, service_name="ContentSearch")
+
+    def _toc_url(self):
+        urlparts = {"query": {"ark": self.ark.name}}
+        return h.build_service_url(urlparts, service_name="Toc")
+
+    def _content_url(self, startview, nviews, mode):
+        pattern = "{}/f{}n{}.{}"
+        arkstr = pattern.format(self.ark.root, startview, nviews, mode)
+        return h.build_base_url({"path": arkstr})
+
+    def _ocr_data_url(self, view):
+        query = {"O": self.ark.name, "E": "ALTO", "Deb": view}
+        urlparts = {"path": "RequestDigitalElement", "query": query}
+        return h.build_base_url(urlparts)
+
+    def _iiif_info_url(self, view=1):
+        if view:
+            path = "{}/{}/f{}/{}".format("iiif", self.ark.root, view, "info.json")
+        else:
+            # No image param : user wants the whole document infos
+            path = "{}/{}/{}".format("iiif", self.ark.root, "manifest.json")
+        return h.build_base_url({"path": path})
+
+    def _iiif_data_url(self, view, region, size, rotation, quality, imformat):
+        region_str = ",".join(map(str, region))
+        pattern = "iiif/{}/f{}/{}/{}/{}/{}.{}"
+        path = pattern.format(
+            self.ark.root, view, region_str, size, rotation, quality, imformat
+        )
+        return h.build_base_url({"path": path})
+
+    @staticmethod
+    def _nviews(pagination, startview):
+        if pagination.is_left:
+            return 1
+        nviews = int(pagination.value.get("livre").get("structure").get("nbVueImages"))
+        return nviews - startview + 1
+
+    @staticmethod
+    def _region(info):
+        width = 1 if info.is_left else info.value["width"]
+        height = 1 if info.is_left else info.value["height"]
+        return (0, 0, width, height)
+
     # ---
     # ASYNCHRONOUS METHODS
     # ---
 
-    def issues(self, year=""):
+    async def issues(self, year=""):
         """Fetches metadata about the issues of a periodical journal (Async version).
 
         The Document API service Issues retrieves metadata about a periodical journal.
-        If a year is provided, issues_sync fetches metadata about all the issues of
+        If a year is provided, issues fetches metadata about all the issues of
         this specific year.
         Qualifiers are ignored.
 
@@ -70,27 +146,28 @@ class Resource:
             year (:obj:int, optional): The year for which to retrieve the issues metadata.
 
         Returns:
-            Future: A Future object that will holds an Either object if it resolved.
-                This Either will hold the fetched data (Right) or an Exception (Left).
-                For more details, see Resource.issues_sync.
+            Either[Exception OrderedDict]: The fetched data (Right) or an Exception
+                (Left). For more details, see Resource.issues_sync.
         """
-        return Future.asyn(lambda: self.issues_sync(year))
+        try:  # Try/catch because Ark(...) can throw an exception.
+            url = self._issues_url(year)
+        except Exception as ex:
+            return Left(ex)
+        return await h.fetch_xml_dict_async(url, timeout=self.timeout)
 
-    def oairecord(self):
+    async def oairecord(self):
         """Retrieves the OAI record of a document (Async version).
 
         The Document API service OAIRecord retrieves the OAI record of a document.
         Qualifiers are ignored.
 
         Returns:
-            Future: A Future object that will holds an Either object if it resolved.
-                representation of the metadata.
-                This Either will hold the fetched data (Right) or an Exception (Left).
-                For more details, see Resource.oairecord_sync.
+            Either[Exception OrderedDict]: The fetched data (Right) or an Exception
+                (Left). For more details, see Resource.oairecord_sync.
         """
-        return Future.asyn(self.oairecord_sync)
+        return await h.fetch_xml_dict_async(self._oairecord_url(), timeout=self.timeout)
 
-    def pagination(self):
+    async def pagination(self):
         """Fetches paging metadata of a resource (Async version).
 
         The Document API service Pagination retrieves metadata about the paging
@@ -98,56 +175,79 @@ class Resource:
         Qualifiers are ignored.
 
         Returns:
-            Future: A Future object that will holds an Either object if it resolved.
-                representation of the metadata.
-                This Either will hold the fetched data (Right) or an Exception (Left).
-                For more details, see Resource.pagination_sync.
+            Either[Exception OrderedDict]: The fetched data (Right) or an Exception
+                (Left). For more details, see Resource.pagination_sync.
+        """
+        url = self._pagination_url()
+        return await h.fetch_xml_dict_async(url, timeout=self.timeout)
+
+    async def image_preview(self, resolution="thumbnail", view=1):
+        """Retrieves the preview image of a view in a resource (Async version).
+
+        See Resource.image_preview_sync.
         """
-        return Future.asyn(self.pagination_sync)
-
-    def image_preview(self, resolution="thumbnail", view=1):
-        """ """
-        l = lambda: self.image_preview_sync(resolution, view)
-        return Future.asyn(l)
-
-    def fulltext_search(self, query="", view=1, results_per_set=10):
-        """ """
-        l = lambda: self.fulltext_search_sync(query, view, results_per_set)
-        return Future.asyn(l)
-
-    def toc(self):
-        """ """
-        return Future.asyn(self.toc_sync)
-
-    def content(self, startview=None, nviews=None, mode="pdf"):
-        """ """
-        l = lambda: self.content_sync(startview, nviews, mode)
-        return Future.asyn(l)
-
-    def ocr_data(self, view):
-        """ """
-        l = lambda: self.ocr_data_sync(view)
-        return Future.asyn(l)
-
-    def iiif_info(self, view=""):
-        """ """
-        l = lambda: self.iiif_info_sync(image)
-        return Future.asyn(l)
-
-    def iiif_data(
+        url = self._image_preview_url(resolution, view)
+        return await h.fetch_async(url, self.timeout)
+
+    async def fulltext_search(self, query="", view=1, results_per_set=10):
+        """Performs a full-text search in a plain-text Resource (Async version).
+
+        See Resource.fulltext_search_sync.
+        """
+        url = self._fulltext_search_url(query, view, results_per_set)
+        return await h.fetch_xml_dict_async(url, timeout=self.timeout)
+
+    async def toc(self):
+        """Retrieves the table of content of a resource (Async version).
+
+        See Resource.toc_sync.
+        """
+        return await h.fetch_xml_html_async(self._toc_url(), "xml", self.timeout)
+
+    async def content(self, startview=1, nviews=None, mode="pdf"):
+        """Retrieves the content of a document (Async version).
+
+        See Resource.content_sync.
+        """
+        if not nviews:
+            nviews = self._nviews(await self.pagination(), startview)
+        url = self._content_url(startview, nviews, mode)
+        if mode == "pdf":
+            return await h.fetch_async(url, self.timeout)
+        return await h.fetch_xml_html_async(url, "html.parser", self.timeout)
+
+    async def ocr_data(self, view):
+        """Retrieves the OCR data from a ocrized document (Async version).
+
+        See Resource.ocr_data_sync.
+        """
+        return await h.fetch_async(self._ocr_data_url(view))
+
+    async def iiif_info(self, view=1):
+        """Retrieve IIIF metadata of a resource (Async version).
+
+        See Resource.iiif_info_sync.
+        """
+        either = await h.fetch_json_async(self._iiif_info_url(view))
+        return either.map(dict)
+
+    async def iiif_data(
         self,
-        view="",
+        view=1,
         region=None,
         size="full",
         rotation=0,
         quality="native",
         imformat="png",
     ):
-        """ """
-        l = lambda: self.iiif_data_sync(
-            image, region, size, rotation, quality, imformat
-        )
-        return Future.asyn(l)
+        """Retrieve image data from a resource using the IIIF API (Async version).
+
+        See Resource.iiif_data_sync.
+        """
+        if not region:
+            region = self._region(await self.iiif_info(view))
+        url = self._iiif_data_url(view, region, size, rotation, quality, imformat)
+        return await h.fetch_async(url, self.timeout)
 
     # ---
     # SYNCHRONOUS METHODS
@@ -166,9 +266,8 @@ class Resource:
                 Otherwise, a Left object containing an Exception.
         """
         try:
-            url_parts = {"query": {"ark": self.ark.name}}
-            url = h.build_service_url(url_parts, service_name="OAIRecord")
-            return h.fetch_xml_html(url, timeout=self.timeout).map(parsexmltodict)
+            url = self._oairecord_url()
+            return h.fetch_xml_dict(url, timeout=self.timeout)
         except Exception as ex:
             return Left(ex)
 
@@ -190,11 +289,8 @@ class Resource:
                 Otherwise, a Left object containing an Exception.
         """
         try:  # Try/catch because Ark(...) can throw an exception.
-            parts = self.ark.arkid.parts
-            parts["qualifier"] = "date"  # Qualifier must be 'date'
-            url_parts = {"query": {"ark": Ark(**parts), "date": year}}
-            url = h.build_service_url(url_parts, service_name="Issues")
-            return h.fetch_xml_html(url, timeout=self.timeout).map(parsexmltodict)
+            url = self._issues_url(year)
+            return h.fetch_xml_dict(url, timeout=self.timeout)
         except Exception as ex:
             return Left(ex)
 
@@ -211,9 +307,8 @@ class Resource:
                 containing an OrderedDict representation of the metadata.
                 Otherwise, a Left object containing an Exception.
         """
-        url_parts = {"query": {"ark": self.ark.name}}
-        url = h.build_service_url(url_parts, service_name="Pagination")
-        return h.fetch_xml_html(url, timeout=self.timeout).map(parsexmltodict)
+        url = self._pagination_url()
+        return h.fetch_xml_dict(url, timeout=self.timeout)
 
     def image_preview_sync(self, resolution="thumbnail", view=1):
         """Retrieves the preview image of a view in a resource (Sync version).
@@ -232,9 +327,7 @@ class Resource:
                 containing the data of the preview image in JPEG format.
                 Otherwise, a Left object containing an Exception.
         """
-        url = h.build_base_url(
-            {"path": "{}/f{}.{}".format(self.ark.root, view, resolution)}
-        )
+        url = self._image_preview_url(resolution, view)
         return h.fetch(url, self.timeout)
 
     def fulltext_search_sync(self, query, view=1, results_per_set=10):
@@ -265,16 +358,8 @@ class Resource:
                 containing the set of results as an OrderedDict.
                 Otherwise, a Left object containing an Exception.
         """
-        urlparts = {
-            "query": {
-                "ark": self.ark.name,
-                "query": query,
-                "startResult": results_per_set,
-                "page": view,
-            }
-        }
-        url = h.build_service_url(urlparts, service_name="ContentSearch")
-        return h.fetch_xml_html(url, timeout=self.timeout).map(parsexmltodict)
+        url = self._fulltext_search_url(query, view, results_per_set)
+        return h.fetch_xml_dict(url, timeout=self.timeout)
 
     def toc_sync(self):
         """Retrieves the table of content of a resource as a HTML document.
@@ -286,9 +371,7 @@ class Resource:
             Either: If successful, a Right object containing the HTML ToC.
                 Otherwise, a Left object containing an Exception.
         """
-        urlparts = {"query": {"ark": self.ark.name}}
-        url = h.build_service_url(urlparts, service_name="Toc")
-        return h.fetch_xml_html(url, "xml", self.timeout)
+        return h.fetch_xml_html(self._toc_url(), "xml", self.timeout)
 
     def content_sync(self, startview=1, nviews=None, mode="pdf", url_only=False):
         """Retrieves the content of a document.
@@ -308,20 +391,9 @@ class Resource:
             Either[Exception Unicode]: The Unicode data of the content.
                 Otherwise, a Left object containing an Exception.
         """
-        _nviews = 1
         if not nviews:
-            either = self.pagination_sync()
-            if not either.is_left:
-                _nviews = int(
-                    either.value.get("livre").get("structure").get("nbVueImages")
-                )
-                _nviews = _nviews - startview + 1
-        else:
-            _nviews = nviews
-        pattern = "{}/f{}n{}.{}"
-        arkstr = pattern.format(self.ark.root, startview, _nviews, mode)
-        urlparts = {"path": arkstr}
-        url = h.build_base_url(urlparts)
+            nviews = self._nviews(self.pagination_sync(), startview)
+        url = self._content_url(startview, nviews, mode)
         if url_only:
             return url
         else:
@@ -344,23 +416,14 @@ class Resource:
             Either[Exception OrderedDict]: an Either object containing the OCR data in XML ALTO.
                 Otherwise, a Left object containing an Exception.
         """
-        query = {"O": self.ark.name, "E": "ALTO", "Deb": view}
-        urlparts = {"path": "RequestDigitalElement", "query": query}
-        url = h.build_base_url(urlparts)
-        return h.fetch(url)
+        return h.fetch(self._ocr_data_url(view))
 
     def iiif_info_sync(self, view=1):
         """Retrieve IIIF metadata of a resource.
 
         Qualifiers are ignored.
         """
-        if view:
-            path = "{}/{}/f{}/{}".format("iiif", self.ark.root, view, "info.json")
-        else:
-            # No image param : user wants the whole document infos
-            path = "{}/{}/{}".format("iiif", self.ark.root, "manifest.json")
-        url = h.build_base_url({"path": path})
-        return h.fetch_json(url).map(dict)
+        return h.fetch_json(self._iiif_info_url(view)).map(dict)
 
     def iiif_data_sync(
         self,
@@ -396,16 +459,6 @@ class Resource:
         """
         # If no region is provided, get the image size using iiif_info_sync(view)
         if not region:
-            info = self.iiif_info_sync(view)
-            width = 1 if info.is_left else info.value["width"]
-            height = 1 if info.is_left else info.value["height"]
-            region = (0, 0, width, height)
-
-        region_str = ",".join(map(str, region))
-        pattern = "iiif/{}/f{}/{}/{}/{}/{}.{}"
-        path = pattern.format(
-            self.ark.root, view, region_str, size, rotation, quality, imformat
-        )
-        urlparts = {"path": path}
-        url = h.build_base_url(urlparts)
+            region = self._region(self.iiif_info_sync(view))
+        url = self._iiif_data_url(view, region, size, rotation, quality, imformat)
         return h.fetch(url, self.timeout)
@@ -1,7 +1,7 @@
 from typing import Any, Optional
 
 from .ark import Ark as Ark
-from .monadic import Future as Future, Left as Left
+from .monadic import Left as Left
 
 class Resource:
     timeout: int = ...
@@ -10,25 +10,25 @@ class Resource:
     def ark(self) -> Any: ...
     @property
     def arkid(self) -> Any: ...
-    def issues(self, year: str = ...) -> Any: ...
-    def oairecord(self) -> Any: ...
-    def pagination(self) -> Any: ...
-    def image_preview(self, resolution: str = ..., view: int = ...) -> Any: ...
-    def fulltext_search(
+    async def issues(self, year: str = ...) -> Any: ...
+    async def oairecord(self) -> Any: ...
+    async def pagination(self) -> Any: ...
+    async def image_preview(self, resolution: str = ..., view: int = ...) -> Any: ...
+    async def fulltext_search(
         self, query: str = ..., view: int = ..., results_per_set: int = ...
     ) -> Any: ...
-    def toc(self) -> Any: ...
-    def content(
+    async def toc(self) -> Any: ...
+    async def content(
         self,
-        startview: Optional[Any] = ...,
+        startview: int = ...,
         nviews: Optional[Any] = ...,
         mode: str = ...,
     ) -> Any: ...
-    def ocr_data(self, view: Any) -> Any: ...
-    def iiif_info(self, view: str = ...) -> Any: ...
-    def iiif_data(
+    async def ocr_data(self, view: Any) -> Any: ...
+    async def iiif_info(self, view: int = ...) -> Any: ...
+    async def iiif_data(
         self,
-        view: str = ...,
+        view: int = ...,
         region: Optional[Any] = ...,
         size: str = ...,
         rotation: int = ...,
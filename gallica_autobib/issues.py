@@ -0,0 +1,68 @@
+"""Persistent index of what we know about the issues of a journal."""
+from datetime import date
+from time import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .cache import DAY, Cached
+
+issue_index_cache = Cached("issue_index")
+
+
+class IssueRecord(NamedTuple):
+    """What matching needs to know about an issue, bar its pagination and toc."""
+
+    ark: str
+    data: Dict[str, Any]  # parsed description, title, publisher and ark
+
+
+class IssueIndex:
+    """Index of the issues of a series, kept across runs.
+
+    For every year we keep the issues Gallica lists and when we asked, and for
+    every issue looked at its `IssueRecord` and, once it has been needed, its
+    toc.  Paginations are kept in their own table (see
+    `gallica_autobib.query.pagination_index`).  Past years are
+    complete, but issues may still be added to recent ones, which are
+    therefore asked for again after `REFRESH_AFTER` seconds.
+
+    Entries are stored under their own keys, so that processes indexing the
+    same journal at once don't overwrite each other's work.
+    """
+
+    REFRESH_AFTER = 30 * DAY
+    # years this close to the present may still gain issues
+    RECENT = 1
+
+    def __init__(self, series: str, cache: Cached = issue_index_cache) -> None:
+        self.series = series
+        self.cache = cache
+
+    def _key(self, *parts: Any) -> str:
+        return "/".join(str(x) for x in (self.series, *parts))
+
+    def year(self, year: int) -> Optional[List[Dict[str, Any]]]:
+        """Issues of a year, or None if it needs fetching."""
+        entry = self.cache.get(self._key("year", year))
+        if entry is None:
+            return None
+        fetched, issues = entry
+        recent = year >= date.today().year - self.RECENT
+        if recent and time() - fetched > self.REFRESH_AFTER:
+            return None
+        return issues
+
+    def set_year(self, year: int, issues: List[Dict[str, Any]]) -> None:
+        self.cache[self._key("year", year)] = (time(), issues)
+
+    def issue(self, ark: str) -> Optional[IssueRecord]:
+        return self.cache.get(self._key("issue", ark))
+
+    def set_issue(self, record: IssueRecord) -> None:
+        self.cache[self._key("issue", record.ark)] = record
+
+    def toc(self, ark: str) -> Optional[List[Tuple[str, str]]]:
+        """Parsed toc of an issue (empty if it has none), or None if unknown."""
+        return self.cache.get(self._key("toc", ark))
+
+    def set_toc(self, ark: str, toc: List[Tuple[str, str]]) -> None:
+        self.cache[self._key("toc", ark)] = toc
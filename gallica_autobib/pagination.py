@@ -0,0 +1,70 @@
+"""Lookups in the pagination of a volume on Gallica."""
+from typing import Any, Dict, List, Mapping, Union
+
+
+class PageNotFoundError(ValueError):
+    """A page number which is not in the volume."""
+
+
+class PaginationIndex:
+    """Compact index of the pagination of a volume.
+
+    Gallica's pagination service lists every view of a volume with its
+    logical page number (`numero`), its view number (`ordre`) and the kind of
+    numbering (`pagination_type`, "A" being arabic numerals).  Finding a page
+    in that list is a linear scan, so we keep the columns as arrays and map
+    every page number to the first view carrying it.
+    """
+
+    def __init__(
+        self, numero: List[str], ordre: List[int], pagination_type: List[str]
+    ) -> None:
+        self.numero = numero
+        self.ordre = ordre
+        self.pagination_type = pagination_type
+        self.views: Dict[str, int] = {}
+        for n, o in zip(numero, ordre):
+            self.views.setdefault(n, o)
+
+    @classmethod
+    def from_pagination(cls, pages: Mapping[str, Any]) -> "PaginationIndex":
+        """Build the index from a parsed pagination response."""
+        try:
+            entries = pages["livre"]["pages"]["page"]
+        except (KeyError, TypeError):
+            entries = None
+        if not entries:
+            raise PageNotFoundError("No page numbers present.")
+        if not isinstance(entries, list):
+            entries = [entries]
+        return cls(
+            [p["numero"] for p in entries],
+            [int(p["ordre"]) for p in entries],
+            [p.get("pagination_type") for p in entries],
+        )
+
+    @classmethod
+    def of(
+        cls, pages: Union["PaginationIndex", Mapping[str, Any]]
+    ) -> "PaginationIndex":
+        """The index of pages, which may already be one."""
+        if isinstance(pages, cls):
+            return pages
+        return cls.from_pagination(pages)  # type: ignore
+
+    def __len__(self) -> int:
+        return len(self.ordre)
+
+    def physical(self, logical_pno: Union[str, int]) -> int:
+        """View (physical page number) of a logical page number."""
+        try:
+            return self.views[str(logical_pno)]
+        except KeyError:
+            raise PageNotFoundError(f"No page {logical_pno} in volume.") from None
+
+    def last(self, pagination_type: str = "A") -> int:
+        """Position of the last page of a kind of numbering."""
+        for i in range(len(self.pagination_type) - 1, -1, -1):
+            if self.pagination_type[i] == pagination_type:
+                return i
+        raise PageNotFoundError(f"No pages of type {pagination_type} in volume.")
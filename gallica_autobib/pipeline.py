@@ -1,17 +1,20 @@
 """Pipeline to match and convert."""
 import asyncio
 import logging
-from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
+from threading import Thread
 from time import sleep
-from typing import List, Literal, Optional, TextIO, Union
+from typing import Any, Dict, List, Literal, Optional, TextIO, Tuple, Union
 from urllib.error import URLError
 
 from jinja2 import Template
 from pydantic import BaseModel
 from slugify import slugify
 
-from .models import RecordTypes
+from .models import Article, RecordTypes
+from .pagination import PageNotFoundError
 from .parsers import parse_bibtex, parse_ris
 from .process import process_pdf
 from .query import (
@@ -20,6 +23,7 @@ from .query import (
     Match,
     MatchingError,
     Query,
+    make_string_boring,
     source_match_cache,
 )
 from .templating import env
@@ -27,6 +31,17 @@ from .templating import env
 logger = logging.getLogger(__name__)
 
 
+class _NoMatch:
+    """A journal which was looked up and not found, as opposed to not looked up."""
+
+    def __reduce__(self) -> str:
+        # unpickled in another process as the same object
+        return "NO_MATCH"
+
+
+NO_MATCH = _NoMatch()
+
+
 class Record(BaseModel):
     """Input"""
 
@@ -44,6 +59,8 @@ class Result(BaseModel):
     processed: Optional[Path] = None
     errors: Optional[List[str]] = None
     status: Optional[bool] = None
+    blocks: Optional[List[Dict[str, Any]]] = None
+    issues_inspected: Optional[int] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -82,6 +99,7 @@ class InputParser:
         self.ignore_cache = ignore_cache
         self.suppress_cover_page: bool = False
         self.ocr_bounds = ocr_bounds
+        self.batch: bool = False
 
     @property
     def successful(self) -> int:
@@ -138,11 +156,11 @@ class InputParser:
         """Create or register pool, or return pool if extant."""
         if pool:
             if self._pool:
-                self.pool.shutdown(wait=True)  # type: ignore
+                self._pool.shutdown(wait=True)
             self._pool = pool
-        elif not pool:
+        elif not self._pool:
             self._pool = ProcessPoolExecutor(self.processes)
-        return self._pool  # type: ignore
+        return self._pool
 
     def run(self) -> str:
         """Run query, blocking until finished.
@@ -157,8 +175,58 @@ class InputParser:
             sleep(1)
         return self.report()
 
+    @staticmethod
+    def journal_key(record: Record) -> str:
+        """Key grouping records from the same journal in batch mode.
+
+        Articles are grouped by journal title and publisher: anything else
+        gets a key of its own.
+        """
+        target = record.target
+        if isinstance(target, Article):
+            title = make_string_boring(target.journaltitle)
+            publisher = make_string_boring(target.publisher or "")
+            return f"journal:{title}:{publisher}"
+        return f"record:{target.key()}"
+
+    @staticmethod
+    def covers(match: Match, record: Record) -> bool:
+        """Whether a journal match covers every year the record is from.
+
+        Gallica sometimes splits a journal into several series by period, so
+        the series found for one article need not hold another's year.
+        """
+        years = match.candidate.publicationdate
+        wanted = record.target.publicationdate
+        if not years or not wanted:
+            return True
+        years = years if isinstance(years, list) else [years]
+        wanted = wanted if isinstance(wanted, list) else [wanted]
+        return set(wanted) <= set(years)
+
+    def batches(self) -> List[List[Record]]:
+        """Records grouped by journal, in order of first appearance."""
+        batches: Dict[str, List[Record]] = {}
+        for record in self.records:
+            batches.setdefault(self.journal_key(record), []).append(record)
+        return list(batches.values())
+
     def _send_records(self) -> List[Future]:
-        """Send records to pool."""
+        """Send records to pool.
+
+        In batch mode each journal's records are matched together (see
+        `_send_batches`), otherwise every record is sent on its own.
+        """
+        kwargs: Dict[str, Any] = dict(
+            fetch_only=self.fetch_only,
+            process_args=self.process_args,
+            download_args=self.download_args,
+            cache=not self.ignore_cache,
+            suppress_cover_page=self.suppress_cover_page,
+            ocr_bounds=self.ocr_bounds,
+        )
+        if self.batch:
+            return self._send_batches(kwargs)
         return [
             self.pool().submit(
                 self.process_record,
@@ -166,16 +234,53 @@ class InputParser:
                 self.generate_outf(record.target),
                 self.process,
                 self.clean,
-                fetch_only=self.fetch_only,
-                process_args=self.process_args,
-                download_args=self.download_args,
-                cache=not self.ignore_cache,
-                suppress_cover_page=self.suppress_cover_page,
-                ocr_bounds=self.ocr_bounds,
+                **kwargs,
             )
             for record in self.records
         ]
 
+    def _send_batches(self, kwargs: Dict[str, Any]) -> List[Future]:
+        """Send each journal's records to be matched together, then one by one.
+
+        Only matching is batched (see `match_batch`): as each batch is matched
+        its records are sent back to the pool to be downloaded and processed
+        on their own, so a long journal doesn't keep the others waiting.
+
+        Returns:
+          A future for the Result() of every record.
+        """
+        pending: Dict[Future, List[Tuple[Record, Path, Future]]] = {}
+        for batch in self.batches():
+            future = self.pool().submit(self.match_batch, batch, kwargs["cache"])
+            pending[future] = [
+                (record, self.generate_outf(record.target), Future())
+                for record in batch
+            ]
+
+        def dispatch() -> None:
+            for future in as_completed(pending):
+                try:
+                    matches = future.result()
+                except Exception as e:
+                    matches = [e] * len(pending[future])
+                for (record, outf, result), match in zip(pending[future], matches):
+                    if isinstance(match, Exception):
+                        result.set_result(self._failed(record, match))
+                        continue
+                    sent = self.pool().submit(
+                        self.process_batched_record,
+                        record,
+                        outf,
+                        self.process,
+                        self.clean,
+                        match=match,
+                        **kwargs,
+                    )
+                    sent.add_done_callback(partial(_forward, result))
+
+        Thread(target=dispatch, daemon=True).start()
+        return [result for records in pending.values() for *_, result in records]
+
     async def submit(self) -> str:
         """Submit query to pool.
 
@@ -195,29 +300,98 @@ class InputParser:
     def report(self) -> str:
         return self.output_template.render(obj=self)
 
+    @classmethod
+    def match_batch(cls, records: List[Record], cache: bool = True) -> List[Any]:
+        """
+        Match the sources of records from the same journal.
+
+        The journal is looked up once for the whole batch (again for records
+        from years the series found doesn't cover).
+
+        Returns:
+          For each record its match, NO_MATCH if its journal can't be found,
+          or the exception raised looking for it, which fails only that record.
+
+        """
+        journals: List[Match] = []
+        # the years of records for which no journal was found
+        unmatched: List[Any] = []
+        matches: List[Any] = []
+        for record in records:
+            try:
+                matches.append(cls._batch_match(record, journals, unmatched, cache))
+            except Exception as e:
+                matches.append(e)
+        return matches
+
+    @classmethod
+    def process_batched_record(
+        cls, record: Record, outf: Path, process: bool, clean: bool, **kwargs: Any
+    ) -> Result:
+        """Run `process_record`, turning any error into a failed Result()."""
+        try:
+            return cls.process_record(record, outf, process, clean, **kwargs)
+        except Exception as e:
+            return cls._failed(record, e)
+
+    @staticmethod
+    def _failed(record: Record, error: Exception) -> Result:
+        logger.info(f"Failed to process {record.target.name()}. ({error})")
+        return Result(record=record, status=False, errors=[str(error)])
+
+    @classmethod
+    def _batch_match(
+        cls, record: Record, journals: List[Match], unmatched: List[Any], cache: bool
+    ) -> Any:
+        """Match for record's source, reusing those found for its batch.
+
+        Returns:
+          The match, or NO_MATCH if the journal can't be found.
+        """
+        match = source_match_cache.get(record.target.key()) if cache else None
+        if not match:
+            match = next((m for m in journals if cls.covers(m, record)), None)
+        if not match:
+            if record.target.publicationdate in unmatched:
+                return NO_MATCH
+            match = Query(record.target).run()
+            if not match:
+                unmatched.append(record.target.publicationdate)
+                return NO_MATCH
+            journals.append(match)
+        return match
+
     @staticmethod
     def process_record(
         record: Record,
         outf: Path,
         process: bool,
         clean: bool,
-        fetch_only: Optional[bool] = None,
+        fetch_only: Optional[int] = None,
         process_args: Optional[dict] = None,
         download_args: Optional[dict] = None,
         cache: bool = True,
         suppress_cover_page: bool = False,
         ocr_bounds: bool = False,
+        match: Any = None,
     ) -> Result:
         """
         Run pipeline on item, returning a Result() object.
 
+        If a match for the record's source is given it is used as it is
+        (NO_MATCH meaning that it was looked for and not found).
+
         """
 
         key = record.target.key()
-        match = source_match_cache.get(key) if cache else None
-        if not match:
-            query = Query(record.target)
-            match = query.run()
+        if match is NO_MATCH:
+            match = None
+        else:
+            if not match:
+                match = source_match_cache.get(key) if cache else None
+            if not match:
+                query = Query(record.target)
+                match = query.run()
         args = dict(record=record)
         if not process_args:
             process_args = {}
@@ -238,7 +412,9 @@ class InputParser:
             logger.debug("Starting download.")
             gallica_resource.download_pdf(outf, fetch_only=fetch_only, **download_args)
             args["match"] = gallica_resource.match  # type: ignore
-        except MatchingError as e:
+            args["blocks"] = gallica_resource.block_log or None  # type: ignore
+            args["issues_inspected"] = gallica_resource.issues_inspected  # type: ignore
+        except (MatchingError, PageNotFoundError) as e:
             logger.info(f"Failed to match. ({e})")
             args["errors"] = [str(e)]  # type: ignore
             args["status"] = None  # type: ignore
@@ -270,6 +446,15 @@ class InputParser:
         return Result.parse_obj(args)
 
 
+def _forward(target: Future, source: Future) -> None:
+    """Settle target as source was."""
+    error = source.exception()
+    if error:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+
 class BibtexParser(InputParser):
     """Class to parse bibtex."""
 
@@ -1,16 +1,29 @@
 import imghdr
 import logging
 import unicodedata
-from collections import namedtuple
+from collections import deque, namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from contextlib import closing
 from functools import total_ordering
-from io import BytesIO
+from io import SEEK_END, BytesIO
 from pathlib import Path
 from re import search
-from time import sleep
+from tempfile import SpooledTemporaryFile
+from time import monotonic, sleep
 from typing import (
+    IO,
     TYPE_CHECKING,
     Any,
+    Callable,
+    Dict,
     Generator,
+    Iterable,
     List,
     Optional,
     OrderedDict,
@@ -18,7 +31,7 @@ from typing import (
     Union,
 )
 
-import requests
+import httpx
 import sruthi
 from bs4 import BeautifulSoup
 from fuzzysearch import find_near_matches
@@ -28,25 +41,112 @@ from pydantic.utils import Representation
 from PyPDF4 import PageRange, PdfFileMerger
 from sruthi.response import SearchRetrieveResponse
 
-from . import gallipy
-from .cache import Cached, download, img_data_cache, response_cache
-from .gallipy import Ark, Resource
+from .blocks import Block, BlockManifest, BlockPlanner, PdfAssembler
+from .cache import Cached, download, img_data_cache, parsed_cache, response_cache
+from .gallipy import Ark, Resource, helpers
+from .issues import IssueIndex, IssueRecord
 from .models import Article, Book, Collection, GallicaBibObj, Journal
+from .pagination import PageNotFoundError, PaginationIndex
+from .ratelimit import limiter
 
 if TYPE_CHECKING:  # pragma: nocover
     from pydantic.typing import ReprArgs  # pragma: nocover
 
 
-gallipy.helpers.fetch = response_cache(gallipy.helpers.fetch)
+def url_key(url: str, *args: Any, **kwargs: Any) -> str:
+    """Cache fingerprint of a fetch: only the url matters."""
+    return url
+
+
+def no_records(resp: SearchRetrieveResponse) -> Optional[bool]:
+    """An SRU query which matched nothing won't match anything next time."""
+    return True if resp.count == 0 else None
+
+
+# bump when the shape of cached parsed responses changes
+PARSED_SCHEMA = 1
+PACKED = "_columns"
+
+
+def parsed_key(url: str, *args: Any, **kwargs: Any) -> Tuple[str, int]:
+    """Cache fingerprint of a parsed fetch: the url and the stored shape."""
+    return url, PARSED_SCHEMA
+
+
+def pack_pagination(doc: Any) -> Any:
+    """Store the page list of a parsed pagination response as columns.
+
+    The page list is most of a pagination response, and as a list of dicts
+    every page repeats its keys.  Any other document is returned as it is.
+    """
+    try:
+        pages = doc["livre"]["pages"]["page"]
+    except (KeyError, TypeError):
+        return doc
+    if not isinstance(pages, list) or not pages:
+        return doc
+    fields = list(pages[0])
+    if any(list(p) != fields for p in pages):
+        return doc
+    columns = OrderedDict((k, [p[k] for p in pages]) for k in fields)
+    livre = OrderedDict(doc["livre"], pages=OrderedDict({PACKED: columns}))
+    return OrderedDict(doc, livre=livre)
+
+
+def unpack_pagination(doc: Any) -> Any:
+    """Undo `pack_pagination`."""
+    try:
+        columns = doc["livre"]["pages"][PACKED]
+    except (KeyError, TypeError):
+        return doc
+    fields = list(columns)
+    pages = [OrderedDict(zip(fields, row)) for row in zip(*columns.values())]
+    livre = OrderedDict(doc["livre"], pages=OrderedDict(page=pages))
+    return OrderedDict(doc, livre=livre)
+
+
+helpers.fetch = response_cache(
+    helpers.fetch,
+    key=url_key,
+    failure=helpers.is_permanent_failure,
+)
+helpers.fetch_async = response_cache(
+    helpers.fetch_async,
+    key=url_key,
+    failure=helpers.is_permanent_failure,
+)
+# metadata (issues, paginations, oai records) is asked for by every worker
+# matching an article from the same journal, so is fetched once for all of them
+helpers.fetch_xml_dict = parsed_cache(
+    helpers.fetch_xml_dict,
+    key=parsed_key,
+    failure=helpers.is_permanent_failure,
+    pack=lambda either: either.map(pack_pagination),
+    unpack=lambda either: either.map(unpack_pagination),
+    across_processes=True,
+)
+helpers.fetch_xml_dict_async = parsed_cache(
+    helpers.fetch_xml_dict_async,
+    key=parsed_key,
+    failure=helpers.is_permanent_failure,
+    pack=lambda either: either.map(pack_pagination),
+    unpack=lambda either: either.map(unpack_pagination),
+    across_processes=True,
+)
 
 
 Pages = OrderedDict[str, OrderedDict[str, OrderedDict]]
 ark_cache = Cached("ark")
 source_match_cache = Cached("source_match")
 ocr_cache = Cached("ocr_bounds")
+pagination_cache = Cached("pagination_index")
 UnscaledPageData = namedtuple(
     "UnscaledPageData", ["upper", "lower", "total_width", "total_height"]
 )
+# everything fetched about an issue before looking for the article in it
+IssueDocuments = namedtuple(
+    "IssueDocuments", ["detail", "resource", "data", "pages", "toc"]
+)
 
 
 class MatchingError(Exception):
@@ -57,6 +157,22 @@ class DownloadError(Exception):
     pass
 
 
+def pagination_index(resource: Resource, use_cache: bool = True) -> PaginationIndex:
+    """Index of the pagination of a volume, fetched once and then cached.
+
+    If use_cache is not set it is fetched again, replacing the cached one.
+    """
+    key = str(resource.ark)
+    index = pagination_cache.get(key) if use_cache else None
+    if index is None:
+        either = resource.pagination_sync()
+        if either.is_left:
+            raise either.value
+        index = PaginationIndex.from_pagination(either.value)
+        pagination_cache[key] = index
+    return index
+
+
 def make_string_boring(unicodestr: str) -> Optional[str]:
     """Return unicode str as ascii for fuzzy matching."""
     if not unicodestr:
@@ -151,7 +267,7 @@ class GallicaSRU(
     def __init__(self) -> None:
         self.client = sruthi.Client(url=self.URL, record_schema="dublincore")
 
-    @response_cache
+    @response_cache(key=lambda self, query: (self.URL, query), failure=no_records)
     def fetch_query(self, query: str) -> SearchRetrieveResponse:
         return self.client.searchretrieve(query)
 
@@ -224,6 +340,11 @@ class DownloadableResource(Representation):
     """A downloadable resouce on Gallica."""
 
     BASE_TIMEOUT = 60
+    SPOOL_SIZE = 32 * 1024 * 1024
+    # ratelimited responses to a block before giving up altogether
+    MAX_RATELIMITS = 10
+    # seconds before a failed block's first retry, doubling thereafter
+    RETRY_PAUSE = 2
 
     def __init__(self, **kwargs: dict[str, Any]) -> None:
         self._ark: Optional[Union[str, Ark]] = None
@@ -231,10 +352,18 @@ class DownloadableResource(Representation):
         self._end_p: Optional[int] = None
         self._resource: Optional[Resource] = None  # so we can pass resource around
         self._pages: Optional[Pages] = None
+        self._pagination_index: Optional[PaginationIndex] = None
         self.logger = logging.getLogger("DR")
         self.trials: int = 7
+        self.concurrency: int = 1
+        self.block_retries: int = 3
+        self.adaptive_blocks: bool = False
+        self.stream_blocks: bool = False
+        self.min_blocksize: int = 5
+        self.max_blocksize: int = 200
+        self.block_log: List[Dict[str, Any]] = []
+        self.use_cache: bool = True
         self.suppress_cover_page: bool = False
-        self._backoff = 0
 
     def __repr_args__(self) -> "ReprArgs":
         return self.__dict__.items()  # type: ignore
@@ -299,21 +428,30 @@ class DownloadableResource(Representation):
             self._pages = either.value
         return self._pages
 
-    def get_physical_pno(self, logical_pno: str, pages: Pages = None) -> int:
-        """Get the physical pno for a logical pno."""
-        if not pages:
-            pages = self.pages
-        pnos = pages["livre"]["pages"]["page"]  # type: ignore
-        if not pnos:
-            raise ValueError("No page numbers present.")
-        # sadly we have to do it ourselves
-        for p in pnos:
-            if p["numero"] == logical_pno:
-                break
-        return p["ordre"]
-
-    @img_data_cache
+    @property
+    def pagination_index(self) -> PaginationIndex:
+        """Index of the physical pages in volume."""
+        if not self._pagination_index:
+            self._pagination_index = pagination_index(self.resource, self.use_cache)
+        return self._pagination_index
+
+    def get_physical_pno(
+        self,
+        logical_pno: str,
+        pages: Union[Pages, PaginationIndex, None] = None,
+    ) -> int:
+        """Get the physical pno for a logical pno.
+
+        Raises:
+          PageNotFoundError: if the volume has no such page.
+        """
+        index = (
+            PaginationIndex.of(pages) if pages is not None else self.pagination_index
+        )
+        return index.physical(logical_pno)
+
     @staticmethod
+    @img_data_cache(key=lambda resource, pno: (str(resource.ark), pno))
     def fetch_image(resource: Resource, pno: int) -> bytes:
         """Fetch image from resource as bytes.
 
@@ -328,18 +466,38 @@ class DownloadableResource(Representation):
     @staticmethod
     def pdf_unavailable(url: str) -> bool:
         """Work out if we can get the pdf or need to fall back on the images."""
-        return requests.head(url).status_code == 451
+        limiter.acquire(url)
+        return helpers.get_client().head(url).status_code == 451
 
     def download_pdf(
         self,
         path: Path,
         blocksize: int = 100,
-        fetch_only: int = None,
+        fetch_only: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        adaptive: Optional[bool] = None,
+        stream: Optional[bool] = None,
     ) -> bool:
         """Download a resource as a pdf in blocks to avoid timeout.
 
-        If http 451 is encountered, fall back on the image api (ignoring blocks)."""
+        If http 451 is encountered, fall back on the image api (ignoring blocks).
+        If concurrency is given, up to that many blocks are fetched at once.
+        If adaptive is given, it sets whether blocksize is only the initial
+        size of blocks, adapted to measured throughput.
+        If stream is given, it sets whether blocks are assembled straight into
+        path as they arrive (see `download_pdf_stream`) rather than saved as
+        partial files and merged.
+
+        Partial blocks are only deleted once the pdf has been assembled, so an
+        interrupted download resumes where it left off."""
         partials = []
+        merged = False
+        if concurrency:
+            self.concurrency = concurrency
+        if adaptive is not None:
+            self.adaptive_blocks = adaptive
+        if stream is not None:
+            self.stream_blocks = stream
 
         if path.exists():
             return True
@@ -363,38 +521,173 @@ class DownloadableResource(Representation):
                     if fetch_only is not None
                     else self.end_p
                 )
+                if self.stream_blocks:
+                    self.download_pdf_stream(path, blocksize, self.start_p, fetch)
+                    return False
                 partials = self.download_pdf_chunks(
                     path, blocksize, self.start_p, fetch
                 )
 
             self._merge_partials(path, partials)
+            merged = True
         finally:
-            for fn in partials:
-                fn.unlink()
+            if merged:
+                for fn in partials:
+                    fn.unlink()
+                BlockManifest.path_for(path).unlink(missing_ok=True)
         assert partials
         return False
 
     @staticmethod
-    def get_pdf_url(outf: Path, blocksize: int, fetch_only: int = None) -> bool:
+    def get_pdf_url(
+        outf: Path, blocksize: int, fetch_only: Optional[int] = None
+    ) -> bool:
         pass
 
     def download_pdf_chunks(
         self, path: Path, blocksize: int, start_p: int, fetch: int
     ) -> list[Path]:
-        """Download pdf in chunks, saving to path."""
-        partials = []
-        for i, (start, length) in enumerate(
-            self._generate_blocks(start_p, fetch, blocksize)
-        ):
+        """Download pdf in chunks, saving to path.
 
-            fn = path.with_suffix(f".pdf.{i}")
-            status = self._fetch_block(start, length, fn)
-            if not status:
-                raise DownloadError("Failed to download.")
-            partials.append(fn)
-        return partials
+        Up to `self.concurrency` blocks are fetched at once.  Blocks start at
+        `blocksize` views; if `self.adaptive_blocks` is set their size then
+        adapts to the measured throughput (see `BlockPlanner`).  A block
+        which fails is retried (after a pause, doubling every time) up to
+        `self.block_retries` times before we give up.  Completed blocks are
+        recorded in a manifest next to path, and blocks left over from an
+        interrupted run are reused if they are intact.  Every attempt is
+        logged in `self.block_log`.
+
+        Returns:
+          The partial files, in page order.
+        """
+        manifest = BlockManifest.load(path, str(self.ark))
+        completed: Dict[int, Path] = {}
+        last = start_p - 1
+        for start, entry in sorted(manifest.blocks.items()):
+            block = Block(start, entry["nviews"])
+            fn = path.with_suffix(f".pdf.{start}")
+            if (
+                start > last
+                and block.end <= fetch
+                and manifest.valid(start, block.nviews, fn)
+            ):
+                self.logger.debug(f"Reusing block {block}")
+                completed[start] = fn
+                last = block.end
+        planner = self._block_planner(
+            BlockPlanner.gaps(
+                start_p,
+                fetch,
+                ((k, k + manifest.blocks[k]["nviews"] - 1) for k in completed),
+            ),
+            blocksize,
+        )
+
+        def fetch_block(block: Block) -> Optional[Tuple[Path, int]]:
+            fn = path.with_suffix(f".pdf.{block.start}")
+            if self._fetch_block(block.start, block.nviews, fn):
+                return fn, fn.stat().st_size
+            return None
+
+        def done(block: Block, fn: Path) -> None:
+            manifest.add(block.start, block.nviews, fn)
+            completed[block.start] = fn
+
+        self._run_blocks(planner, fetch_block, done)
+        return [completed[k] for k in sorted(completed)]
+
+    def download_pdf_stream(
+        self, path: Path, blocksize: int, start_p: int, fetch: int
+    ) -> None:
+        """Download pdf in chunks, assembling it in path as they arrive.
+
+        Blocks are held in memory (spilling to a temporary file if large) and
+        appended to the output in order, so no partial files are written.
+        Blocks are planned and fetched as in `download_pdf_chunks`, but the
+        download cannot be resumed and bypasses the data cache.
+        """
+        planner = self._block_planner([(start_p, fetch)], blocksize)
+        assembler = PdfAssembler(start_p, self.suppress_cover_page)
 
-    def download_pdf_images(self, path: Path, fetch_only: int = None) -> list[Path]:
+        def fetch_block(block: Block) -> Optional[Tuple[IO[bytes], int]]:
+            stream = self._fetch_block_data(block.start, block.nviews)
+            if not stream:
+                return None
+            return stream, stream.seek(0, SEEK_END)
+
+        def done(block: Block, stream: IO[bytes]) -> None:
+            stream.seek(0)
+            assembler.add(block.start, block.nviews, stream)
+
+        try:
+            self._run_blocks(planner, fetch_block, done)
+            assembler.write(path)
+        finally:
+            assembler.close()
+
+    def _block_planner(
+        self, ranges: List[Tuple[int, int]], blocksize: int
+    ) -> BlockPlanner:
+        return BlockPlanner(
+            ranges,
+            blocksize,
+            adaptive=self.adaptive_blocks,
+            min_size=self.min_blocksize,
+            max_size=self.max_blocksize,
+            retries=self.block_retries,
+        )
+
+    def _run_blocks(
+        self,
+        planner: BlockPlanner,
+        fetch: Callable[[Block], Optional[Tuple[Any, int]]],
+        done: Callable[[Block, Any], None],
+    ) -> None:
+        """Fetch the planner's blocks, `self.concurrency` at a time.
+
+        Args:
+          planner: Source of blocks.
+          fetch: Called on a worker thread with a block; returns the result
+            and its size in bytes, or None if the block failed.
+          done: Called with each block and its result as they complete.
+        """
+        pool = ThreadPoolExecutor(max(1, self.concurrency))
+        running: Dict[Future, Block] = {}
+
+        def timed_fetch(block: Block) -> Tuple[Optional[Tuple[Any, int]], float]:
+            if block.attempt:
+                sleep(self.RETRY_PAUSE * 2 ** (block.attempt - 1))
+            start = monotonic()
+            result = fetch(block)
+            return result, monotonic() - start
+
+        def submit() -> None:
+            while len(running) < max(1, self.concurrency) and (block := planner.next()):
+                running[pool.submit(timed_fetch, block)] = block
+
+        try:
+            submit()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    block = running.pop(future)
+                    result, seconds = future.result()
+                    if result:
+                        planner.succeeded(block, result[1], seconds)
+                        done(block, result[0])
+                    elif not planner.failed(block, seconds):
+                        raise DownloadError(f"Failed to download block {block}.")
+                    else:
+                        self.logger.debug(f"Retrying views from {block.start}")
+                submit()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.block_log = planner.log
+
+    def download_pdf_images(
+        self, path: Path, fetch_only: Optional[int] = None
+    ) -> list[Path]:
         """Download a resource as a pdf using the iif image endpoint."""
         fetch = fetch_only - 1 if fetch_only is not None else self.end_p
         end_p = self.start_p + fetch
@@ -431,29 +724,71 @@ class DownloadableResource(Representation):
         with path.open("wb") as f:
             merger.write(f)
 
+    def _fetch_block_data(
+        self, startview: int, nviews: int
+    ) -> Optional[SpooledTemporaryFile]:
+        """Fetch block into memory, spilling to disk above SPOOL_SIZE.
+
+        Failures are retried by the caller (see `_run_blocks`); here we only
+        try again after being ratelimited.
+        """
+        url = self.resource.content_sync(
+            startview=startview, nviews=nviews, url_only=True
+        )
+        client = helpers.get_client()
+        for _ in range(self.MAX_RATELIMITS):
+            limiter.acquire(url)
+            retry_after = None
+            stream = SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+            try:
+                with client.stream("GET", url, timeout=120) as res:
+                    if res.status_code == 429:
+                        ratelimited = True
+                        retry_after = helpers.retry_after(res)
+                    else:
+                        res.raise_for_status()
+                        for chunk in res.iter_bytes():
+                            stream.write(chunk)
+                        stream.seek(0)
+                        ratelimited = bool(imghdr.what(None, h=stream.read(32)))
+            except httpx.HTTPError as e:
+                stream.close()
+                self.logger.debug(f"Failed to fetch {url}: {e}")
+                return None
+            except BaseException:
+                stream.close()
+                raise
+            if not ratelimited:
+                return stream
+            stream.close()
+            self.logger.info("We got ratelimited, backing off")
+            limiter.penalise(url, retry_after)
+        raise Exception("We got ratelimited.")
+
     def _fetch_block(self, startview: int, nviews: int, fn: Path) -> bool:
-        """Fetch block."""
+        """Fetch block.
+
+        As `_fetch_block_data`, failures are left to the caller to retry.
+        """
         url = self.resource.content_sync(
             startview=startview, nviews=nviews, url_only=True
         )
-        for i in range(self.trials):
+        for _ in range(self.MAX_RATELIMITS):
+            limiter.acquire(url)
+            # the ratelimit image must not be cached, lest every retry get it
             status = download(
                 url,
+                valid=lambda f: not imghdr.what(f),
                 download_file=str(fn.resolve()),
                 timeout=120,
             )
-            if status:
-                if imghdr.what(fn):
-                    print("We got ratelimited, backing off")
-                    self._backoff += 1
-                    if self._backoff > 9:
-                        raise Exception("We got ratelimited.")
-                    sleep(2**self._backoff)
-                else:
-                    self._backoff = 0
-                    return True
-            sleep(2 ** (i + 1))
-        return False
+            if not status:
+                return False
+            if not imghdr.what(fn):
+                return True
+            self.logger.info("We got ratelimited, backing off")
+            limiter.penalise(url)
+        raise Exception("We got ratelimited.")
 
 
 class GallicaResource(DownloadableResource):
@@ -486,6 +821,11 @@ class GallicaResource(DownloadableResource):
         self.source_match = source_match_cache.get(self.key) if cache else None
         self.logger.debug(f"Source match is {self.source_match}")
         self.minimum_confidence = 0.5
+        self.issue_concurrency = 4
+        self.prefetch_issues = 2
+        self.issues_inspected: Optional[int] = None
+        self.use_cache = cache
+        self.issue_index = IssueIndex(str(self.series_ark))
         self._desired_pages: Optional[List[int]] = None
         self._ocr_bounds = ocr_cache.get(self.key) if cache else None
 
@@ -525,38 +865,140 @@ class GallicaResource(DownloadableResource):
             source_match_cache[self.key] = self.source_match
         return self.source_match
 
-    def get_possible_issues(self) -> List[OrderedDict]:
-        """Get possible issues.
+    def target_years(self) -> List[int]:
+        """Years in which the target was published."""
+        source = self.target._source()
+        if isinstance(source.publicationdate, list):
+            return list(source.publicationdate)
+        return [source.publicationdate]
+
+    def possible_years(self) -> List[int]:
+        """Years in which the target might have been published.
 
         We go a year in each direction since sometimes collections of issues
-        are made for two years.
+        are made for two years.  Years are sorted by distance from the
+        target's, nearest first.
+        """
+        targets = self.target_years()
+        years = {y for year in targets for y in range(year - 1, year + 2)}
+        return sorted(years, key=lambda y: (min(abs(y - t) for t in targets), y))
+
+    def iter_issue_years(
+        self,
+    ) -> Generator[Tuple[int, List[Dict[str, Any]]], None, None]:
+        """Yield each possible year with its issues, as they are fetched.
+
+        The issues of every possible year are fetched `self.issue_concurrency`
+        years at a time (each request still waits its turn with the ratelimiter),
+        nearest years first.  Years already in the series' `IssueIndex` are
+        yielded straight away, and those fetched are added to it.  Years which
+        could not be fetched are yielded with no issues.  Years not yet fetched
+        when the caller stops iterating are cancelled.
         """
         self.logger.debug("Getting possible issues.")
-        source = self.target._source()
-        issues = []
-        years = []
-        if isinstance(source.publicationdate, list):
-            for year in source.publicationdate:
-                years += list(range(year - 1, year + 2))
-        else:
-            years = list(range(source.publicationdate - 1, source.publicationdate + 2))
-        for year in set(years):
-            issue = Resource(self.series_ark).issues_sync(str(year))
-            if not issue.is_left:
-                issues.append(issue.value)
+        series = Resource(self.series_ark)
+        pool = ThreadPoolExecutor(max(1, self.issue_concurrency))
+        futures = {}
+        known = []
+        for year in self.possible_years():
+            issues = self.issue_index.year(year) if self.use_cache else None
+            if issues is None:
+                futures[pool.submit(series.issues_sync, str(year))] = year
             else:
-                self.logger.debug(f"unable to fetch year {year}")
-        if not issues:
+                known.append((year, issues))
+        try:
+            yield from known
+            for future in as_completed(futures):
+                year = futures[future]
+                either = future.result()
+                if either.is_left:
+                    self.logger.debug(f"unable to fetch year {year}")
+                    yield year, []
+                    continue
+                detail = either.value["issues"]["issue"]
+                issues = detail if isinstance(detail, list) else [detail]
+                self.issue_index.set_year(year, issues)
+                yield year, issues
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def iter_possible_issues(self) -> Generator[Dict[str, Any], None, None]:
+        """Yield possible issues as they are fetched.
+
+        Raises:
+          MatchingError: if no issues were found at all.
+        """
+        found = False
+        with closing(self.iter_issue_years()) as years:
+            for _, issues in years:
+                found = found or bool(issues)
+                yield from issues
+        if not found:
             raise MatchingError("Failed to find any matching issues")
 
-        details = []
-        for year in issues:
-            detail = year["issues"]["issue"]
-            if isinstance(detail, list):
-                details += detail
-            else:
-                details.append(detail)
-        return details
+    def get_possible_issues(self) -> List[Dict[str, Any]]:
+        """Get possible issues.  See `iter_possible_issues`."""
+        return list(self.iter_possible_issues())
+
+    def issue_distance(self, detail: Dict[str, Any]) -> Tuple[int, int, int]:
+        """How far an issue is from the target, judging by its title.
+
+        Issue titles usually hold a date, and sometimes a volume (T) and
+        number (N); see `parse_description`.  Each part is compared with the
+        target's, and counts as a match where either side is unknown.
+        """
+        try:
+            parsed = self.parse_description(detail.get("#text") or "")
+        except (TypeError, ValueError):
+            parsed = dict(year=None, volume=None, number=None)
+        target = self.target
+        wanted = dict(
+            year=self.target_years(),
+            volume=getattr(target, "volume", None),
+            number=getattr(target, "number", None),
+        )
+        distance = []
+        for k in ("year", "volume", "number"):
+            ours, theirs = wanted[k], parsed[k]
+            if ours is None or theirs is None:
+                distance.append(0)
+                continue
+            ours = ours if isinstance(ours, list) else [ours]
+            theirs = theirs if isinstance(theirs, list) else [theirs]
+            distance.append(min(abs(a - b) for a in ours for b in theirs))
+        return distance[0], distance[1], distance[2]
+
+    def iter_ranked_issues(self) -> Generator[Dict[str, Any], None, None]:
+        """Yield possible issues, most likely first.
+
+        Years arrive nearest first (see `possible_years`), and a year is only
+        yielded once all years as near or nearer have arrived, so the issues
+        of the target's own year can be examined while the others are still
+        being fetched.  Within a year issues are sorted by `issue_distance`.
+
+        Raises:
+          MatchingError: if no issues were found at all.
+        """
+        order = self.possible_years()
+        targets = self.target_years()
+        band = {y: min(abs(y - t) for t in targets) for y in order}
+        arrived: Dict[int, List[Dict[str, Any]]] = {}
+        found = False
+        with closing(self.iter_issue_years()) as years:
+            for year, issues in years:
+                arrived[year] = issues
+                found = found or bool(issues)
+                # release every band which has fully arrived
+                while order and all(
+                    y in arrived for y in order if band[y] == band[order[0]]
+                ):
+                    current = band[order[0]]
+                    ready = []
+                    while order and band[order[0]] == current:
+                        ready += arrived.pop(order.pop(0))
+                    yield from sorted(ready, key=self.issue_distance)
+        if not found:
+            raise MatchingError("Failed to find any matching issues")
 
     @classmethod
     def parse_description(cls, desc: str) -> dict:
@@ -577,7 +1019,7 @@ class GallicaResource(DownloadableResource):
         return resp
 
     def ocr_find_article_in_journal(
-        self, journal: Resource, pages: OrderedDict
+        self, journal: Resource, pages: Union[Pages, PaginationIndex]
     ) -> bool:
         """Use ocr to find an article in a journal.
 
@@ -594,7 +1036,13 @@ class GallicaResource(DownloadableResource):
         individual articles, which is probably a non-starter.
         """
         target: Article = self.target  # type: ignore
-        start_p = self.get_physical_pno(target.pages[0], pages)
+        pages = PaginationIndex.of(pages)
+        try:
+            start_p = self.get_physical_pno(target.pages[0], pages)
+            end_p = self.get_physical_pno(target.pages[-1], pages)
+        except PageNotFoundError as e:
+            self.logger.debug(f"Article not in volume: {e}")
+            return False
         start_page = make_string_boring(self.fetch_text(journal, start_p))
         if not start_page:
             return False
@@ -610,7 +1058,6 @@ class GallicaResource(DownloadableResource):
                 return True
         else:
             self.logger.debug("Failed to find author on first page.")
-        end_p = self.get_physical_pno(target.pages[-1], pages)
         end_page = make_string_boring(self.fetch_text(journal, end_p))
         if matches := find_near_matches(author, end_page, max_l_dist=5):
             if fuzz.ratio(matches[0].matched, author) > 80:
@@ -628,7 +1075,11 @@ class GallicaResource(DownloadableResource):
         return " ".join(x.text for x in soup.hr.next_siblings if not x.name == "hr")
 
     def toc_find_article_in_journal(
-        self, journal: Resource, toc: str, pages: Pages, data: dict
+        self,
+        journal: Resource,
+        toc: Union[str, List[Tuple[str, str]]],
+        pages: Union[Pages, PaginationIndex],
+        data: dict,
     ) -> List[Article]:
         """Find article in journal using journal's toc.
 
@@ -642,8 +1093,11 @@ class GallicaResource(DownloadableResource):
 
         """
         target: Article = self.target  # type: ignore
+        pages = PaginationIndex.of(pages)
         target_start_p = str(target.pages[0])
-        entries = [x for x in self.parse_gallica_toc(toc) if x[0] == target_start_p]
+        if isinstance(toc, str):
+            toc = self.parse_gallica_toc(toc)
+        entries = [x for x in toc if x[0] == target_start_p]
         entries.sort(key=lambda x: int(x[0]))
         articles = []
         for i, x in enumerate(entries):
@@ -663,10 +1117,14 @@ class GallicaResource(DownloadableResource):
             try:
                 end_p = int(entries[i + 1][0]) - 1
             except IndexError:
-                end_p = self.get_last_pno(pages)  # type: ignore
+                end_p = int(pages.numero[pages.last()])
             args["pages"] = list(range(int(start_p), int(end_p) + 1))
-            physical_start_p = self.get_physical_pno(start_p, pages)
-            physical_end_p = self.get_physical_pno(str(end_p), pages)
+            try:
+                physical_start_p = self.get_physical_pno(start_p, pages)
+                physical_end_p = self.get_physical_pno(str(end_p), pages)
+            except PageNotFoundError as e:
+                self.logger.debug(f"Skipping toc entry {x[1]}: {e}")
+                continue
             args["physical_pages"] = list(
                 range(int(physical_start_p), int(physical_end_p) + 1)
             )
@@ -695,6 +1153,84 @@ class GallicaResource(DownloadableResource):
                 toc.append((item.xref.text.strip(), item.seg.text.strip()))
         return toc
 
+    def fetch_issue(self, detail: Dict[str, Any]) -> IssueDocuments:
+        """Fetch the documents needed to look for the article in an issue.
+
+        Issues already in the series' `IssueIndex` need no requests at all.
+        The toc is only fetched if we consider it.
+        """
+        name = detail["@ark"]
+        issue = Resource(Ark(naan=self.series_ark.naan, name=name))
+        record = self.issue_index.issue(name) if self.use_cache else None
+        if record is None:
+            record = self.index_issue(issue, name)
+        toc = self.issue_toc(issue, name) if self.consider_toc else None
+        pages = pagination_index(issue, self.use_cache)
+        return IssueDocuments(detail, issue, record.data, pages, toc)
+
+    def index_issue(self, issue: Resource, name: str) -> IssueRecord:
+        """Fetch an issue's description and add it to the index."""
+        either = issue.oairecord_sync()
+        if either.is_left:
+            raise either.value
+        oai = either.value
+        dublin = oai["results"]["notice"]["record"]["metadata"]["oai_dc:dc"]
+        description = dublin["dc:description"][1]
+        data = self.parse_description(description)
+        data["journaltitle"] = dublin["dc:title"]
+        data["publisher"] = dublin["dc:publisher"]
+        data["ark"] = dublin["dc:identifier"]
+        record = IssueRecord(name, data)
+        self.issue_index.set_issue(record)
+        return record
+
+    def issue_toc(self, issue: Resource, name: str) -> Optional[List[Tuple[str, str]]]:
+        """An issue's toc, from the index or fetched and added to it.
+
+        A toc which could not be fetched for now is not indexed, so that it is
+        asked for again next time.  One which can't be parsed is indexed as
+        missing.
+
+        Returns:
+          The parsed toc, or None if the issue has none (or we can't get it).
+        """
+        toc = self.issue_index.toc(name) if self.use_cache else None
+        if toc is None:
+            either = issue.toc_sync()
+            if either.is_left:
+                if not helpers.is_permanent_failure(either):
+                    return None
+                toc = []
+            else:
+                try:
+                    toc = self.parse_gallica_toc(either.value)
+                except Exception as e:
+                    self.logger.debug(f"Failed to parse toc of {name}: {e}")
+                    toc = []
+            self.issue_index.set_toc(name, toc)
+        return toc or None
+
+    def iter_issue_documents(
+        self, issues: Iterable[Dict[str, Any]]
+    ) -> Generator[IssueDocuments, None, None]:
+        """Yield the documents of issues in order, prefetching the next ones.
+
+        While the caller looks at one issue the documents of the next
+        `self.prefetch_issues` are fetched in the background.  Prefetches
+        still outstanding when the caller stops iterating are cancelled.
+        """
+        pool = ThreadPoolExecutor(max(1, self.prefetch_issues))
+        pending: deque[Future] = deque()
+        try:
+            for detail in issues:
+                pending.append(pool.submit(self.fetch_issue, detail))
+                if len(pending) > self.prefetch_issues:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
     def get_article_candidates(self) -> List[Match]:
         """Generate match objs for each article in the corresponding issues.
 
@@ -702,46 +1238,29 @@ class GallicaResource(DownloadableResource):
           A list of Match() objects in order of decreasing score.
         """
         self.logger.debug("Generating article candidates")
-        details = self.get_possible_issues()
         matches = []
-        for detail in details:
-            self.logger.debug(f"Considering {detail['#text']}")
-            data = {}
-            ark = Ark(naan=self.series_ark.naan, name=detail["@ark"])
-            issue = Resource(ark)
-
-            either = issue.oairecord_sync()
-            if either.is_left:
-                raise either.value
-            oai = either.value
-            dublin = oai["results"]["notice"]["record"]["metadata"]["oai_dc:dc"]
-            description = dublin["dc:description"][1]
-            data.update(self.parse_description(description))
-            data["journaltitle"] = dublin["dc:title"]
-            data["publisher"] = dublin["dc:publisher"]
-            data["ark"] = dublin["dc:identifier"]
-
-            either = issue.pagination_sync()
-            if either.is_left:
-                raise either.value
-            pages = either.value
-
-            articles = []
-            if self.consider_toc and not (either := issue.toc_sync()).is_left:
-                articles = self.toc_find_article_in_journal(
-                    issue, either.value, pages, data
-                )
-                matches += [Match(self.target, a) for a in articles]
-            if not articles:
-                if self.ocr_find_article_in_journal(issue, pages):
-                    args = dict(self.target)
-                    args.update(data)
-                    matches.append(Match(self.target, Article.parse_obj(args)))
-
-            matches.sort(reverse=True)
-            if matches and matches[0].score > 0.7:
-                break
+        self.issues_inspected = 0
+        issues = self.iter_ranked_issues()
+        documents = self.iter_issue_documents(issues)
+        with closing(issues), closing(documents):
+            for detail, issue, data, pages, toc in documents:
+                self.logger.debug(f"Considering {detail['#text']}")
+                self.issues_inspected += 1
+                articles = []
+                if toc is not None:
+                    articles = self.toc_find_article_in_journal(issue, toc, pages, data)
+                    matches += [Match(self.target, a) for a in articles]
+                if not articles:
+                    if self.ocr_find_article_in_journal(issue, pages):
+                        args = dict(self.target)
+                        args.update(data)
+                        matches.append(Match(self.target, Article.parse_obj(args)))
+
+                matches.sort(reverse=True)
+                if matches and matches[0].score > 0.7:
+                    break
 
+        self.logger.info(f"Inspected {self.issues_inspected} issues.")
         return matches[:5]
 
     def get_best_article_match(self) -> Optional[Match]:
@@ -772,8 +1291,7 @@ class GallicaResource(DownloadableResource):
                     self.get_physical_pno(p) for p in self.target.pages  # type: ignore
                 ]
             else:
-                pages = self.pages
-                self._desired_pages = [int(p["ordre"]) for p in pages]  # type: ignore
+                self._desired_pages = list(self.pagination_index.ordre)
 
         return self._desired_pages
 
@@ -821,21 +1339,16 @@ class GallicaResource(DownloadableResource):
         self.resource.timeout = val
 
     @staticmethod
-    def get_last_pno(pages: Pages) -> str:
-        """Get last page number of internal volume."""
-        pnos = pages["livre"]["pages"]["page"]
-        if not pnos:
-            raise ValueError("No page numbers present.")
-        for p in reversed(pnos):
-            if p["pagination_type"] == "A":
-                break
-        return p["ordre"]
+    def get_last_pno(pages: Union[Pages, PaginationIndex]) -> int:
+        """Get last page number of internal volume, as a view."""
+        index = PaginationIndex.of(pages)
+        return index.ordre[index.last()]
 
     @DownloadableResource.start_p.getter  # type: ignore
     def start_p(self) -> Optional[int]:
         """Physical page we start on."""
         if not self._start_p:
-            self._start_p = int(self.get_physical_pno(self.target.pages[0]))  # type: ignore
+            self._start_p = self.get_physical_pno(self.target.pages[0])  # type: ignore
         return self._start_p
 
     @DownloadableResource.end_p.getter  # type: ignore
@@ -843,7 +1356,7 @@ class GallicaResource(DownloadableResource):
         """Physical page we end on."""
         if not self._end_p:
             try:
-                self._end_p = int(self.get_physical_pno(self.target.pages[-1]))  # type: ignore
+                self._end_p = self.get_physical_pno(self.target.pages[-1])  # type: ignore
             except AttributeError:
                 pass
         return self._end_p
@@ -0,0 +1,201 @@
+"""Rate limit requests to Gallica.
+
+Gallica punishes bursts of requests (see the caching docs), and every worker in
+the pipeline's pool talks to the same hosts.  We therefore keep one token bucket
+per host in a small sqlite database, so the limit is shared by every process on
+the machine.  When the server answers 429 the bucket is drained and its rate
+halved for *everybody*; it then creeps back up to the configured rate.
+"""
+import asyncio
+import sqlite3
+import threading
+from logging import getLogger
+from os import getenv, getpid
+from pathlib import Path
+from time import sleep, time
+from typing import Callable, Optional, Tuple
+from urllib.parse import urlparse
+
+from .cache import cachedir
+
+logger = getLogger(__name__)
+
+
+class TokenBucket:
+    """A per-host token bucket shared between processes through sqlite."""
+
+    DEFAULT_PENALTY = 30
+
+    def __init__(
+        self, path: Path, rate: float, burst: float, min_rate: float = 0.05
+    ) -> None:
+        """Set up bucket.
+
+        Args:
+          path: Database holding the buckets.  Every process using the same
+            path shares the same buckets.
+          rate: Requests per second.  A rate of 0 disables limiting.
+          burst: Maximum number of tokens in the bucket.
+          min_rate: Floor below which 429s no longer shrink the rate.
+        """
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self._con: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    @property
+    def con(self) -> sqlite3.Connection:
+        """Connection to the bucket database, opened lazily in each process."""
+        if not self._con or self._pid != getpid():
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            self._con = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(host TEXT PRIMARY KEY, tokens REAL, rate REAL, updated REAL, "
+                "blocked_until REAL)"
+            )
+            self._pid = getpid()
+        return self._con
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).netloc or url
+
+    def _transaction(self, host: str, fn: Callable) -> float:
+        """Apply fn to host's bucket atomically across processes."""
+        with self._lock:
+            return self._locked_transaction(host, fn)
+
+    def _locked_transaction(self, host: str, fn: Callable) -> float:
+        con = self.con
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            row = con.execute(
+                "SELECT tokens, rate, updated, blocked_until FROM buckets WHERE host = ?",
+                (host,),
+            ).fetchone()
+            now = time()
+            state = row if row else (self.burst, self.rate, now, 0.0)
+            *state, result = fn(now, *state)
+            con.execute(
+                "REPLACE INTO buckets (host, tokens, rate, updated, blocked_until) "
+                "VALUES (?,?,?,?,?)",
+                (host, *state),
+            )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return result
+
+    def _take(
+        self, now: float, tokens: float, rate: float, updated: float, blocked: float
+    ) -> Tuple[float, float, float, float, float]:
+        if now < blocked:
+            return tokens, rate, updated, blocked, blocked - now
+        elapsed = max(now - updated, 0)
+        tokens = min(self.burst, tokens + elapsed * rate)
+        if tokens < 1:
+            return tokens, rate, now, blocked, (1 - tokens) / rate
+        # additive increase back to the configured rate after a penalty
+        rate = min(self.rate, rate + self.rate / 20)
+        return tokens - 1, rate, now, blocked, 0
+
+    def try_acquire(self, url: str) -> float:
+        """Try to take a token.
+
+        Returns:
+          0 if a token was taken, otherwise the number of seconds to wait
+          before trying again.
+        """
+        if not self.enabled:
+            return 0
+        return self._transaction(self.host(url), self._take)
+
+    def acquire(self, url: str) -> None:
+        """Block until a token is available for url's host."""
+        while wait := self.try_acquire(url):
+            sleep(wait)
+
+    async def acquire_async(self, url: str) -> None:
+        """Wait until a token is available for url's host (Async version).
+
+        The transaction may wait on other processes' locks, so it is run in a
+        thread rather than on the event loop.
+        """
+        if not self.enabled:
+            return
+        while wait := await asyncio.to_thread(self.try_acquire, url):
+            await asyncio.sleep(wait)
+
+    def penalise(self, url: str, retry_after: Optional[float] = None) -> None:
+        """Shrink the bucket for url's host after being ratelimited.
+
+        Args:
+          url: Url which was ratelimited.
+          retry_after: Seconds the server asked us to wait, if known.
+        """
+        pause = self._pause(retry_after)
+        if not self.enabled:
+            sleep(pause)
+            return
+        self._shrink(url, pause)
+
+    async def penalise_async(
+        self, url: str, retry_after: Optional[float] = None
+    ) -> None:
+        """Shrink the bucket for url's host after being ratelimited (Async version).
+
+        See penalise.
+        """
+        pause = self._pause(retry_after)
+        if not self.enabled:
+            await asyncio.sleep(pause)
+            return
+        await asyncio.to_thread(self._shrink, url, pause)
+
+    def _pause(self, retry_after: Optional[float]) -> float:
+        return self.DEFAULT_PENALTY if retry_after is None else retry_after
+
+    def _shrink(self, url: str, pause: float) -> None:
+        """Halve the rate for url's host and block it for pause seconds."""
+
+        def penalise(
+            now: float, tokens: float, rate: float, updated: float, blocked: float
+        ) -> Tuple[float, float, float, float, float]:
+            rate = max(self.min_rate, rate / 2)
+            blocked = max(blocked, now + pause)
+            # refill only starts once the pause is over
+            return 0, rate, blocked, blocked, 0
+
+        self._transaction(self.host(url), penalise)
+        logger.info(f"Ratelimited on {self.host(url)}, pausing for {pause}s.")
+
+
+limiter = TokenBucket(
+    cachedir / "ratelimit.db",
+    rate=float(getenv("RATE_LIMIT", 2)),
+    burst=float(getenv("RATE_BURST", 5)),
+)
+
+
+def configure(rate: Optional[float] = None, burst: Optional[float] = None) -> None:
+    """Configure the global limiter.
+
+    Args:
+      rate: Requests per second per host.  0 disables limiting.
+      burst: Maximum burst of requests.
+    """
+    if rate is not None:
+        limiter.rate = rate
+    if burst is not None:
+        limiter.burst = burst
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""Benchmark concurrent writes to the sqlite cache.
+
+Forks a number of writers which all write to the same table, and reports the
+overall throughput.  Run with --commit-every 1 --journal-mode DELETE to see how
+the cache behaved before writes were batched and WAL was enabled.
+"""
+
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from gallica_autobib.cache import Cached
+
+
+def write(table: Cached, worker: int, n: int, size: int) -> None:
+    for i in range(n):
+        table[f"{worker}-{i}"] = "x" * size
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=6)
+    parser.add_argument("--writes", type=int, default=2000, help="Per process.")
+    parser.add_argument("--size", type=int, default=1024, help="Bytes per value.")
+    parser.add_argument("--commit-every", type=int, default=Cached.COMMIT_EVERY)
+    parser.add_argument("--journal-mode", default=Cached.JOURNAL_MODE)
+    args = parser.parse_args()
+
+    Cached.COMMIT_EVERY = args.commit_every
+    Cached.JOURNAL_MODE = args.journal_mode
+    with TemporaryDirectory() as tmpdir:
+        Cached.cachedir = Path(tmpdir)
+        table = Cached("bench")
+        table.con  # create the table before forking
+        ctx = get_context("fork")
+        procs = [
+            ctx.Process(target=write, args=(table, i, args.writes, args.size))
+            for i in range(args.processes)
+        ]
+        start = perf_counter()
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = perf_counter() - start
+        (count,) = table.con.execute('SELECT COUNT(*) FROM "bench"').fetchone()
+
+    total = args.processes * args.writes
+    print(
+        f"{args.processes} processes, {total} writes "
+        f"(commit every {args.commit_every}, {args.journal_mode}): "
+        f"{elapsed:.2f}s, {total / elapsed:.0f} writes/s, {count} rows"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from os import getpid, utime
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from time import sleep, time
 
+import jsonpickle
 import pytest
 from gallica_autobib import cache
 
 
 @pytest.fixture
 def tmp_cache():
+    cachedir = cache.Cached.cachedir
     with TemporaryDirectory() as tmp_path:
         cache.Cached.cachedir = Path(tmp_path) / "cache"
         yield cache.Cached
+    cache.Cached.cachedir = cachedir
 
 
 def test_cache(tmp_cache):
@@ -26,3 +36,646 @@ def test_cache(tmp_cache):
     # test that we're dict-like
     assert cache.get(7) == dict(seven=7)
     assert cache.get(9, "oops") == "oops"
+
+
+def test_memory_tier(tmp_cache, mocker):
+    cache = tmp_cache("test_memory")
+    cache["a"] = [1, 2, 3]
+    loads = mocker.spy(cache.codec, "loads")
+    assert cache["a"] == [1, 2, 3]
+    assert cache["a"] == [1, 2, 3]
+    assert not loads.called
+    assert cache.memory.hits == 2
+    cache.flush()
+    # read-through from a fresh process-level cache
+    other = tmp_cache("test_memory")
+    assert other["a"] == [1, 2, 3]
+    assert other.memory.misses == 1
+    assert other["a"] == [1, 2, 3]
+    assert loads.call_count == 1
+    assert other.memory.hits == 1
+
+
+def test_memory_tier_budget():
+    memory = cache.MemoryCache(max_entries=2, max_bytes=100)
+    memory.put("a", "a", 10)
+    memory.put("b", "b", 10)
+    memory["a"]  # skipcq: PYL-W0104
+    memory.put("c", "c", 10)
+    assert len(memory) == 2
+    with pytest.raises(KeyError):
+        memory["b"]  # skipcq: PYL-W0104
+    memory.put("d", "d", 20)
+    memory.put("huge", "huge", 30)
+    assert memory.bytes == 30
+    with pytest.raises(KeyError):
+        memory["huge"]  # skipcq: PYL-W0104
+
+
+def test_codecs(tmp_cache):
+    cache = tmp_cache("test_codecs")
+    assert cache.codec.name == "pickle"
+    cache["bytes"] = b"\x00binary"
+    cache["obj"] = dict(a=(1, 2), b={3})
+    raw = tmp_cache("test_raw", codec="raw")
+    raw["pdf"] = b"%PDF-1.4"
+    with pytest.raises(TypeError):
+        raw["str"] = "not bytes"
+    cache.flush()
+    raw.flush()
+    # the codec is a property of the table, not of the instance
+    other = tmp_cache("test_codecs", codec="raw")
+    assert other.codec.name == "pickle"
+    assert other["bytes"] == b"\x00binary"
+    assert other["obj"] == dict(a=(1, 2), b={3})
+    assert tmp_cache("test_raw")["pdf"] == b"%PDF-1.4"
+
+
+def test_legacy_table_uses_jsonpickle(tmp_cache):
+    tmp_cache.cachedir.mkdir(parents=True)
+    con = sqlite3.connect(tmp_cache.cachedir / tmp_cache.CACHEFN)
+    con.execute('CREATE TABLE "legacy" (key TEXT PRIMARY KEY, value BLOB)')
+    con.execute(
+        'INSERT INTO "legacy" VALUES (?,?)', ("k", jsonpickle.dumps(dict(old=True)))
+    )
+    con.commit()
+    con.close()
+    cache = tmp_cache("legacy")
+    assert cache.codec.name == "jsonpickle"
+    assert cache["k"] == dict(old=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    yield cache.BlobStore(tmp_path / "blobs")
+
+
+def test_blob_store(store, tmp_path):
+    digest = store.put(b"%PDF-1.4 data")
+    assert store.put(b"%PDF-1.4 data") == digest
+    path = store.path_for(digest)
+    assert path.parent.parent.parent == store.root
+    assert path.read_bytes() == b"%PDF-1.4 data"
+    assert store.get(digest) == b"%PDF-1.4 data"
+    dest = tmp_path / "out.pdf"
+    store.link(digest, dest)
+    assert dest.read_bytes() == b"%PDF-1.4 data"
+    assert dest.stat().st_ino == path.stat().st_ino
+    with pytest.raises(FileNotFoundError):
+        store.get("0" * 64)
+
+
+def test_blob_store_put_file(store):
+    fn = store.tmpdir / "download"
+    fn.write_bytes(b"image")
+    digest = store.put_file(fn)
+    assert not fn.exists()
+    assert store.get(digest) == b"image"
+
+
+def test_blob_cached(tmp_cache, store, tmp_path):
+    blobs = cache.BlobCached("test_blobs", store=store)
+    blobs["url"] = b"image data"
+    assert blobs["url"] == b"image data"
+    digest = blobs.digest("url")
+    assert store.get(digest) == b"image data"
+    # sqlite only holds the index
+    blobs.flush()
+    row = blobs.con.execute('SELECT value FROM "test_blobs"').fetchone()
+    assert len(row[0]) < 100
+    assert blobs.link("url", tmp_path / "img")
+    assert not blobs.link("other", tmp_path / "other")
+    # a blob removed from the store is a miss, not an error
+    store.path_for(digest).unlink()
+    assert blobs.get("url") is None
+
+
+def test_download_links_from_store(tmp_cache, store, tmp_path, mocker):
+    def fake_download(url, download_dir, download_file, **kwargs):
+        path = Path(download_dir) / download_file
+        path.write_bytes(b"%PDF-1.4")
+        return str(path)
+
+    fetch = mocker.patch.object(cache.downloader, "download", side_effect=fake_download)
+    mocker.patch.object(cache, "data_cache_enabled", True)
+    mocker.patch.object(cache, "_data_cache", cache.BlobCached("dl", store=store))
+    for name in ("a.pdf", "b.pdf"):
+        outf = cache.download(
+            "https://gallica.bnf.fr/x.pdf", download_file=name, download_dir=tmp_path
+        )
+        assert Path(outf).read_bytes() == b"%PDF-1.4"
+    assert fetch.call_count == 1
+    assert (tmp_path / "a.pdf").stat().st_ino == (tmp_path / "b.pdf").stat().st_ino
+
+
+def test_download_blob_gone(tmp_cache, store, tmp_path, mocker):
+    def fake_download(url, download_dir, download_file, **kwargs):
+        path = Path(download_dir) / download_file
+        path.write_bytes(b"%PDF-1.4")
+        return str(path)
+
+    mocker.patch.object(cache.downloader, "download", side_effect=fake_download)
+    mocker.patch.object(cache, "data_cache_enabled", True)
+    blobs = cache.BlobCached("dl_gone", store=store)
+    mocker.patch.object(cache, "_data_cache", blobs)
+    # evicted between being stored and linked
+    mocker.patch.object(blobs, "link", return_value=False)
+    outf = cache.download(
+        "https://gallica.bnf.fr/x.pdf", download_file="a.pdf", download_dir=tmp_path
+    )
+    assert Path(outf).read_bytes() == b"%PDF-1.4"
+
+
+def test_download_never_caches_invalid(tmp_cache, store, tmp_path, mocker):
+    responses = [b"PNG", b"PNG", b"%PDF-1.4"]
+
+    def fake_download(url, download_dir, download_file, **kwargs):
+        path = Path(download_dir) / download_file
+        path.write_bytes(responses.pop(0))
+        return str(path)
+
+    fetch = mocker.patch.object(cache.downloader, "download", side_effect=fake_download)
+    mocker.patch.object(cache, "data_cache_enabled", True)
+    blobs = cache.BlobCached("dl_invalid", store=store)
+    mocker.patch.object(cache, "_data_cache", blobs)
+    url = "https://gallica.bnf.fr/x.pdf"
+    # say a ratelimited response was cached before we knew better
+    blobs[url] = b"PNG"
+
+    def valid(path):
+        return path.read_bytes() != b"PNG"
+
+    outf = cache.download(
+        url, valid=valid, download_file="a.pdf", download_dir=tmp_path
+    )
+    assert Path(outf).read_bytes() == b"PNG"
+    assert fetch.call_count == 1
+    assert blobs.get(url) is None
+    cache.download(url, valid=valid, download_file="a.pdf", download_dir=tmp_path)
+    assert fetch.call_count == 2
+    outf = cache.download(
+        url, valid=valid, download_file="a.pdf", download_dir=tmp_path
+    )
+    assert Path(outf).read_bytes() == b"%PDF-1.4"
+    assert blobs[url] == b"%PDF-1.4"
+
+
+def test_every_table_has_a_policy():
+    import gallica_autobib.issues  # noqa: F401
+    import gallica_autobib.query  # noqa: F401
+
+    path = str(cache.Cached.cachedir / cache.Cached.CACHEFN)
+    names = {name for p, name in list(cache.Cached.tables) if p == path}
+    assert names
+    assert names <= set(cache.POLICIES)
+
+
+def test_policy_max_entries(tmp_cache):
+    table = tmp_cache("test_lru", policy=cache.Policy(max_entries=2))
+    table["a"] = 1
+    table["b"] = 2
+    table["c"] = 3
+    table.flush()
+    table.memory.clear()
+    table["a"]  # skipcq: PYL-W0104
+    assert table.prune() == 1
+    assert table.get("b") is None
+    assert table["a"] == 1
+    assert table["c"] == 3
+
+
+def test_policy_max_bytes_enforced_on_write(tmp_cache, monkeypatch):
+    monkeypatch.setattr(tmp_cache, "PRUNE_EVERY", 5)
+    table = tmp_cache("test_bytes", codec="raw", policy=cache.Policy(max_bytes=30))
+    for i in range(5):
+        table[str(i)] = b"x" * 10
+    assert len(table.con.execute('SELECT key FROM "test_bytes"').fetchall()) == 3
+    assert table.get("0") is None
+
+
+def test_policy_ttl(tmp_cache, mocker):
+    table = tmp_cache("test_ttl", policy=cache.Policy(ttl=60))
+    table["old"] = "stale"
+    table["new"] = "fresh"
+    table.flush()
+    table.memory.clear()
+    now = cache.time()
+    mocker.patch.object(cache, "time", return_value=now + 120)
+    assert table.get("old") is None
+    table["new"] = "fresh"
+    assert table.prune() == 0
+    assert table["new"] == "fresh"
+
+
+def test_legacy_table_gets_bookkeeping_columns(tmp_cache):
+    tmp_cache.cachedir.mkdir(parents=True)
+    con = sqlite3.connect(tmp_cache.cachedir / tmp_cache.CACHEFN)
+    con.execute('CREATE TABLE "old" (key TEXT PRIMARY KEY, value BLOB)')
+    con.execute('INSERT INTO "old" VALUES (?,?)', ("k", jsonpickle.dumps("value")))
+    con.commit()
+    con.close()
+    table = tmp_cache("old", policy=cache.Policy(max_bytes=0))
+    assert table.con.execute('SELECT size FROM "old"').fetchone()[0] > 0
+    assert table.prune() == 1
+
+
+def test_prune_removes_unreferenced_blobs(tmp_cache, store, monkeypatch):
+    monkeypatch.setattr(store, "GRACE", 0)
+    blobs = cache.BlobCached(
+        "test_prune_blobs", store=store, policy=cache.Policy(max_entries=1)
+    )
+    blobs["a"] = b"first"
+    blobs["b"] = b"second"
+    blobs["c"] = b"second"
+    orphan = store.put(b"orphan")
+    evicted = cache.prune()
+    assert evicted["test_prune_blobs"] == 2
+    assert store.get(blobs.digest("c")) == b"second"
+    assert orphan not in store
+    assert len(list(store.root.glob("??/??/*"))) == 1
+
+
+def test_gc_keeps_new_blobs(store):
+    fresh = store.put(b"fresh")
+    assert store.gc(set()) == 0
+    assert fresh in store
+    old = time() - store.GRACE - 1
+    utime(store._find(fresh), (old, old))
+    # storing it again refers to it afresh
+    store.put(b"fresh")
+    assert store.gc(set()) == 0
+    utime(store._find(fresh), (old, old))
+    assert store.gc(set()) == 1
+    assert fresh not in store
+
+
+def test_writes_are_batched(tmp_cache, monkeypatch):
+    monkeypatch.setattr(tmp_cache, "COMMIT_INTERVAL", 60)
+    table = tmp_cache("test_batch")
+    other = tmp_cache("test_batch")
+    for i in range(tmp_cache.COMMIT_EVERY - 1):
+        table[i] = i
+    assert table[0] == 0
+    assert other.get(0) is None
+    table[tmp_cache.COMMIT_EVERY] = "last"
+    assert other[0] == 0
+    assert table.con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def write(table, n):
+    for i in range(n):
+        table[f"{getpid()}-{i}"] = i
+
+
+def test_forked_writers(tmp_cache):
+    ctx = get_context("fork")
+    table = tmp_cache("test_fork")
+    table["parent"] = 0
+    table.flush()
+    # the children inherit an open connection, and must open their own
+    procs = [ctx.Process(target=write, args=(table, 5)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    (count,) = table.con.execute('SELECT COUNT(*) FROM "test_fork"').fetchone()
+    assert count == 16
+
+
+def test_fork_while_locked(tmp_cache):
+    ctx = get_context("fork")
+    table = tmp_cache("test_fork_locked")
+    table["parent"] = 0
+    table.flush()
+    # unflushed, so the child must not write it again
+    table["pending"] = 1
+    held, done = threading.Event(), threading.Event()
+
+    def hold():
+        with table.write_lock:
+            held.set()
+            done.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    try:
+        proc = ctx.Process(target=write, args=(table, 2))
+        proc.start()
+        proc.join(10)
+        assert proc.exitcode == 0
+    finally:
+        done.set()
+        thread.join()
+    query = 'SELECT key FROM "test_fork_locked"'
+    keys = {k for k, in table.con.execute(query)}
+    assert len(keys) == 3 and "pending" not in keys
+    table.flush()
+    assert "pending" in {k for k, in table.con.execute(query)}
+
+
+def test_cache_factory_key(tmp_cache, monkeypatch):
+    calls = []
+
+    class Thing:
+        def __init__(self, url, noise):
+            self.url = url
+            self.noise = noise
+
+    decorator = cache.cache_factory("test_keys", True)
+
+    @decorator(key=lambda thing: thing.url)
+    def fetch(thing):
+        calls.append(thing)
+        return thing.url.upper()
+
+    assert fetch(Thing("a", 1)) == "A"
+    # unrelated attributes don't change the key
+    assert fetch(Thing("a", 2)) == "A"
+    assert len(calls) == 1
+    table = tmp_cache.tables[(str(tmp_cache.cachedir / tmp_cache.CACHEFN), "test_keys")]
+    table.flush()
+    keys = [k for k, in table.con.execute('SELECT key FROM "test_keys"')]
+    assert len(keys) == 1
+    assert len(keys[0]) == 32
+
+    @decorator
+    def bare(x, y=0):
+        calls.append(x)
+        return x + y
+
+    assert bare(1, y=2) == 3
+    assert bare(1, y=2) == 3
+    assert len(calls) == 2
+
+
+def test_make_key():
+    def fn():
+        pass
+
+    def other():
+        pass
+
+    assert cache.make_key(fn, "url") == cache.make_key(fn, "url")
+    assert cache.make_key(fn, "url") != cache.make_key(other, "url")
+    assert cache.make_key(fn, ("url", 1)) != cache.make_key(fn, ("url", 2))
+
+
+def test_negative_cache(tmp_cache):
+    calls = []
+
+    def failure(resp):
+        if resp == "ok":
+            return None
+        return resp == "gone"
+
+    decorator = cache.cache_factory("test_negative", False, negative=True)
+
+    @decorator(key=lambda x: x, failure=failure)
+    def fetch(x):
+        calls.append(x)
+        return x
+
+    for x in ("gone", "gone", "flaky", "flaky", "ok", "ok"):
+        assert fetch(x) == x
+    # only the permanent failure is cached, as the cache itself is disabled
+    assert calls == ["gone", "flaky", "flaky", "ok", "ok"]
+    table = tmp_cache.tables[
+        (str(tmp_cache.cachedir / tmp_cache.CACHEFN), "test_negative_negative")
+    ]
+    assert table.policy.ttl == cache.NEGATIVE_TTL
+
+
+def test_no_negative_table_without_failure(tmp_cache):
+    decorator = cache.cache_factory("test_positive", True, negative=True)
+
+    @decorator(key=lambda x: x)
+    def fetch(x):
+        return x
+
+    assert fetch("ok") == "ok"
+    path = str(tmp_cache.cachedir / tmp_cache.CACHEFN)
+    assert (path, "test_positive_negative") not in tmp_cache.tables
+    assert "test_positive_negative" not in cache._table_names(cache._connect_cache())
+
+
+def test_factory_pack(tmp_cache):
+    decorator = cache.cache_factory("test_pack", True)
+
+    @decorator(key=lambda x: x, pack=lambda x: x.split(), unpack=" ".join)
+    def fetch(x):
+        return x
+
+    assert fetch("a b") == "a b"
+    table = tmp_cache.tables[(str(tmp_cache.cachedir / tmp_cache.CACHEFN), "test_pack")]
+    assert table[cache.make_key(fetch.__wrapped__, "a b")] == ["a", "b"]
+    assert fetch("a b") == "a b"
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_single_flight_threads(tmp_cache, enabled):
+    calls = []
+    decorator = cache.cache_factory("test_flight", enabled)
+
+    @decorator(key=lambda x: x)
+    def slow(x):
+        calls.append(x)
+        sleep(0.2)
+        return x * 2
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(slow, [1] * 8))
+    assert results == [2] * 8
+    assert calls == [1]
+
+
+async def test_single_flight_async(tmp_cache):
+    calls = []
+    decorator = cache.cache_factory("test_flight_async", True)
+
+    @decorator(key=lambda x: x)
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.2)
+        return x * 2
+
+    assert await asyncio.gather(*[slow(1) for _ in range(8)]) == [2] * 8
+    assert calls == [1]
+
+
+async def test_single_flight_async_claims(tmp_cache):
+    calls = []
+    decorator = cache.cache_factory(
+        "test_flight_async_claims", True, across_processes=True
+    )
+
+    @decorator(key=lambda x: x)
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.2)
+        return x * 2
+
+    assert await asyncio.gather(*[slow(1) for _ in range(8)]) == [2] * 8
+    assert calls == [1]
+    table = tmp_cache("test_flight_async_claims")
+    # the claim was released
+    assert table.claim(cache.make_key(slow.__wrapped__, 1), 60)
+
+
+def test_claims_only_for_blobs(tmp_cache, mocker):
+    claim = mocker.spy(cache.Cached, "claim")
+
+    @cache.cache_factory("test_no_claims", True)
+    def fetch(x):
+        return x * 2
+
+    assert fetch(1) == 2
+    assert not claim.called
+
+
+def flight(decorated, x, calls):
+    decorated(x)
+    # report the calls made in this process
+    calls.put(len(decorated.calls))
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_single_flight_processes(tmp_cache, enabled):
+    decorator = cache.cache_factory("test_flight_procs", enabled)
+
+    @decorator(key=lambda x: x, across_processes=True)
+    def slow(x):
+        slow.calls.append(x)
+        sleep(0.5)
+        return x * 2
+
+    slow.calls = []
+    ctx = get_context("fork")
+    calls = ctx.Queue()
+    procs = [ctx.Process(target=flight, args=(slow, 1, calls)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    # uncached results are handed off to the waiting processes
+    assert sorted(calls.get() for _ in procs) == [0, 0, 1]
+    assert slow(1) == 2
+    assert bool(slow.calls) is not enabled
+
+
+def test_claims_lapse_with_their_process(tmp_cache):
+    table = tmp_cache("test_claims")
+    assert table.claim("k", 60)
+    assert not table.claim("k", 60)
+    table.release("k")
+    assert table.claim("k", 60)
+    # a claim held by a dead process is void
+    table.con.execute("UPDATE _inflight SET pid = ?", (2**22 + 1,))
+    table.con.commit()
+    assert table.claim("k", 60)
+
+
+def test_export_import_bundle(tmp_cache, tmp_path, monkeypatch):
+    table = tmp_cache("test_export")
+    table["old"] = "old"
+    table.flush()
+    table.con.execute('UPDATE "test_export" SET created = 0')
+    table.con.commit()
+    table["new"] = "new"
+    store = cache.BlobStore(tmp_path / "blobs")
+    blobs = cache.BlobCached("test_export_blobs", store=store)
+    blobs["pdf"] = b"%PDF-1.4"
+    bundle = tmp_path / "bundle.db"
+    exported = cache.export_bundle(
+        bundle, tables=["test_export", "test_export_blobs"], since=1
+    )
+    assert exported == {"test_export": 1, "test_export_blobs": 1}
+
+    # import on another machine
+    monkeypatch.setattr(tmp_cache, "cachedir", tmp_path / "other")
+    monkeypatch.setattr(cache, "blobs", cache.BlobStore(tmp_path / "other_blobs"))
+    # pickles are only loaded from a bundle we trust
+    with pytest.raises(ValueError, match="test_export\\)"):
+        cache.import_bundle(bundle)
+    imported = cache.import_bundle(bundle, trusted=True)
+    assert imported == {"test_export": 1, "test_export_blobs": 1}
+    assert tmp_cache("test_export")["new"] == "new"
+    assert tmp_cache("test_export").get("old") is None
+    assert cache.BlobCached("test_export_blobs")["pdf"] == b"%PDF-1.4"
+    # merging again adds nothing
+    imported = cache.import_bundle(bundle, trusted=True)
+    assert imported == {"test_export": 0, "test_export_blobs": 0}
+
+
+def test_export_touched(tmp_cache, tmp_path, monkeypatch):
+    table = tmp_cache("test_touched")
+    table["before"] = 1
+    monkeypatch.setattr(tmp_cache, "touch_tag", "refs.bib")
+    table["during"] = 2
+    table["before"]  # skipcq: PYL-W0104
+    table["other"] = 3
+    monkeypatch.setattr(tmp_cache, "touch_tag", None)
+    table["after"] = 4
+    bundle = tmp_path / "bundle.db"
+    assert cache.export_bundle(bundle, tag="refs.bib")["test_touched"] == 3
+    # touches of keys which are gone are forgotten
+    with table.write_lock:
+        table._evict(["during"])
+    table.prune()
+    touched = table.con.execute("SELECT key FROM _touched ORDER BY key").fetchall()
+    assert touched == [("before",), ("other",)]
+
+
+def test_export_unknown_table(tmp_cache, tmp_path):
+    tmp_cache("test_known")["k"] = "v"
+    with pytest.raises(ValueError, match="test_unknown"):
+        cache.export_bundle(tmp_path / "bundle.db", tables=["test_unknown"])
+    assert "test_unknown" not in cache._table_names(cache._connect_cache())
+    assert not (tmp_path / "bundle.db").exists()
+
+
+def test_import_bad_bundle(tmp_cache, tmp_path):
+    bundle = tmp_path / "bundle.db"
+    sqlite3.connect(bundle).execute("PRAGMA user_version = 99")
+    with pytest.raises(ValueError):
+        cache.import_bundle(bundle)
+
+
+def test_peek(tmp_cache, store):
+    table = tmp_cache("test_peek")
+    assert table.peek("a") is None
+    table["a"] = 1
+    assert table.peek("a") == 1
+    blobs = cache.BlobCached("test_peek_blobs", store=store)
+    blobs["a"] = b"x"
+    assert blobs.peek("a") == b"x"
+    assert blobs.peek("b") is None
+    # polling for others' results isn't a lookup of ours
+    assert not table.stats.lookups
+    assert not blobs.stats.lookups
+
+
+def test_stats(tmp_cache):
+    table = tmp_cache("test_stats")
+    table["a"] = "x" * 100
+    table["a"]  # skipcq: PYL-W0104
+    table.get("b")
+    assert table.stats.hits == 1
+    assert table.stats.memory_hits == 1
+    assert table.stats.misses == 1
+    assert table.stats.hit_ratio == 0.5
+    assert table.stats.lookup_seconds > 0
+    assert table.stats.bytes_written > 100
+    table.memory.clear()
+    table.flush()
+    table["a"]  # skipcq: PYL-W0104
+    assert table.stats.bytes_read > 100
+    report = cache.stats(largest=1)["test_stats"]
+    assert report["entries"] == 1
+    assert report["largest"] == [("a", report["bytes"])]
+    assert report["last_run"].hits == 2
+    assert report["last_run"].misses == 1
+    # stats are only written once
+    table.flush()
+    assert cache.stats()["test_stats"]["last_run"].hits == 2
@@ -16,3 +16,26 @@ def test_app(fixed_tmp_path, file_regression):
         pass
     assert result.exit_code == 0
     file_regression.check(result.stdout)
+
+
+def test_cache_prune():
+    result = runner.invoke(app, ["cache", "prune"])
+    assert result.exit_code == 0
+    assert "in total" in result.stdout
+
+
+def test_cache_export_import(tmp_path):
+    bundle = tmp_path / "bundle.db"
+    result = runner.invoke(app, ["cache", "export", str(bundle), "--table", "ark"])
+    assert result.exit_code == 0
+    assert "ark: exported" in result.stdout
+    result = runner.invoke(app, ["cache", "import", str(bundle)])
+    assert result.exit_code != 0
+    result = runner.invoke(app, ["cache", "import", "--trust", str(bundle)])
+    assert result.exit_code == 0
+    assert "ark: imported 0 entries" in result.stdout
+
+
+def test_cache_stats():
+    result = runner.invoke(app, ["cache", "stats"])
+    assert result.exit_code == 0
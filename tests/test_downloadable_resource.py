@@ -1,5 +1,12 @@
+from io import BytesIO
+
+import httpx
 import pytest
-from gallica_autobib.query import DownloadableResource
+from gallica_autobib import query
+from gallica_autobib.blocks import Block, BlockManifest, BlockPlanner, PdfAssembler
+from gallica_autobib.gallipy import helpers
+from gallica_autobib.query import DownloadableResource, DownloadError
+from PyPDF4 import PdfFileReader, PdfFileWriter
 
 
 @pytest.mark.web
@@ -10,3 +17,230 @@ def test_set_max_pages():
     resource.set_max_pages()
     assert 1 == resource.start_p
     assert 154 == resource.end_p
+
+
+@pytest.fixture
+def fake_blocks(mocker):
+    calls = []
+    failed = set()
+
+    def fetch_block(self, start, length, fn):
+        calls.append((start, length))
+        if start == 11 and start not in failed:
+            failed.add(start)
+            return False
+        fn.write_text(f"{start} {length}")
+        return True
+
+    mocker.patch.object(DownloadableResource, "_fetch_block", fetch_block)
+    mocker.patch.object(DownloadableResource, "RETRY_PAUSE", 0)
+    yield calls
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_download_pdf_chunks(fake_blocks, tmp_path, concurrency):
+    resource = DownloadableResource()
+    resource.concurrency = concurrency
+    partials = resource.download_pdf_chunks(tmp_path / "out.pdf", 5, 1, 23)
+    assert [p.read_text() for p in partials] == [
+        "1 5",
+        "6 5",
+        "11 5",
+        "16 5",
+        "21 3",
+    ]
+    assert sorted(fake_blocks) == sorted(
+        [(1, 5), (6, 5), (11, 5), (11, 5), (16, 5), (21, 3)]
+    )
+
+
+def test_download_pdf_chunks_gives_up(fake_blocks, tmp_path):
+    resource = DownloadableResource()
+    resource.block_retries = 0
+    with pytest.raises(DownloadError):
+        resource.download_pdf_chunks(tmp_path / "out.pdf", 5, 1, 23)
+
+
+def test_download_pdf_chunks_resumes(fake_blocks, tmp_path):
+    resource = DownloadableResource()
+    resource.ark = "ark:/12148/bpt6k65545564"
+    resource.block_retries = 0
+    outf = tmp_path / "out.pdf"
+    with pytest.raises(DownloadError):
+        resource.download_pdf_chunks(outf, 5, 1, 23)
+    assert BlockManifest.path_for(outf).exists()
+    fake_blocks.clear()
+    (tmp_path / "out.pdf.6").write_text("corrupt")
+    partials = resource.download_pdf_chunks(outf, 5, 1, 23)
+    assert (1, 5) not in fake_blocks
+    assert {(6, 5), (11, 5)} <= set(fake_blocks)
+    assert partials[1].read_text() == "6 5"
+
+
+def test_manifest_other_ark(tmp_path):
+    fn = tmp_path / "out.pdf.0"
+    fn.write_text("data")
+    manifest = BlockManifest.load(tmp_path / "out.pdf", "ark:/12148/one")
+    manifest.add(1, 5, fn)
+    assert BlockManifest.load(tmp_path / "out.pdf", "ark:/12148/one").valid(1, 5, fn)
+    assert not BlockManifest.load(tmp_path / "out.pdf", "ark:/12148/two").valid(
+        1, 5, fn
+    )
+
+
+def test_download_pdf_chunks_adaptive(fake_blocks, tmp_path):
+    resource = DownloadableResource()
+    resource.adaptive_blocks = True
+    resource.min_blocksize = 2
+    partials = resource.download_pdf_chunks(tmp_path / "out.pdf", 5, 1, 23)
+    views = []
+    for p in partials:
+        start, length = map(int, p.read_text().split())
+        views += list(range(start, start + length))
+    assert views == list(range(1, 24))
+    log = resource.block_log
+    assert [x["nviews"] for x in log][:2] == [5, 7]
+
+
+def test_planner_splits_failed_blocks():
+    planner = BlockPlanner([(1, 100)], 40, adaptive=True, min_size=10)
+    block = planner.next()
+    assert block == Block(1, 40)
+    assert planner.failed(block, 120)
+    assert planner.next() == Block(1, 20)
+    assert planner.next() == Block(21, 20)
+    assert planner.next() == Block(41, 20)
+
+
+def test_planner_gaps():
+    assert BlockPlanner.gaps(1, 30, [(6, 10), (16, 20)]) == [
+        (1, 5),
+        (11, 15),
+        (21, 30),
+    ]
+    assert BlockPlanner.gaps(1, 10, [(1, 10)]) == []
+
+
+def make_block(start, nviews):
+    """A pdf like gallica's: a two-page cover followed by one page per view."""
+    writer = PdfFileWriter()
+    writer.addBlankPage(99, 100)
+    writer.addBlankPage(100, 100)
+    for view in range(start, start + nviews):
+        writer.addBlankPage(100 + view, 100)
+    stream = BytesIO()
+    writer.write(stream)
+    stream.seek(0)
+    return stream
+
+
+def page_widths(path):
+    reader = PdfFileReader(str(path))
+    return [int(p.mediaBox.getWidth()) for p in reader.pages]
+
+
+@pytest.mark.parametrize("suppress_cover_page", [False, True])
+def test_assembler_out_of_order(tmp_path, suppress_cover_page):
+    assembler = PdfAssembler(1, suppress_cover_page)
+    assembler.add(4, 2, make_block(4, 2))
+    assembler.add(1, 3, make_block(1, 3))
+    assembler.add(6, 1, make_block(6, 1))
+    outf = tmp_path / "out.pdf"
+    assembler.write(outf)
+    cover = [] if suppress_cover_page else [99, 100]
+    assert page_widths(outf) == cover + [101, 102, 103, 104, 105, 106]
+
+
+def test_assembler_write_failure(tmp_path, mocker):
+    assembler = PdfAssembler(1)
+    assembler.add(1, 2, make_block(1, 2))
+    mocker.patch.object(assembler.merger, "write", side_effect=OSError("disk full"))
+    with pytest.raises(OSError):
+        assembler.write(tmp_path / "out.pdf")
+    assert not list(tmp_path.iterdir())
+
+
+def test_assembler_missing_block(tmp_path):
+    assembler = PdfAssembler(1)
+    assembler.add(4, 2, make_block(4, 2))
+    with pytest.raises(ValueError):
+        assembler.write(tmp_path / "out.pdf")
+
+
+def test_download_pdf_stream(mocker, tmp_path):
+    mocker.patch.object(
+        DownloadableResource,
+        "_fetch_block_data",
+        lambda self, start, nviews: make_block(start, nviews),
+    )
+    resource = DownloadableResource()
+    resource.concurrency = 3
+    outf = tmp_path / "out.pdf"
+    resource.download_pdf_stream(outf, 4, 1, 10)
+    assert page_widths(outf) == [99, 100] + list(range(101, 111))
+    assert not list(tmp_path.glob("out.pdf.*"))
+
+
+def test_download_pdf_stream_closes_blocks(mocker, tmp_path):
+    streams = []
+
+    def fetch_block_data(self, start, nviews):
+        if start > 4:
+            raise Exception("Boom")
+        streams.append(make_block(start, nviews))
+        return streams[-1]
+
+    mocker.patch.object(DownloadableResource, "_fetch_block_data", fetch_block_data)
+    resource = DownloadableResource()
+    with pytest.raises(Exception, match="Boom"):
+        resource.download_pdf_stream(tmp_path / "out.pdf", 4, 1, 10)
+    assert streams
+    assert all(s.closed for s in streams)
+
+
+def test_fetch_block_data_ratelimited(mocker):
+    data = make_block(1, 2).getvalue()
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if len(requests) == 1:
+            return httpx.Response(429, headers={"retry-after": "5"})
+        return httpx.Response(200, content=data)
+
+    helpers.set_client(httpx.Client(transport=httpx.MockTransport(handler)))
+    limiter = mocker.patch.object(query, "limiter")
+    mocker.patch.object(query, "sleep")
+    resource = DownloadableResource()
+    resource.ark = "ark:/12148/bpt6k65545564"
+    try:
+        stream = resource._fetch_block_data(1, 2)
+    finally:
+        helpers.set_client(None)
+    limiter.penalise.assert_called_once_with(str(requests[0].url), 5)
+    stream.seek(0)
+    assert stream.read() == data
+
+
+def test_fetch_block_data_gives_up(mocker):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if "f1n2" in str(request.url):
+            return httpx.Response(429, headers={"retry-after": "0"})
+        return httpx.Response(500)
+
+    helpers.set_client(httpx.Client(transport=httpx.MockTransport(handler)))
+    mocker.patch.object(query, "limiter")
+    resource = DownloadableResource()
+    resource.ark = "ark:/12148/bpt6k65545564"
+    try:
+        # errors are left to the block planner to retry
+        assert resource._fetch_block_data(3, 2) is None
+        assert len(requests) == 1
+        with pytest.raises(Exception, match="ratelimited"):
+            resource._fetch_block_data(1, 2)
+    finally:
+        helpers.set_client(None)
+    assert len(requests) == 1 + resource.MAX_RATELIMITS
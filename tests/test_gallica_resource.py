@@ -1,13 +1,26 @@
 import pickle
+import threading
+from datetime import date
 from pathlib import Path
 from re import search
+from time import time
 from typing import Union
 
 import pytest
+from gallica_autobib.cache import DAY, Cached
 from gallica_autobib.gallipy import Ark, Resource
 from gallica_autobib.gallipy.ark import ArkParsingError
+from gallica_autobib.gallipy.monadic import Left, Right
+from gallica_autobib.issues import IssueIndex, IssueRecord
 from gallica_autobib.models import Article, Book, Collection, Journal
-from gallica_autobib.query import GallicaResource, Query
+from gallica_autobib.pagination import PageNotFoundError
+from gallica_autobib.query import (
+    GallicaResource,
+    IssueDocuments,
+    Match,
+    MatchingError,
+    Query,
+)
 
 
 @pytest.fixture(scope="session")
@@ -17,6 +30,18 @@ def pages():
         yield pickle.load(f)
 
 
+@pytest.fixture
+def issue_index(gallica_resource, tmp_path):
+    cachedir = Cached.cachedir
+    Cached.cachedir = tmp_path
+    try:
+        index = IssueIndex(str(gallica_resource.series_ark), Cached("issue_index"))
+        gallica_resource.issue_index = index
+        yield index
+    finally:
+        Cached.cachedir = cachedir
+
+
 def test_ark(gallica_resource):
     ark = gallica_resource.ark
     assert get_ark(ark) == get_ark("ark:/12148/bpt6k9735634r")
@@ -200,14 +225,215 @@ def test_parse_partial_description(gallica_resource):
     assert resp["number"] is None
 
 
+def test_possible_issues_concurrent(gallica_resource, issue_index, mocker):
+    years = gallica_resource.possible_years()
+    assert years == [1930, 1929, 1931]
+    arrived = threading.Barrier(len(years), timeout=5)
+
+    def issues_sync(self, year):
+        arrived.wait()  # only passes if every year is fetched at once
+        if year == "1931":
+            return Left(Exception("missing"))
+        return Right({"issues": {"issue": {"@ark": year, "#text": year}}})
+
+    mocker.patch.object(Resource, "issues_sync", issues_sync)
+    issues = gallica_resource.get_possible_issues()
+    assert sorted(x["@ark"] for x in issues) == ["1929", "1930"]
+
+
+def test_possible_issues_stream(gallica_resource, issue_index, mocker):
+    gallica_resource.issue_concurrency = 1
+    release = threading.Event()
+    calls = []
+
+    def issues_sync(self, year):
+        if year != "1930":
+            release.wait(5)
+        calls.append(year)
+        issues = [{"@ark": f"{year}-{n}", "#text": year} for n in range(2)]
+        return Right({"issues": {"issue": issues}})
+
+    mocker.patch.object(Resource, "issues_sync", issues_sync)
+    issues = gallica_resource.iter_possible_issues()
+    # the first year is yielded while the others are still being fetched
+    assert next(issues)["@ark"] == "1930-0"
+    assert calls == ["1930"]
+    issues.close()
+    release.set()
+
+
+def test_no_possible_issues(gallica_resource, issue_index, mocker):
+    mocker.patch.object(Resource, "issues_sync", lambda self, year: Left(Exception()))
+    with pytest.raises(MatchingError):
+        gallica_resource.get_possible_issues()
+
+
+def test_issue_documents_prefetch(gallica_resource, mocker):
+    gallica_resource.prefetch_issues = 2
+    started = []
+    release = threading.Event()
+
+    def fetch_issue(detail):
+        started.append(detail)
+        if detail > 0:
+            release.wait(5)
+        return IssueDocuments(detail, None, {}, None, None)
+
+    mocker.patch.object(gallica_resource, "fetch_issue", fetch_issue)
+    documents = gallica_resource.iter_issue_documents(iter(range(10)))
+    assert next(documents).detail == 0
+    # the next two issues are being fetched while we look at the first
+    assert sorted(started) == [0, 1, 2]
+    documents.close()
+    release.set()
+    assert sorted(started) == [0, 1, 2]
+
+
+def test_article_candidates_early_exit(gallica_resource, mocker):
+    details = [{"@ark": str(n), "#text": str(n)} for n in range(10)]
+    mocker.patch.object(
+        gallica_resource, "iter_ranked_issues", lambda: (x for x in details)
+    )
+    fetched = []
+
+    def fetch_issue(detail):
+        fetched.append(detail)
+        return IssueDocuments(detail, None, {}, None, "toc")
+
+    mocker.patch.object(gallica_resource, "fetch_issue", fetch_issue)
+    target = gallica_resource.target
+    mocker.patch.object(
+        gallica_resource,
+        "toc_find_article_in_journal",
+        lambda issue, toc, pages, data: [target.copy()],
+    )
+    matches = gallica_resource.get_article_candidates()
+    assert len(matches) == 1 and matches[0].score > 0.7
+    assert len(fetched) <= 1 + gallica_resource.prefetch_issues
+    assert gallica_resource.issues_inspected == 1
+
+
+def test_ranked_issues(gallica_resource, issue_index, mocker):
+    gallica_resource.target.volume = 21
+    titles = {
+        "1929": ["1929 (T19)"],
+        "1930": ["1930 (T20)", "octobre 1930 (T21,N3)", "1930"],
+        "1931": ["1931 (T22)"],
+    }
+
+    def issues_sync(self, year):
+        issues = [{"@ark": t, "#text": t} for t in titles[year]]
+        return Right({"issues": {"issue": issues}})
+
+    mocker.patch.object(Resource, "issues_sync", issues_sync)
+    ranked = [x["@ark"] for x in gallica_resource.iter_ranked_issues()]
+    assert ranked == [
+        "octobre 1930 (T21,N3)",
+        "1930",
+        "1930 (T20)",
+        "1931 (T22)",
+        "1929 (T19)",
+    ]
+
+
+def test_issue_index_years(gallica_resource, issue_index, mocker):
+    calls = []
+
+    def issues_sync(self, year):
+        calls.append(year)
+        return Right({"issues": {"issue": [{"@ark": year, "#text": year}]}})
+
+    mocker.patch.object(Resource, "issues_sync", issues_sync)
+    first = gallica_resource.get_possible_issues()
+    assert len(calls) == 3
+    again = GallicaResource(gallica_resource.target, gallica_resource.source)
+    again.issue_index = issue_index
+    key = lambda x: x["@ark"]  # noqa: E731
+    assert sorted(again.get_possible_issues(), key=key) == sorted(first, key=key)
+    assert len(calls) == 3
+
+
+def test_issue_index_refresh(issue_index, mocker):
+    year = date.today().year
+    issue_index.set_year(year, [])
+    issue_index.set_year(1930, [])
+    mocker.patch("gallica_autobib.issues.time", return_value=time() + 31 * DAY)
+    assert issue_index.year(year) is None
+    assert issue_index.year(1930) == []
+
+
+def test_issue_index_issues(gallica_resource, issue_index, mocker):
+    oai = {"dc:description": ["", "1930 (T21)"], "dc:title": "T", "dc:publisher": "P"}
+    oai["dc:identifier"] = "ark"
+    oai = {"results": {"notice": {"record": {"metadata": {"oai_dc:dc": oai}}}}}
+    oairecord = mocker.patch.object(Resource, "oairecord_sync", return_value=Right(oai))
+    toc = mocker.patch.object(Resource, "toc_sync", return_value=Left(Exception()))
+    mocker.patch("gallica_autobib.query.pagination_index", return_value=None)
+    docs = gallica_resource.fetch_issue({"@ark": "bpt6k1"})
+    assert docs.data["volume"] == 21
+    assert issue_index.issue("bpt6k1").data == docs.data
+    # the toc might be there next time
+    assert issue_index.toc("bpt6k1") is None
+    error = Exception()
+    error.permanent = True
+    toc.return_value = Left(error)
+    assert gallica_resource.fetch_issue({"@ark": "bpt6k1"}).toc is None
+    assert issue_index.toc("bpt6k1") == []
+    gallica_resource.fetch_issue({"@ark": "bpt6k1"})
+    assert oairecord.call_count == 1
+    assert toc.call_count == 2
+
+
+def test_issue_toc_lazy(gallica_resource, issue_index, mocker):
+    mocker.patch.object(
+        GallicaResource, "index_issue", return_value=IssueRecord("bpt6k1", {})
+    )
+    mocker.patch("gallica_autobib.query.pagination_index", return_value=None)
+    toc = mocker.patch.object(Resource, "toc_sync", return_value=Right("<a/>"))
+    mocker.patch.object(
+        GallicaResource, "parse_gallica_toc", side_effect=AttributeError("xref")
+    )
+    gallica_resource.consider_toc = False
+    gallica_resource.fetch_issue({"@ark": "bpt6k1"})
+    assert not toc.called
+    gallica_resource.consider_toc = True
+    # an unreadable toc is as good as none
+    assert gallica_resource.fetch_issue({"@ark": "bpt6k1"}).toc is None
+    assert issue_index.toc("bpt6k1") == []
+
+
+def test_ignore_cache(gallica_resource, issue_index, pages, mocker):
+    oai = {"dc:description": ["", "1930 (T21)"], "dc:title": "T", "dc:publisher": "P"}
+    oai["dc:identifier"] = "ark"
+    oai = {"results": {"notice": {"record": {"metadata": {"oai_dc:dc": oai}}}}}
+    oairecord = mocker.patch.object(Resource, "oairecord_sync", return_value=Right(oai))
+    mocker.patch.object(Resource, "toc_sync", return_value=Left(Exception()))
+    pagination = mocker.patch.object(
+        Resource, "pagination_sync", return_value=Right(pages)
+    )
+    mocker.patch("gallica_autobib.query.pagination_cache", {})
+    gallica_resource.fetch_issue({"@ark": "bpt6k1"})
+    gallica_resource.fetch_issue({"@ark": "bpt6k1"})
+    assert oairecord.call_count == pagination.call_count == 1
+    gallica_resource.use_cache = False
+    gallica_resource.fetch_issue({"@ark": "bpt6k1"})
+    assert oairecord.call_count == pagination.call_count == 2
+    # but what was fetched is still stored
+    gallica_resource.use_cache = True
+    gallica_resource.fetch_issue({"@ark": "bpt6k1"})
+    assert oairecord.call_count == pagination.call_count == 2
+
+
 def test_physical_pno(gallica_resource, pages):
     resp = gallica_resource.get_physical_pno("10", pages=pages)
-    assert resp == "16"
+    assert resp == 16
+    with pytest.raises(PageNotFoundError):
+        gallica_resource.get_physical_pno("1000", pages=pages)
 
 
 def test_last_pno(gallica_resource, pages):
     resp = gallica_resource.get_last_pno(pages)
-    assert resp == "676"
+    assert resp == 676
 
 
 def test_ocr_bounds(gallica_resource, data_regression):
@@ -0,0 +1,99 @@
+import httpx
+import pytest
+from gallica_autobib import ratelimit
+from gallica_autobib.gallipy import helpers
+
+
+@pytest.fixture(autouse=True)
+def no_ratelimit():
+    rate = ratelimit.limiter.rate
+    ratelimit.configure(rate=0)
+    yield
+    ratelimit.configure(rate=rate)
+
+
+@pytest.fixture
+def mock_client():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        if request.url.path == "/broken":
+            return httpx.Response(500)
+        if request.url.path == "/empty":
+            return httpx.Response(200)
+        if request.url.path == "/xml":
+            return httpx.Response(200, text="<a><b>1 &amp; 2</b><c/></a>")
+        if request.url.path == "/malformed":
+            return httpx.Response(200, text="<a><b>1</b><c></a>")
+        if request.url.path == "/limited" and len(requests) < 3:
+            return httpx.Response(429, headers={"retry-after": "0"})
+        return httpx.Response(200, text='{"answer": 42}')
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    helpers.set_client(client)
+    yield client, requests
+    helpers.set_client(None)
+
+
+def test_fetch_uses_shared_client(mock_client):
+    client, requests = mock_client
+    assert helpers.get_client() is client
+    resp = helpers.fetch("https://gallica.bnf.fr/thing")
+    assert not resp.is_left
+    assert resp.value == '{"answer": 42}'
+    resp = helpers.fetch_json("https://gallica.bnf.fr/thing")
+    assert resp.value == {"answer": 42}
+    assert len(requests) == 2
+    assert requests[0].headers["user-agent"] == helpers.USER_AGENT
+
+
+def test_fetch_error(mock_client):
+    resp = helpers.fetch("https://gallica.bnf.fr/missing")
+    assert resp.is_left
+    assert resp.value.status == 404
+    assert helpers.is_permanent_failure(resp)
+    resp = helpers.fetch("https://gallica.bnf.fr/broken")
+    assert resp.value.status == 500
+    assert helpers.is_permanent_failure(resp) is False
+    resp = helpers.fetch("https://gallica.bnf.fr/empty")
+    assert resp.value.status is None
+    assert helpers.is_permanent_failure(resp)
+    assert (
+        helpers.is_permanent_failure(helpers.fetch("https://gallica.bnf.fr/")) is None
+    )
+
+
+def test_fetch_xml(mock_client, mocker):
+    soup = mocker.spy(helpers, "BeautifulSoup")
+    resp = helpers.fetch_xml_html("https://gallica.bnf.fr/xml")
+    assert resp.value == "<a><b>1 &amp; 2</b><c/></a>"
+    resp = helpers.fetch_xml_dict("https://gallica.bnf.fr/xml")
+    assert resp.value == {"a": {"b": "1 & 2", "c": None}}
+    assert not soup.called
+    resp = helpers.fetch_xml_dict("https://gallica.bnf.fr/malformed")
+    assert resp.value["a"]["b"] == "1"
+    resp = helpers.fetch_xml_html("https://gallica.bnf.fr/malformed")
+    assert resp.value.endswith("<a><b>1</b><c/></a>")
+    assert soup.call_count == 2
+
+
+def test_fetch_retries_ratelimited(mock_client):
+    _, requests = mock_client
+    resp = helpers.fetch("https://gallica.bnf.fr/limited")
+    assert resp.value == '{"answer": 42}'
+    assert len(requests) == 3
+
+
+def test_configure_client():
+    helpers.configure_client(max_connections=3, keepalive_expiry=5)
+    try:
+        client = helpers.get_client()
+        assert helpers.get_client() is client
+        pool = client._transport._pool
+        assert pool._max_connections == 3
+        assert pool._keepalive_expiry == 5
+    finally:
+        helpers.configure_client(max_connections=10, keepalive_expiry=30.0)
@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+from gallica_autobib import ratelimit
+from gallica_autobib.gallipy import Resource, helpers
+
+PAGINATION = """<?xml version="1.0" encoding="UTF-8"?>
+<livre>
+<structure><nbVueImages>3</nbVueImages></structure>
+<pages>
+<page><numero>1</numero><ordre>1</ordre><pagination_type>A</pagination_type></page>
+<page><numero>2</numero><ordre>2</ordre><pagination_type>A</pagination_type></page>
+<page><numero>3</numero><ordre>3</ordre><pagination_type>A</pagination_type></page>
+</pages>
+</livre>
+"""
+
+
+@pytest.fixture(autouse=True)
+def no_ratelimit():
+    rate = ratelimit.limiter.rate
+    ratelimit.configure(rate=0)
+    yield
+    ratelimit.configure(rate=rate)
+
+
+@pytest.fixture
+def async_client():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path == "/services/Pagination":
+            return httpx.Response(200, text=PAGINATION)
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    helpers.set_async_client(client)
+    yield requests
+    helpers.set_async_client(None)
+
+
+@pytest.fixture
+def resource():
+    yield Resource("ark:/12148/bpt6k9735634r")
+
+
+async def test_pagination(async_client, resource):
+    either = await resource.pagination()
+    assert not either.is_left
+    assert either.value["livre"]["structure"]["nbVueImages"] == "3"
+    assert async_client[0].url.params["ark"] == "bpt6k9735634r"
+
+
+async def test_concurrent_requests(async_client):
+    resources = [Resource(f"ark:/12148/bpt6k97356{i:02}") for i in range(50)]
+    results = await asyncio.gather(*[r.pagination() for r in resources])
+    assert all(not x.is_left for x in results)
+    assert len(async_client) == 50
+
+
+async def test_identical_requests_coalesced(async_client, resource):
+    results = await asyncio.gather(*[resource.pagination() for _ in range(50)])
+    assert all(not x.is_left for x in results)
+    assert len(async_client) == 1
+
+
+async def test_content_url(async_client, resource):
+    either = await resource.content(startview=2, nviews=1)
+    assert either.is_left
+    assert async_client[-1].url.path == "/ark:/12148/bpt6k9735634r/f2n1.pdf"
+
+
+async def test_content_uses_pagination(async_client, resource):
+    await resource.content(startview=2)
+    assert async_client[-1].url.path == "/ark:/12148/bpt6k9735634r/f2n2.pdf"
@@ -0,0 +1,34 @@
+import pickle
+from pathlib import Path
+
+import pytest
+from gallica_autobib.pagination import PageNotFoundError, PaginationIndex
+
+
+@pytest.fixture(scope="module")
+def index():
+    with Path("tests/test_gallica_resource/pages.pickle").open("rb") as f:
+        yield PaginationIndex.from_pagination(pickle.load(f))
+
+
+def test_index(index):
+    assert len(index) == 684
+    assert index.physical("10") == 16
+    assert index.physical(10) == 16
+    # repeated numbers map to their first view
+    assert index.physical("NP") == 3
+    assert index.ordre[index.last()] == 676
+    assert PaginationIndex.of(index) is index
+
+
+def test_missing_pages(index):
+    with pytest.raises(PageNotFoundError):
+        index.physical("1000")
+    with pytest.raises(PageNotFoundError):
+        index.last("Z")
+    with pytest.raises(PageNotFoundError):
+        PaginationIndex.from_pagination({"livre": {"pages": None}})
+
+
+def test_pickle(index):
+    assert pickle.loads(pickle.dumps(index)).views == index.views
@@ -1,10 +1,12 @@
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
 import pytest
 from gallica_autobib import pipeline
+from gallica_autobib.models import Journal
 from gallica_autobib.pipeline import BibtexParser, InputParser, RisParser
+from gallica_autobib.query import Match
 
 
 @pytest.fixture()
@@ -249,6 +251,113 @@ def test_ris_parser(ris, status, file_regression, tmp_path, check_pdfs):
     assert res.record.kind == "ris"
 
 
+batch_bibliography = """
+@Article{a, author = {A}, title = {One}, journaltitle = {La Vie spirituelle},
+  year = 1930, pages = {1-2}}
+@Article{b, author = {B}, title = {Two}, journaltitle = {Revue thomiste},
+  year = 1930, pages = {1-2}}
+@Article{c, author = {C}, title = {Three}, journaltitle = {La vie Spirituelle},
+  year = 1931, pages = {3-4}}
+@Article{d, author = {D}, title = {Four}, journaltitle = {La Vie spirituelle},
+  year = 1930, pages = {5-6}}
+@Article{e, author = {E}, title = {Five}, journaltitle = {La Vie spirituelle},
+  publisher = {Other}, year = 1930, pages = {5-6}}
+"""
+
+
+@pytest.fixture
+def batch_parser(tmp_path, mocker):
+    """A batch parser whose queries find a series covering only the year asked."""
+    queries = []
+
+    class MockQuery:
+        def __init__(self, target):
+            self.target = target
+            queries.append((target.journaltitle, target.publicationdate))
+
+        def run(self):
+            journal = Journal(
+                journaltitle=self.target.journaltitle, year=self.target.publicationdate
+            )
+            return Match(self.target, journal)
+
+    def process_record(record, outf, process, clean, match=None, **kwargs):
+        return (record.target.title, match.candidate.publicationdate, outf.name)
+
+    mocker.patch.object(pipeline, "Query", MockQuery)
+    mocker.patch.object(pipeline.source_match_cache, "get", return_value=None)
+    mocker.patch.object(InputParser, "process_record", process_record)
+    parser = BibtexParser(tmp_path)
+    parser.batch = True
+    parser.pool(ThreadPoolExecutor(2))
+    yield parser, queries
+
+
+def run_batches(parser):
+    parser.executing = parser._send_records()
+    for future in parser.executing:
+        future.result()
+    return sorted(parser.results)
+
+
+def test_batch(batch_parser):
+    parser, queries = batch_parser
+    parser.read(batch_bibliography)
+    assert [[r.target.title for r in b] for b in parser.batches()] == [
+        ["One", "Three", "Four"],
+        ["Two"],
+        ["Five"],
+    ]
+    assert run_batches(parser) == [
+        ("Five", 1930, "five-e.pdf"),
+        ("Four", 1930, "four-d.pdf"),
+        ("One", 1930, "one-a.pdf"),
+        ("Three", 1931, "three-c.pdf"),
+        ("Two", 1930, "two-b.pdf"),
+    ]
+    assert len(parser.executing) == 5
+    # the 1930 series doesn't hold 1931, so that is asked for again
+    assert sorted(queries) == [
+        ("La Vie spirituelle", 1930),
+        ("La Vie spirituelle", 1930),
+        ("La vie Spirituelle", 1931),
+        ("Revue thomiste", 1930),
+    ]
+
+
+def test_batch_isolates_failures(batch_parser, mocker):
+    parser, queries = batch_parser
+
+    def process_record(record, outf, process, clean, match=None, **kwargs):
+        if record.target.title == "Four":
+            raise Exception("Boom")
+        return (record.target.title, match, outf.name)
+
+    mocker.patch.object(pipeline.Query, "run", return_value=None)
+    mocker.patch.object(InputParser, "process_record", process_record)
+    parser.read(batch_bibliography)
+    parser.executing = parser._send_records()
+    for future in parser.executing:
+        future.result()
+    results = {
+        r.record.target.title: r for r in parser.results if not isinstance(r, tuple)
+    }
+    assert list(results) == ["Four"]
+    assert results["Four"].status is False
+    assert results["Four"].errors == ["Boom"]
+    assert len(parser.results) == 5
+    assert all(
+        r[1] is pipeline.NO_MATCH for r in parser.results if isinstance(r, tuple)
+    )
+    # a journal which isn't found isn't looked for again for the same year
+    assert sorted(queries) == [
+        ("La Vie spirituelle", 1930),
+        ("La Vie spirituelle", 1930),
+        ("La vie Spirituelle", 1931),
+        ("Revue thomiste", 1930),
+    ]
+
+
 def test_base_parser():
     parser = InputParser(Path("."))
     with pytest.raises(NotImplementedError):
@@ -2,7 +2,15 @@ from copy import deepcopy
 
 import pytest
 from gallica_autobib.models import Article, Book, Journal
-from gallica_autobib.query import GallicaSRU, Match, Query, make_string_boring
+from gallica_autobib.query import (
+    GallicaSRU,
+    Match,
+    Query,
+    make_string_boring,
+    pack_pagination,
+    unpack_pagination,
+)
+from xmltodict import parse
 
 strings = [["asciitest", "asciitest"], [None, None]]
 
@@ -12,6 +20,22 @@ def test_boring_string(inp, out):
     assert make_string_boring(inp) == out
 
 
+def test_pack_pagination():
+    doc = parse(
+        "<livre><structure><nbVueImages>2</nbVueImages></structure><pages>"
+        "<page><numero>i</numero><ordre>1</ordre></page>"
+        "<page><numero>1</numero><ordre>2</ordre></page>"
+        "</pages></livre>"
+    )
+    packed = pack_pagination(doc)
+    assert packed["livre"]["pages"]["_columns"]["ordre"] == ["1", "2"]
+    assert "page" in doc["livre"]["pages"]
+    assert unpack_pagination(packed) == doc
+    other = parse("<results><issue>1</issue></results>")
+    assert pack_pagination(other) is other
+    assert unpack_pagination(other) is other
+
+
 def test_match_duplicate():
     a = Article(
         journaltitle="La vie spirituelle",
@@ -0,0 +1,72 @@
+import asyncio
+from multiprocessing import Process
+
+import pytest
+from gallica_autobib.ratelimit import TokenBucket
+
+URL = "https://gallica.bnf.fr/services/Issues"
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    yield TokenBucket(tmp_path / "ratelimit.db", rate=10, burst=3)
+
+
+def test_burst(bucket):
+    assert all(bucket.try_acquire(URL) == 0 for _ in range(3))
+    wait = bucket.try_acquire(URL)
+    assert 0 < wait <= 0.1
+    # other hosts have their own bucket
+    assert bucket.try_acquire("https://catalogue.bnf.fr/api/SRU") == 0
+
+
+def test_shared_between_instances(bucket):
+    other = TokenBucket(bucket.path, rate=10, burst=3)
+    for _ in range(3):
+        assert other.try_acquire(URL) == 0
+    assert bucket.try_acquire(URL)
+
+
+def take(path):
+    TokenBucket(path, rate=10, burst=3).acquire(URL)
+
+
+def test_shared_between_processes(bucket):
+    procs = [Process(target=take, args=(bucket.path,)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert bucket.try_acquire(URL)
+
+
+def test_penalise(bucket):
+    bucket.penalise(URL, retry_after=5)
+    assert 4 < bucket.try_acquire(URL) <= 5
+    rate = bucket.con.execute("SELECT rate FROM buckets").fetchone()[0]
+    assert rate == 5
+
+
+def test_disabled(tmp_path):
+    bucket = TokenBucket(tmp_path / "ratelimit.db", rate=0, burst=1)
+    assert all(bucket.try_acquire(URL) == 0 for _ in range(10))
+
+
+async def test_async(bucket):
+    for _ in range(3):
+        await bucket.acquire_async(URL)
+    await bucket.penalise_async(URL, retry_after=5)
+    assert 4 < bucket.try_acquire(URL) <= 5
+    rate = bucket.con.execute("SELECT rate FROM buckets").fetchone()[0]
+    assert rate == 5
+
+
+async def test_disabled_penalty_yields(tmp_path):
+    bucket = TokenBucket(tmp_path / "ratelimit.db", rate=0, burst=1)
+    penalty = asyncio.create_task(bucket.penalise_async(URL, retry_after=0.1))
+    ticks = 0
+    while not penalty.done():
+        ticks += 1
+        await asyncio.sleep(0.01)
+    # the loop kept running during the pause
+    assert ticks > 2